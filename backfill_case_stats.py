@@ -0,0 +1,19 @@
+import asyncio
+
+import mongoengine
+from dotenv import find_dotenv, load_dotenv
+
+import cogs.utils.case_stats as case_stats
+from data.cases import Cases
+from data.casestats import CaseStats
+
+load_dotenv(find_dotenv())
+
+async def backfill():
+    print("COUNTING CASES...")
+    total = case_stats.rebuild(Cases._get_collection(), CaseStats._get_collection())
+    print(f"DONE, counted {total} cases")
+
+if __name__ == "__main__":
+        mongoengine.register_connection(alias="default", name="botty")
+        res = asyncio.get_event_loop().run_until_complete( backfill() )
@@ -165,6 +165,53 @@ class Stats(commands.Cog):
         
         await ctx.message.reply(embed=embed)
 
+    @commands.guild_only()
+    @commands.command(name="dbstats")
+    @permissions.admin_and_up()
+    async def dbstats(self, ctx: context.Context) -> None:
+        """Latency of the bot's database calls, slowest first
+
+        Example usage
+        -------------
+        !dbstats
+
+        """
+
+        db = ctx.settings.db
+        embed = discord.Embed(title="Database Statistics", color=discord.Color.blurple())
+        embed.description = f"{db.in_flight} calls in flight, {db.queue_depth} waiting for a worker ({db.max_workers} workers)"
+
+        slowest = sorted(db.stats.items(), key=lambda item: item[1].avg_time, reverse=True)
+        for name, stats in slowest[:24]:
+            embed.add_field(name=name, value=f"{stats.calls} calls, {stats.errors} errors\navg {stats.avg_time*1000:.1f}ms, max {stats.max_time*1000:.1f}ms\navg wait {stats.avg_wait*1000:.1f}ms")
+
+        embed.set_footer(text=f"Requested by {ctx.author}")
+        await ctx.message.reply(embed=embed)
+
+    @commands.guild_only()
+    @commands.command(name="pipelinestats")
+    @permissions.admin_and_up()
+    async def pipelinestats(self, ctx: context.Context) -> None:
+        """Time spent in each stage of message processing
+
+        Example usage
+        -------------
+        !pipelinestats
+
+        """
+
+        pipeline = self.bot.pipeline
+        embed = discord.Embed(title="Message Pipeline Statistics", color=discord.Color.blurple())
+        embed.description = f"{pipeline.total.calls} messages, avg {pipeline.total.avg_time*1000:.1f}ms, max {pipeline.total.max_time*1000:.1f}ms"
+
+        for name, stats in pipeline.stats.items():
+            embed.add_field(name=name, value=f"{stats.calls} calls, {stats.errors} errors, stopped {stats.stops}\navg {stats.avg_time*1000:.1f}ms, max {stats.max_time*1000:.1f}ms")
+
+        embed.set_footer(text=f"Requested by {ctx.author}")
+        await ctx.message.reply(embed=embed)
+
+    @pipelinestats.error
+    @dbstats.error
     @casestats.error
     @raidstats.error
     @serverinfo.error
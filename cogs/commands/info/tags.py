@@ -18,7 +18,7 @@ class TagsSource(menus.GroupByPageSource):
             title=f'All tags', color=discord.Color.blurple())
         for tag in entry.items:
             desc = f"Added by: {tag.added_by_tag}\nUsed {tag.use_count} times"
-            if tag.image.read() is not None:
+            if tag.image:
                 desc += "\nHas image attachment"
             embed.add_field(name=tag.name, value=desc)
         embed.set_footer(
@@ -87,11 +87,9 @@ class Tags(commands.Cog):
         # store tag in database
         await ctx.settings.add_tag(tag)
         
-        file = tag.image.read()
-        if file is not None:
-            file = discord.File(BytesIO(file), filename="image.gif" if tag.image.content_type == "image/gif" else "image.png")
+        file = await self.prepare_tag_file(ctx, tag)
 
-        await ctx.message.reply(f"Added new tag!", file=file, embed=await self.prepare_tag_embed(tag), delete_after=10)
+        await ctx.message.reply(f"Added new tag!", file=file, embed=await self.prepare_tag_embed(tag, file), delete_after=10)
         await ctx.message.delete(delay=10)
 
     @commands.guild_only()
@@ -138,11 +136,9 @@ class Tags(commands.Cog):
         if not await ctx.settings.edit_tag(tag):
             raise commands.BadArgument("An error occurred editing that tag.")
         
-        file = tag.image.read()
-        if file is not None:
-            file = discord.File(BytesIO(file), filename="image.gif" if tag.image.content_type == "image/gif" else "image.png")
+        file = await self.prepare_tag_file(ctx, tag)
         
-        await ctx.message.reply(embed=await self.prepare_tag_embed(tag), delete_after=10, file=file, mention_author=False)
+        await ctx.message.reply(embed=await self.prepare_tag_embed(tag, file), delete_after=10, file=file, mention_author=False)
         await ctx.message.delete(delay=10)
 
     @commands.guild_only()
@@ -161,7 +157,7 @@ class Tags(commands.Cog):
         """
 
         name = name.lower()
-        tag = await ctx.settings.get_tag(name)
+        tag = await ctx.settings.use_tag(name)
         
         if tag is None:
             raise commands.BadArgument("That tag does not exist.")
@@ -174,11 +170,9 @@ class Tags(commands.Cog):
             raise commands.BadArgument("That tag is on cooldown.")
         
         # if the Tag has an image, add it to the embed
-        file = tag.image.read()
-        if file is not None:
-            file = discord.File(BytesIO(file), filename="image.gif" if tag.image.content_type == "image/gif" else "image.png")
+        file = await self.prepare_tag_file(ctx, tag)
         
-        await ctx.message.reply(embed=await self.prepare_tag_embed(tag), file=file, mention_author=False)
+        await ctx.message.reply(embed=await self.prepare_tag_embed(tag, file), file=file, mention_author=False)
     
     @commands.guild_only()
     @permissions.genius_or_submod_and_up()
@@ -197,7 +191,7 @@ class Tags(commands.Cog):
         """
 
         name = name.lower()
-        tag = await ctx.settings.get_tag(name)
+        tag = await ctx.settings.use_tag(name)
         
         if tag is None:
             raise commands.BadArgument("That tag does not exist.")
@@ -210,9 +204,7 @@ class Tags(commands.Cog):
             raise commands.BadArgument("That tag is on cooldown.")
         
         # if the Tag has an image, add it to the embed
-        file = tag.image.read()
-        if file is not None:
-            file = discord.File(BytesIO(file), filename="image.gif" if tag.image.content_type == "image/gif" else "image.png")
+        file = await self.prepare_tag_file(ctx, tag)
         
         response = discord.utils.escape_markdown(tag.content)
         parts = [response[i:i+2000] for i in range(0, len(response), 2000)]
@@ -267,13 +259,15 @@ class Tags(commands.Cog):
         await ctx.send_warning("Deleted that tag.", delete_after=5)
         await ctx.message.delete(delay=5)
 
-    async def prepare_tag_embed(self, tag):
+    async def prepare_tag_embed(self, tag, file=None):
         """Given a tag object, prepare the appropriate embed for it
 
         Parameters
         ----------
         tag : Tag
             Tag object from database
+        file : discord.File, optional
+            The tag's image, from `prepare_tag_file`
 
         Returns
         -------
@@ -285,11 +279,32 @@ class Tags(commands.Cog):
         embed.timestamp = tag.added_date
         embed.color = discord.Color.blue()
 
-        if tag.image.read() is not None:
-            embed.set_image(url="attachment://image.gif" if tag.image.content_type == "image/gif" else "attachment://image.png")
+        if file is not None:
+            embed.set_image(url=f"attachment://{file.filename}")
         embed.set_footer(text=f"Added by {tag.added_by_tag} | Used {tag.use_count} times")
         return embed
 
+    async def prepare_tag_file(self, ctx: context.Context, tag):
+        """Given a tag object, prepare its image as a file we can attach
+
+        Parameters
+        ----------
+        tag : Tag
+            Tag object from database
+
+        Returns
+        -------
+        discord.File
+            The tag's image, or None if it doesn't have one
+        """
+
+        image = await ctx.settings.tag_image(tag)
+        if image is None:
+            return None
+
+        data, content_type = image
+        return discord.File(BytesIO(data), filename="image.gif" if content_type == "image/gif" else "image.png")
+
     @edittag.error
     @tag.error
     @taglist.error
@@ -1,40 +1,77 @@
 import traceback
 import typing
-from math import floor
+from math import ceil
 
 import cogs.utils.context as context
 import cogs.utils.permission_checks as permissions
+from cogs.utils.levels import xp_for_next_level
 import discord
 from discord.ext import commands, menus
 
 
-class LeaderboardSource(menus.GroupByPageSource):
-    async def format_page(self, menu, entry):
+class LeaderboardSource(menus.PageSource):
+    def __init__(self, settings, guild, per_page=10):
+        self.settings = settings
+        self.guild = guild
+        self.per_page = per_page
+        self.max_pages = 1
+
+    async def prepare(self):
+        members = await self.settings.leaderboard_members(self.guild)
+        self.max_pages = max(1, ceil(members / self.per_page))
+
+    def is_paginating(self):
+        return self.max_pages > 1
+
+    def get_max_pages(self):
+        return self.max_pages
+
+    async def get_page(self, page_number):
+        # pages are read from the in-memory leaderboard as they're needed
+        return await self.settings.leaderboard(self.guild, page_number * self.per_page, self.per_page)
+
+    async def format_page(self, menu, entries):
         embed = discord.Embed(
             title=f'Leaderboard', color=discord.Color.blurple())
-        for i, user in entry.items:
+        trophies = [':first_place:', ':second_place:', ':third_place:']
+        for i, user in entries:
             member = menu.ctx.guild.get_member(user._id)
             trophy = ''
-            if menu.current_page == 0:
-                if i == entry.items[0][0]:
-                    trophy = ':first_place:'
+            if i < len(trophies):
+                trophy = trophies[i]
+                if i == 0 and member is not None:
                     embed.set_thumbnail(url=member.avatar_url)
-                if i == entry.items[1][0]:
-                    trophy = ':second_place:'
-                if i == entry.items[2][0]:
-                    trophy = ':third_place:'
-            
             
             embed.add_field(name=f"#{i+1} - Level {user.level}",
-                            value=f"{trophy} {member.mention}", inline=False)
+                            value=f"{trophy} {member.mention if member is not None else f'<@{user._id}>'}", inline=False)
             
         embed.set_footer(
             text=f"Page {menu.current_page +1} of {self.get_max_pages()}")
         return embed
 
 
-class CasesSource(menus.GroupByPageSource):
-    async def format_page(self, menu, entry):
+class CasesSource(menus.PageSource):
+    def __init__(self, settings, user_id, first_page, total, per_page=9):
+        self.settings = settings
+        self.user_id = user_id
+        self.first_page = first_page
+        self.per_page = per_page
+        self.max_pages = max(1, ceil(total / per_page))
+
+    def is_paginating(self):
+        return self.max_pages > 1
+
+    def get_max_pages(self):
+        return self.max_pages
+
+    async def get_page(self, page_number):
+        if page_number == 0:
+            return self.first_page
+        # only the cases on this page are read from the database
+        cases, _ = await self.settings.case_history(self.user_id, page_number * self.per_page, self.per_page)
+        return cases
+
+    async def format_page(self, menu, entries):
         pun_map = {
             "KICK": "Kicked",
             "BAN": "Banned",
@@ -49,7 +86,7 @@ class CasesSource(menus.GroupByPageSource):
         embed = discord.Embed(
             title=f'Cases - {u.warn_points} warn points', color=discord.Color.blurple())
         embed.set_author(name=user, icon_url=user.avatar_url)
-        for case in entry.items:
+        for case in entries:
             timestamp = case.date.strftime("%B %d, %Y, %I:%M %p")
             if case._type == "WARN" or case._type == "LIFTWARN":
                 if case.lifted:
@@ -206,7 +243,7 @@ class UserInfo(commands.Cog):
     @permissions.bot_channel_only_unless_mod()
     @commands.command(name="xptop", aliases=["leaderboard"])
     async def xptop(self, ctx: context.Context):
-        """Show XP leaderboard for top 100, ranked highest to lowest.
+        """Show XP leaderboard of the server's members, ranked highest to lowest.
 
         Example usage
         --------------
@@ -214,10 +251,8 @@ class UserInfo(commands.Cog):
 
         """
 
-        results = enumerate(await ctx.settings.leaderboard())
-        results = [ (i, m) for (i, m) in results if ctx.guild.get_member(m._id) is not None][0:100]
         menus = MenuPages(source=LeaderboardSource(
-            results, key=lambda t: 1, per_page=10), clear_reactions_after=True)
+            ctx.settings, ctx.guild, per_page=10), clear_reactions_after=True)
 
         await menus.start(ctx)
 
@@ -302,22 +337,18 @@ class UserInfo(commands.Cog):
                     f"Couldn't find user with ID {user}")
             ctx.args[2] = user
 
-        # fetch user's cases from our database
-        results = await ctx.settings.cases(user.id)
-        if len(results.cases) == 0:
+        # fetch the first page of the user's cases from our database, newest first and
+        # without unmute cases because they are irrelevant
+        cases, total = await ctx.settings.case_history(user.id, 0, 9)
+        if total == 0:
             if isinstance(user, int):
                 raise commands.BadArgument(
                     f'User with ID {user.id} had no cases.')
             else:
                 raise commands.BadArgument(f'{user.mention} had no cases.')
-        
-        # filter out unmute cases because they are irrelevant
-        cases = [case for case in results.cases if case._type != "UNMUTE"]
-        # reverse so newest cases are first
-        cases.reverse()
 
         menus = MenuPages(source=CasesSource(
-            cases, key=lambda t: 1, per_page=9), clear_reactions_after=True)
+            ctx.settings, user.id, cases, total, per_page=9), clear_reactions_after=True)
         await ctx.message.delete()
         await menus.start(ctx)
 
@@ -340,20 +371,6 @@ class UserInfo(commands.Cog):
             traceback.print_exc()
 
 
-def xp_for_next_level(_next):
-    """Magic formula to determine XP thresholds for levels
-    """
-    
-    level = 0
-    xp = 0
-
-    for _ in range(0, _next):
-        xp = xp + 45 * level * (floor(level / 10) + 1)
-        level += 1
-
-    return xp
-
-
 async def determine_emoji(type):
     emoji_dict = {
         "KICK": "👢",
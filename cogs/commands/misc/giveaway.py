@@ -132,7 +132,7 @@ class Giveaway(commands.Cog):
             winners=responses['winners'], 
             end_time=end_time, 
             sponsor=responses['sponsor'].id)
-        giveaway.save()
+        await ctx.settings.save(giveaway)
 
         if ctx.channel.id != responses['channel'].id:
             await ctx.send(f"Giveaway started!", embed=embed, delete_after=10)
@@ -174,7 +174,7 @@ class Giveaway(commands.Cog):
             the_winner = None
 
         g.previous_winners.append(the_winner.id)
-        g.save()
+        await ctx.settings.save(g)
 
         await ctx.message.delete()
         channel = ctx.guild.get_channel(g.channel)
@@ -203,7 +203,7 @@ class Giveaway(commands.Cog):
             raise commands.BadArgument("That giveaway has already ended.")
 
         await ctx.message.delete()
-        ctx.tasks.tasks.remove_job(str(message_id + 2), 'default')
+        ctx.tasks.cancel_end_giveaway(message_id)
         await end_giveaway(giveaway.channel, message_id, giveaway.winners)
 
         await ctx.send_success("Giveaway ended!", delete_after=5)
@@ -6,6 +6,7 @@ import traceback
 from random import shuffle
 
 import cogs.utils.context as context
+from cogs.utils.spotify import SpotifyResolver
 import discord
 import humanize
 import lavalink
@@ -40,6 +41,8 @@ class Music(commands.Cog):
         # spotify API session for queueing spotify songs/playlists
         self.sp = spotipy.Spotify(auth_manager=SpotifyClientCredentials(client_id=os.environ.get("SPOTIFY_CLIENT_ID"),
                                                            client_secret=os.environ.get("SPOTIFY_CLIENT_SECRET")))
+        # finds spotify songs on youtube, see `cogs.utils.spotify`
+        self.spotify = SpotifyResolver(self.sp, self.bot.settings.db)
 
         # initialize music backend (lavalink)
         guild = self.bot.get_guild(self.bot.settings.guild_id)
@@ -492,21 +495,15 @@ class Music(commands.Cog):
         # Remove leading and trailing <>. <> may be used to suppress embedding links in Discord.
         query = query.strip('<>')
         if spotify_track.match(query):
-            track = self.sp.track(query)
-            query = f"ytsearch:{track['name']} - {track['artists'][0]['name']}"
-            # Get the results for the query from Lavalink.
-            results = await player.node.get_tracks(query)
+            song = await self.spotify.track(query)
+            results = None
+            if song is not None:
+                async for track in self.spotify.resolve(player.node, [song]):
+                    if track is not None:
+                        results = {'loadType': "TRACK_LOADED", 'tracks': [track]}
         elif spotify_playlist.match(query):
-            playlist = self.sp.playlist(query, fields='name,tracks.items.track.name,tracks.items.track.artists')
-            results = {'loadType': "PLAYLIST_LOADED", 'tracks': [], 'playlistInfo':  {'name': playlist['name']}}
-
-            async with ctx.channel.typing():
-                for track in playlist['tracks']['items']:
-                    track = track['track']
-                    query = f"ytsearch:{track['name']} - {track['artists'][0]['name']}"
-                    result = await player.node.get_tracks(query)
-                    results['tracks'].append(result['tracks'][0])
-                    results['playlistInfo']
+            await self.play_spotify_playlist(ctx, player, query)
+            return
         else:
             if not url_rx.match(query):
                 query = f'ytsearch:{query}'
@@ -553,6 +550,44 @@ class Music(commands.Cog):
         if not player.is_playing:
             await player.play()
 
+    async def play_spotify_playlist(self, ctx: context.Context, player, query: str):
+        """Queue every song in a Spotify playlist. Playback starts as soon as the first song
+        is found, and the rest are added to the queue as they're found.
+
+        Parameters
+        ----------
+        ctx : context.Context
+            Context of the play command
+        player : lavalink.DefaultPlayer
+            The guild's player
+        query : str
+            The playlist's URL or URI
+        """
+
+        async with ctx.channel.typing():
+            name, songs = await self.spotify.playlist(query)
+
+            count = 0
+            async for track in self.spotify.resolve(player.node, songs):
+                if track is None:
+                    continue
+
+                player.add(requester=ctx.author.id, track=track)
+                player.store(track["info"]["identifier"], track)
+                count += 1
+                # We don't want to call .play() if the player is playing as that will effectively skip
+                # the current track.
+                if count == 1 and not player.is_playing:
+                    await player.play()
+
+        if count == 0:
+            raise commands.BadArgument("Couldn't find a suitable video to play.")
+
+        embed = discord.Embed(color=discord.Color.blurple())
+        embed.title = 'Playlist Enqueued!'
+        embed.description = f'{name} - {count} tracks'
+        await ctx.send(embed=embed, delete_after=5)
+
     @commands.guild_only()
     @commands.command(name='nowplaying', aliases=['np'])
     async def now_playing(self, ctx):
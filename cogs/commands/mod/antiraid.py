@@ -156,7 +156,7 @@ class AntiRaid(commands.Cog):
         else:
             profile.raid_verified = mode
         
-        profile.save()
+        await ctx.settings.save(profile)
         
         await ctx.settings.set_spam_mode(mode)
         await ctx.send_success(description=f"{'**Verified**' if profile.raid_verified else '**Unverified**'} user {user.mention}.", delete_after=5)
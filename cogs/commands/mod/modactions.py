@@ -51,14 +51,12 @@ class ModActions(commands.Cog):
         if points < 1:  # can't warn for negative/0 points
             raise commands.BadArgument(message="Points can't be lower than 1.")
 
-        guild = ctx.settings.guild()
-
         reason = discord.utils.escape_markdown(reason)
         reason = discord.utils.escape_mentions(reason)
 
         # prepare the case object for database
         case = Case(
-            _id=guild.case_id,
+            _id=await ctx.settings.next_case_id(),
             _type="WARN",
             mod_id=ctx.author.id,
             mod_tag=str(ctx.author),
@@ -66,8 +64,6 @@ class ModActions(commands.Cog):
             punishment=str(points)
         )
 
-        # increment case ID in database for next available case ID
-        await ctx.settings.inc_caseid()
         # add new case to DB
         await ctx.settings.add_case(user.id, case)
         # add warnpoints to the user in DB
@@ -179,7 +175,7 @@ class ModActions(commands.Cog):
         case.lifted_by_tag = str(ctx.author)
         case.lifted_by_id = ctx.author.id
         case.lifted_date = datetime.datetime.now()
-        cases.save()
+        await ctx.settings.save(cases)
 
         # remove the warn points from the user in DB
         await ctx.settings.inc_points(user.id, -1 * int(case.punishment))
@@ -237,7 +233,8 @@ class ModActions(commands.Cog):
         old_reason = case.reason
         case.reason = new_reason
         case.date = datetime.datetime.now()
-        cases.save()
+        await ctx.settings.save(cases)
+        await ctx.settings.update_case_reason(case, old_reason)
         
         dmed = True
         log = await logging.prepare_editreason_log(ctx.author, user, case, old_reason)
@@ -318,7 +315,7 @@ class ModActions(commands.Cog):
         await ctx.settings.inc_points(user.id, -1 * points)
 
         case = Case(
-            _id=ctx.settings.guild().case_id,
+            _id=await ctx.settings.next_case_id(),
             _type="REMOVEPOINTS",
             mod_id=ctx.author.id,
             mod_tag=str(ctx.author),
@@ -326,8 +323,6 @@ class ModActions(commands.Cog):
             reason=reason,
         )
 
-        # increment DB's max case ID for next case
-        await ctx.settings.inc_caseid()
         # add case to db
         await ctx.settings.add_case(user.id, case)
 
@@ -431,15 +426,13 @@ class ModActions(commands.Cog):
     async def add_kick_case(self,  ctx: context.Context, user, reason):
         # prepare case for DB
         case = Case(
-            _id=ctx.settings.guild().case_id,
+            _id=await ctx.settings.next_case_id(),
             _type="KICK",
             mod_id=ctx.author.id,
             mod_tag=str(ctx.author),
             reason=reason,
         )
 
-        # increment max case ID for next case
-        await ctx.settings.inc_caseid()
         # add new case to DB
         await ctx.settings.add_case(user.id, case)
 
@@ -507,7 +500,7 @@ class ModActions(commands.Cog):
     async def add_ban_case(self,  ctx: context.Context, user, reason):
         # prepare the case to store in DB
         case = Case(
-            _id=ctx.settings.guild().case_id,
+            _id=await ctx.settings.next_case_id(),
             _type="BAN",
             mod_id=ctx.author.id,
             mod_tag=str(ctx.author),
@@ -515,8 +508,6 @@ class ModActions(commands.Cog):
             reason=reason,
         )
 
-        # increment DB's max case ID for next case
-        await ctx.settings.inc_caseid()
         # add case to db
         await ctx.settings.add_case(user.id, case)
         # prepare log embed to send to #public-mod-logs, user and context
@@ -559,13 +550,12 @@ class ModActions(commands.Cog):
         self.ban_list_cache.discard(user.id)
 
         case = Case(
-            _id=ctx.settings.guild().case_id,
+            _id=await ctx.settings.next_case_id(),
             _type="UNBAN",
             mod_id=ctx.author.id,
             mod_tag=str(ctx.author),
             reason=reason,
         )
-        await ctx.settings.inc_caseid()
         await ctx.settings.add_case(user.id, case)
 
         log = await logging.prepare_unban_log(ctx.author, user, case)
@@ -650,7 +640,7 @@ class ModActions(commands.Cog):
             raise commands.BadArgument("This user is already muted.")
 
         case = Case(
-            _id=ctx.settings.guild().case_id,
+            _id=await ctx.settings.next_case_id(),
             _type="MUTE",
             date=now,
             mod_id=ctx.author.id,
@@ -671,11 +661,10 @@ class ModActions(commands.Cog):
         else:
             case.punishment = "PERMANENT"
 
-        await ctx.settings.inc_caseid()
         await ctx.settings.add_case(user.id, case)
         u = await ctx.settings.user(id=user.id)
         u.is_muted = True
-        u.save()
+        await ctx.settings.save(u)
 
         await user.add_roles(mute_role)
 
@@ -722,7 +711,7 @@ class ModActions(commands.Cog):
 
         u = await ctx.settings.user(id=user.id)
         u.is_muted = False
-        u.save()
+        await ctx.settings.save(u)
 
         try:
             ctx.tasks.cancel_unmute(user.id)
@@ -730,13 +719,12 @@ class ModActions(commands.Cog):
             pass
 
         case = Case(
-            _id=ctx.settings.guild().case_id,
+            _id=await ctx.settings.next_case_id(),
             _type="UNMUTE",
             mod_id=ctx.author.id,
             mod_tag=str(ctx.author),
             reason=reason,
         )
-        await ctx.settings.inc_caseid()
         await ctx.settings.add_case(user.id, case)
 
         log = await logging.prepare_unmute_log(ctx.author, user, case)
@@ -110,10 +110,10 @@ class ModUtils(commands.Cog):
         results.is_clem = True
         results.is_xp_frozen = True
         results.warn_points = 599
-        results.save()
+        await ctx.settings.save(results)
 
         case = Case(
-            _id=ctx.settings.guild().case_id,
+            _id=await ctx.settings.next_case_id(),
             _type="CLEM",
             mod_id=ctx.author.id,
             mod_tag=str(ctx.author),
@@ -121,8 +121,6 @@ class ModUtils(commands.Cog):
             reason="No reason."
         )
 
-        # increment DB's max case ID for next case
-        await ctx.settings.inc_caseid()
         # add case to db
         await ctx.settings.add_case(user.id, case)
 
@@ -146,7 +144,7 @@ class ModUtils(commands.Cog):
 
         results = await ctx.settings.user(user.id)
         results.is_xp_frozen = not results.is_xp_frozen
-        results.save()
+        await ctx.settings.save(results)
 
         await ctx.message.reply(f"{user.mention}'s xp was {'frozen' if results.is_xp_frozen else 'unfrozen'}.", allowed_mentions=discord.AllowedMentions(everyone=False, users=False, roles=False))
 
@@ -172,7 +170,7 @@ class ModUtils(commands.Cog):
 
         results = await ctx.settings.user(user.id)
         results.is_music_banned = True
-        results.save()
+        await ctx.settings.save(results)
         
         await ctx.send_success(f"Banned {user.mention} from music.", delete_after=5)
 
@@ -199,7 +197,8 @@ class ModUtils(commands.Cog):
         results = await ctx.settings.user(user.id)
         results.birthday_excluded = True
         results.birthday = None
-        results.save()
+        await ctx.settings.save(results)
+        ctx.settings.index_birthday(results)
 
         birthday_role = ctx.guild.get_role(ctx.settings.guild().role_birthday)
         if birthday_role is None:
@@ -232,7 +231,8 @@ class ModUtils(commands.Cog):
 
         results = await ctx.settings.user(user.id)
         results.birthday = None
-        results.save()
+        await ctx.settings.save(results)
+        ctx.settings.index_birthday(results)
 
         try:
             ctx.settings.tasks.cancel_unbirthday(user.id)
@@ -280,7 +280,8 @@ class ModUtils(commands.Cog):
 
         results = await ctx.settings.user(user.id)
         results.birthday = [month, date]
-        results.save()
+        await ctx.settings.save(results)
+        ctx.settings.index_birthday(results)
 
         await ctx.message.reply(f"{user.mention}'s birthday was set.", allowed_mentions=discord.AllowedMentions(everyone=False, users=False, roles=False), delete_after=5)
         await ctx.message.delete(delay=5)
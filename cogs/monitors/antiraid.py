@@ -1,16 +1,13 @@
 import re
-import string
-from asyncio import Lock
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timedelta
 
 import cogs.utils.context as context
-import cogs.utils.logs as logger
-from cogs.utils.message_cooldown import MessageTextBucket
+from cogs.utils.message_pipeline import MessageContext, Stage
+from cogs.utils.normalize import normalize
+from cogs.utils.raid_bans import RaidBanQueue
+from cogs.utils.rate_window import SlidingWindow
 import discord
-from data.case import Case
 from discord.ext import commands
-from expiringdict import ExpiringDict
-from fold_to_ascii import fold
 
 
 class RaidType:
@@ -24,31 +21,29 @@ class AntiRaidMonitor(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         
-        # cooldown to monitor if too many users join in a short period of time (more than 10 within 8 seconds)
-        self.join_raid_detection_threshold = commands.CooldownMapping.from_cooldown(rate=10, per=8, type=commands.BucketType.guild)
-        # cooldown to monitor if users are spamming a message (8 within 6 seconds)
-        self.message_spam_detection_threshold = commands.CooldownMapping.from_cooldown(rate=7, per=6.0, type=commands.BucketType.member)
-        # cooldown to monitor if too many accounts created on the same date are joining within a short period of time 
-        # (5 accounts created on the same date joining within 45 minutes of each other)
-        self.join_overtime_raid_detection_threshold = commands.CooldownMapping.from_cooldown(rate=4, per=2700, type=MessageTextBucket.custom)
-
-        # cooldown to monitor how many times AntiRaid has been triggered (5 triggers per 15 seconds puts server in lockdown)
-        self.raid_detection_threshold = commands.CooldownMapping.from_cooldown(rate=4, per=15.0, type=commands.BucketType.guild)
-        # cooldown to only send one raid alert for moderators per 10 minutes
-        self.raid_alert_cooldown = commands.CooldownMapping.from_cooldown(1, 600.0, commands.BucketType.guild)
-
-        # stores the users that trigger self.join_raid_detection_threshold so we can ban them
-        self.join_user_mapping = ExpiringDict(max_len=100, max_age_seconds=10)
-        # stores the users that trigger self.message_spam_detection_threshold so we can ban them
-        self.spam_user_mapping = ExpiringDict(max_len=100, max_age_seconds=10)
-        # stores the users that trigger self.join_overtime_raid_detection_threshold so we can ban them
-        self.join_overtime_mapping = ExpiringDict(max_len=100, max_age_seconds=2700)
-        # stores the users that we have banned so we don't try to ban them repeatedly
-        self.ban_user_mapping = ExpiringDict(max_len=100, max_age_seconds=120)
-        
-        # locks to prevent race conditions when banning concurrently
-        self.join_overtime_lock = Lock()
-        self.banning_lock = Lock()
+        # too many users joining in a short period of time (more than 10 within 8 seconds), by guild
+        self.join_raid_detection_threshold = SlidingWindow(rate=10, per=8)
+        # users spamming a message (more than 7 within 6 seconds), by member
+        self.message_spam_detection_threshold = SlidingWindow(rate=7, per=6.0)
+        # too many accounts created on the same date joining within a short period of time
+        # (5 accounts created on the same date joining within 45 minutes of each other), by creation date
+        self.join_overtime_raid_detection_threshold = SlidingWindow(rate=4, per=2700)
+
+        # how many times AntiRaid has been triggered (5 triggers per 15 seconds puts server in lockdown), by guild.
+        # also remembers who triggered it, so we can ban them
+        self.raid_detection_threshold = SlidingWindow(rate=4, per=15.0)
+        # only send one raid alert for moderators per 10 minutes, by guild
+        self.raid_alert_cooldown = SlidingWindow(rate=1, per=600.0)
+
+        # bans raiders in batches, and remembers who we banned so we don't try to ban them repeatedly.
+        # banned accounts stay in the join over time window, which resubmits them on every join
+        # while it's exceeded, so bans are remembered for at least as long as the window
+        self.ban_queue = RaidBanQueue(bot, remember_for=self.join_overtime_raid_detection_threshold.per)
+
+        self.bot.pipeline.register("antiraid", self.antiraid_stage, Stage.MONITORS)
+
+    def cog_unload(self):
+        self.bot.pipeline.unregister("antiraid")
 
     @commands.Cog.listener()
     async def on_member_join(self, member):
@@ -69,27 +64,15 @@ class AntiRaidMonitor(commands.Cog):
         
         
         """Detect whether more than 10 users join within 8 seconds"""
-        # add user to cooldown
-        current = datetime.now().timestamp()
-        join_spam_detection_bucket = self.join_raid_detection_threshold.get_bucket(member)
-        self.join_user_mapping[member.id] = member
-        
-        # if ratelimit is triggered, we should ban all the users that joined in the past 8 seconds
-        if join_spam_detection_bucket.update_rate_limit(current):
-            users = list(self.join_user_mapping.keys())
-            for user in users:
-                try:
-                    user = self.join_user_mapping[user]
-                except KeyError:
-                    continue
-                
+        # if the window is exceeded, we should ban all the users that joined in the past 8 seconds
+        if self.join_raid_detection_threshold.hit(member.guild.id, member):
+            for user in self.join_raid_detection_threshold.items(member.guild.id):
                 try:
                     await self.raid_ban(user, reason="Join spam detected.")
                 except Exception:
                     pass
                 
-            raid_alert_bucket = self.raid_alert_cooldown.get_bucket(member)
-            if not raid_alert_bucket.update_rate_limit(current):
+            if self.raid_alert(member.guild):
                 await self.bot.report.report_raid(member)
                 await self.freeze_server(member.guild)
         
@@ -127,38 +110,23 @@ class AntiRaidMonitor(commands.Cog):
         timestamp = member.created_at.strftime(
             "%B %d, %Y")
         
-        # store this user with all the users that were created on this date
-        async with self.join_overtime_lock:
-            if self.join_overtime_mapping.get(timestamp) is None:
-                self.join_overtime_mapping[timestamp] = [member]
-            else:
-                if member in self.join_overtime_mapping[timestamp]:
-                    return
-                
-                self.join_overtime_mapping[timestamp].append(member)
-
-        # handle ratelimitting. If ratelimit is triggered, ban all the users we know were created on this date.
-        bucket = self.join_overtime_raid_detection_threshold.get_bucket(timestamp)
-        current = member.joined_at.replace(tzinfo=timezone.utc).timestamp()
-        if bucket.update_rate_limit(current):
-            users = [ m for m in self.join_overtime_mapping.get(timestamp) ]
-            for user in users:
+        # store this user with all the users that were created on this date.
+        # if the window is exceeded, ban all the users we know were created on this date.
+        # they stay in the window so that it stays exceeded, and everyone else created on
+        # this date who joins within the window is banned too. the ban queue remembers bans
+        # for as long as the window, so users that were already banned are skipped.
+        window = self.join_overtime_raid_detection_threshold
+        if window.hit(timestamp, member):
+            for user in window.items(timestamp):
                 try:
                     await self.raid_ban(user, reason=f"Join spam over time detected (bucket `{timestamp_bucket_for_logging}`)", dm_user=True)
-                    self.join_overtime_mapping[timestamp].remove(user)
                 except Exception:
                     pass
 
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        if message.guild is None:
-            return
-        if message.author.bot:
-            return
-        if message.guild.id != self.bot.settings.guild_id:
-            return
-        message.author = message.guild.get_member(message.author.id)
-        if self.bot.settings.permissions.hasAtLeast(message.guild, message.author, 5):
+    async def antiraid_stage(self, ctx: MessageContext):
+        message = ctx.message
+        message.author = ctx.member
+        if ctx.level >= 5:
             return
         
         if await self.ping_spam(message):  
@@ -187,20 +155,16 @@ class AntiRaidMonitor(commands.Cog):
         return True
 
     async def handle_raid_detection(self, message: discord.Message, raid_type: RaidType):
-        current = message.created_at.replace(tzinfo=timezone.utc).timestamp()
-        spam_detection_bucket = self.raid_detection_threshold.get_bucket(message)
         user = message.author
         
         do_freeze = False
         do_banning = False
-        self.spam_user_mapping[user.id] = 1
         
-        # has the antiraid filter been triggered 5 or more times in the past 10 seconds?
-        if spam_detection_bucket.update_rate_limit(current):
+        # has the antiraid filter been triggered 5 or more times in the past 15 seconds?
+        if self.raid_detection_threshold.hit(message.guild.id, user.id):
             do_banning = True
             # yes! notify the mods and lock the server.
-            raid_alert_bucket = self.raid_alert_cooldown.get_bucket(message)
-            if not raid_alert_bucket.update_rate_limit(current):
+            if self.raid_alert(message.guild):
                 await self.bot.report.report_raid(user, message)
                 do_freeze = True
 
@@ -218,13 +182,7 @@ class AntiRaidMonitor(commands.Cog):
                     title = "Message spam detected"
                 await self.bot.report.report_spam(message, user, title=title)
             else:
-                users = list(self.spam_user_mapping.keys())
-                for user in users:
-                    try:
-                        _ = self.spam_user_mapping[user]
-                    except KeyError:
-                        continue
-                                        
+                for user in self.raid_detection_threshold.items(message.guild.id):
                     user = message.guild.get_member(user)
                     if user is None:
                         continue
@@ -234,6 +192,14 @@ class AntiRaidMonitor(commands.Cog):
                     except Exception:
                         pass
 
+    def raid_alert(self, guild: discord.Guild) -> bool:
+        """Whether moderators should be alerted about a raid, i.e. they haven't been in the past 10 minutes"""
+
+        if self.raid_alert_cooldown.count(guild.id):
+            return False
+        self.raid_alert_cooldown.hit(guild.id)
+        return True
+
     async def ping_spam(self, message):
         """If a user pings more than 5 people, or pings more than 2 roles, mute them.
         A report is generated which a mod must review (either unmute or ban the user using a react)
@@ -259,11 +225,8 @@ class AntiRaidMonitor(commands.Cog):
         if self.bot.settings.permissions.hasAtLeast(message.guild, message.author, 1):
             return False
                 
-        bucket = self.message_spam_detection_threshold.get_bucket(message)
-        current = message.created_at.replace(tzinfo=timezone.utc).timestamp()
-
-        if bucket.update_rate_limit(current):
-            if message.author.id in self.spam_user_mapping:
+        if self.message_spam_detection_threshold.hit(message.author.id):
+            if self.raid_detection_threshold.contains(message.guild.id, message.author.id):
                 return True
             
             mute = self.bot.get_command("mute")
@@ -286,15 +249,7 @@ class AntiRaidMonitor(commands.Cog):
         if self.bot.settings.permissions.hasAtLeast(message.guild, message.author, 2):
             return False
 
-        #TODO: Unify filtering system
-        symbols = (u"абвгдеёжзийклмнопрстуфхцчшщъыьэюяАБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ",
-                u"abBrdeex3nnKnmHonpcTyoxu4wwbbbeoRABBrDEEX3NNKNMHONPCTyOXU4WWbbbEOR")
-
-        tr = {ord(a): ord(b) for a, b in zip(*symbols)}
-
-        folded_message = fold(message.content.translate(tr).lower()).lower()
-        folded_without_spaces = "".join(folded_message.split())
-        folded_without_spaces_and_punctuation = folded_without_spaces.translate(str.maketrans('', '', string.punctuation))
+        folded_message, folded_without_spaces, folded_without_spaces_and_punctuation = normalize(message.content)
 
         if folded_message:
             for word in self.bot.settings.guild().raid_phrases:
@@ -337,45 +292,10 @@ class AntiRaidMonitor(commands.Cog):
         await self.bot.report.report_possible_raid_phrase(message, user, domain)
             
     async def raid_ban(self, user: discord.Member, reason="Raid phrase detected", dm_user=False):
-        """Helper function to ban users"""
+        """Helper function to ban users. The ban is queued, and carried out together with
+        any other bans queued around the same time."""
         
-        async with self.banning_lock:
-            if self.ban_user_mapping.get(user.id) is not None:
-                return
-            else:
-                self.ban_user_mapping[user.id] = 1
-
-            case = Case(
-                _id=self.bot.settings.guild().case_id,
-                _type="BAN",
-                date=datetime.now(),
-                mod_id=self.bot.user.id,
-                mod_tag=str(self.bot.user),
-                punishment="PERMANENT",
-                reason=reason
-            )
-
-            await self.bot.settings.inc_caseid()
-            await self.bot.settings.add_case(user.id, case)
-            
-            log = await logger.prepare_ban_log(self.bot.user, user, case)
-            
-            if dm_user:
-                try:
-                    await user.send(f"You were banned from {user.guild.name}.\n\nThis action was performed automatically. If you think this was a mistake, please send a message here: https://www.reddit.com/message/compose?to=%2Fr%2FJailbreak", embed=log)
-                except Exception:
-                    pass
-            
-            if user.guild.get_member(user.id) is not None:
-                await user.ban(reason="Raid")
-            else:
-                await user.guild.ban(discord.Object(id=user.id), reason="Raid")
-                
-            public_logs = user.guild.get_channel(self.bot.settings.guild().channel_public)
-            if public_logs:
-                log.remove_author()
-                log.set_thumbnail(url=user.avatar_url)
-                await public_logs.send(embed=log)
+        self.ban_queue.submit(user, reason=reason, dm_user=dm_user)
 
     async def freeze_server(self, guild):
         """Freeze all channels marked as freezeable during a raid, meaning only people with the Member+ role and up
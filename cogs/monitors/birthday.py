@@ -1,55 +1,91 @@
+import asyncio
 import traceback
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
 
 import cogs.utils.context as context
 import cogs.utils.permission_checks as permissions
 import discord
 import pytz
-from discord.ext import commands, tasks
+from discord.ext import commands
+
+
+# number of members given the birthday role at once
+BIRTHDAY_CONCURRENCY = 5
 
 
 class Birthday(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.birthday.start()
         self.eastern_timezone = pytz.timezone('US/Eastern')
-
+        self.scheduler = self.bot.loop.create_task(self.birthday_scheduler())
 
     def cog_unload(self):
-        self.birthday.cancel()
+        self.scheduler.cancel()
+
+    def next_midnight(self) -> datetime:
+        """The next 12AM US Eastern time"""
+
+        now = datetime.now(self.eastern_timezone)
+        tomorrow = now.date() + timedelta(days=1)
+        return self.eastern_timezone.localize(datetime.combine(tomorrow, time()))
+
+    async def birthday_scheduler(self):
+        """Background task that gives everyone whose birthday it is the birthday role for 24 hours.
+        It runs on startup and then at 12AM US Eastern time every day, when it also reloads the
+        index of birthdays from the database."""
+
+        await self.bot.wait_until_ready()
+        while True:
+            try:
+                await self.bot.settings.load_birthdays()
+                await self.give_birthday_roles()
+            except Exception:
+                traceback.print_exc()
+
+            # a second late, so we wake up on the new day
+            delay = (self.next_midnight() - datetime.now(self.eastern_timezone)).total_seconds() + 1
+            await asyncio.sleep(delay)
+
+    async def give_birthday_roles(self):
+        """Give the birthday role to every member whose birthday it is today, in one pass."""
 
-    @tasks.loop(seconds=120)
-    async def birthday(self):
-        """Background task to scan database for users whose birthday it is today.
-        If it's someone's birthday, the bot will assign them the birthday role for 24 hours."""
-        
-        # assign the role at 12am US Eastern time
-        eastern = pytz.timezone('US/Eastern')
-        today = datetime.today().astimezone(eastern)
-        # the date we will check for in the database
-        date = [today.month, today.day]
-        # get list of users whose birthday it is today
-        birthdays = await self.bot.settings.retrieve_birthdays(date)
-        
         guild = self.bot.get_guild(self.bot.settings.guild_id)
         if not guild:
             return
-        
+
         birthday_role = guild.get_role(self.bot.settings.guild().role_birthday)
         if not birthday_role:
             return
-        
-        # give each user whose birthday it is today the birthday role
-        for person in birthdays:
-            if person.birthday_excluded:
-                continue
-            
-            user = guild.get_member(person._id)
-            if user is None:
-                return
-            
-            await self.give_user_birthday_role(user, guild)
-            
+
+        today = datetime.now(self.eastern_timezone)
+        members = (guild.get_member(_id) for _id in self.bot.settings.birthdays.on(today.month, today.day))
+        # people who left the server don't stop the others from getting their role
+        members = [member for member in members if member is not None and birthday_role not in member.roles]
+        if not members:
+            return
+
+        until = self.next_midnight()
+        semaphore = asyncio.Semaphore(BIRTHDAY_CONCURRENCY)
+
+        async def give(member):
+            async with semaphore:
+                try:
+                    await self.give_user_birthday_role(member, guild, birthday_role, until)
+                except Exception:
+                    traceback.print_exc()
+
+        await asyncio.gather(*(give(member) for member in members))
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member) -> None:
+        if member.bot or member.guild.id != self.bot.settings.guild_id:
+            return
+
+        # members who rejoin on their birthday get the role back
+        today = datetime.now(self.eastern_timezone)
+        if self.bot.settings.birthdays.is_birthday(member.id, today.month, today.day):
+            await self.give_user_birthday_role(member, member.guild)
+
     @commands.guild_only()
     @permissions.bot_channel_only_unless_mod()
     @commands.command(name="mybirthday")
@@ -94,7 +130,8 @@ class Birthday(commands.Cog):
 
         # passed all the sanity checks, let's save the birthday
         results.birthday = [month, date]
-        results.save()
+        await ctx.settings.save(results)
+        ctx.settings.index_birthday(results)
 
         await ctx.message.reply(f"{user.mention}'s birthday was set.", allowed_mentions=discord.AllowedMentions(everyone=False, users=False, roles=False), delete_after=5)
         await ctx.message.delete(delay=5)
@@ -103,25 +140,17 @@ class Birthday(commands.Cog):
         if today.month == month and today.day == date:
             await self.give_user_birthday_role(ctx.author, ctx.guild)
         
-    async def give_user_birthday_role(self, user, guild):
-        birthday_role = guild.get_role(self.bot.settings.guild().role_birthday)
+    async def give_user_birthday_role(self, user, guild, birthday_role=None, until=None):
         if birthday_role is None:
-            return
+            birthday_role = guild.get_role(self.bot.settings.guild().role_birthday)
+            if birthday_role is None:
+                return
 
         if birthday_role in user.roles:
             return
         
-        # calculate the different between now and tomorrow 12AM
-        now = datetime.now(self.eastern_timezone)
-        h = now.hour / 24
-        m = now.minute / 60 / 24
-        
         # schedule a task to remove birthday role (tomorrow) 12AM
-        try:
-            time = now + timedelta(days=1-h-m)
-            self.bot.settings.tasks.schedule_remove_bday(user.id, time)
-        except Exception:
-            return
+        self.bot.settings.tasks.schedule_remove_bday(user.id, until or self.next_midnight())
         
         await user.add_roles(birthday_role)
         
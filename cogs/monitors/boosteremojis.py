@@ -4,44 +4,53 @@ import re
 import aiohttp
 import cogs.utils.context as context
 import discord
+from cogs.utils.lru_cache import LRUCache
 from discord.ext import commands
 
+# number of messages in the booster emoji channel kept in memory
+MESSAGE_CACHE_SIZE = 200
+
 
 class BoosterEmojis(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        # recent emoji requests by message ID, so approving one doesn't have to fetch it
+        self.cached_messages = LRUCache(MESSAGE_CACHE_SIZE)
 
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload):
-        if not payload.member:
+        db = self.bot.settings
+        # filter on what's in the payload first, so reactions elsewhere cost no requests
+        if payload.guild_id != db.guild_id:
             return
-        if not payload.member.guild:
+        if not payload.member:
             return
         if payload.member.bot:
             return
-        channel = payload.member.guild.get_channel(payload.channel_id)
-        try:
-            msg = await channel.fetch_message(payload.message_id)
-        except Exception:
-            return
-        db = self.bot.settings
-
-        if not msg.guild.id == db.guild_id:
-            return
-        if not payload.channel_id == db.guild().channel_booster_emoji:
-            return
-        if payload.channel_id != self.bot.settings.guild().channel_booster_emoji:
+        if payload.channel_id != db.guild().channel_booster_emoji:
             return
         if not str(payload.emoji) in ['✅', '❌']:
             return
+
+        channel = payload.member.guild.get_channel(payload.channel_id)
+        if channel is None:
+            return
         if not self.bot.settings.permissions.hasAtLeast(payload.member.guild, payload.member, 5):
-            await msg.remove_reaction(payload.emoji, payload.member)
+            await channel.get_partial_message(payload.message_id).remove_reaction(payload.emoji, payload.member)
             return
 
         if str(payload.emoji) == '❌':
-            await msg.delete()
+            self.cached_messages.pop(payload.message_id)
+            await channel.get_partial_message(payload.message_id).delete()
             return
 
+        msg = self.cached_messages.get(payload.message_id)
+        if msg is None:
+            try:
+                msg = await channel.fetch_message(payload.message_id)
+            except Exception:
+                return
+
         try:
             _bytes, name = await self.get_bytes(msg)
         except commands.BadArgument as e:
@@ -74,6 +83,7 @@ class BoosterEmojis(commands.Cog):
         
         if name is not None:
             emoji = await channel.guild.create_custom_emoji(image=_bytes, name=name)
+            self.cached_messages.pop(msg.id)
             await msg.delete()
         else:
             return
@@ -95,6 +105,7 @@ class BoosterEmojis(commands.Cog):
         if not msg.channel.id == db.guild().channel_booster_emoji:
             return
 
+        self.cached_messages[msg.id] = msg
         try:
             _bytes, _ = await self.get_bytes(msg)
         except commands.BadArgument as e:
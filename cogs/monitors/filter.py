@@ -1,10 +1,9 @@
-import string
 import traceback
 
 import discord
 import cogs.utils.context as context
+from cogs.utils.normalize import normalize
 from discord.ext import commands
-from fold_to_ascii import fold
 
 
 class FilterMonitor(commands.Cog):
@@ -28,13 +27,6 @@ class FilterMonitor(commands.Cog):
 
         await self.nick_filter(after)
 
-    @commands.Cog.listener()
-    async def on_message_delete(self, message: discord.Member) -> None:
-        pending_task = self.bot.report.pending_tasks.get(message.id)
-        if pending_task is not None:
-            self.bot.report.pending_tasks[message.id] = "TERMINATE"
-            
-
     @commands.Cog.listener()
     async def on_member_join(self, member: discord.Member) -> None:
         if member.guild.id != self.bot.settings.guild_id:
@@ -46,29 +38,16 @@ class FilterMonitor(commands.Cog):
         if member.guild.id != self.bot.settings.guild_id:
             return
 
-        guild = self.bot.settings.guild()
         nick = member.display_name
 
-        symbols = (u"абвгдеёжзийклмнопрстуфхцчшщъыьэюяАБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ",
-                   u"abBrdeex3nnKnmHonpcTyoxu4wwbbbeoRABBrDEEX3NNKNMHONPCTyOXU4WWbbbEOR")
-
-        tr = {ord(a): ord(b) for a, b in zip(*symbols)}
-
-        folded_message = fold(nick.translate(tr).lower()).lower()
-        folded_without_spaces = "".join(folded_message.split())
-        folded_without_spaces_and_punctuation = folded_without_spaces.translate(str.maketrans('', '', string.punctuation))
-        if folded_message:
-            for word in guild.filter_words:
+        text = normalize(nick)
+        if text.folded:
+            # nicknames have never been matched against filter words with their spaces removed
+            for word in self.bot.settings.filter_matcher().find(*text, spaceless_words=False):
                 if not self.bot.settings.permissions.hasAtLeast(member.guild, member, word.bypass):
-                    if (word.word.lower() in folded_message) or \
-                        (not word.false_positive and word.word.lower() in folded_without_spaces) or \
-                        (not word.false_positive and word.word.lower() in folded_without_spaces_and_punctuation):
-                        # remove all whitespace, punctuation in message and run filter again
-                        if word.false_positive and word.word.lower() not in folded_message.split():
-                            continue
-                        await member.edit(nick="change name pls", reason=f"filter triggered ({nick})")
-                        await self.do_filter_notify(member, word.word)
-                        return
+                    await member.edit(nick="change name pls", reason=f"filter triggered ({nick})")
+                    await self.do_filter_notify(member, word.word)
+                    return
     
     async def do_filter_notify(self, member, word):
         message = f"Your nickname contained a word you aren't allowed to say in {member.guild.name}. This could be either hate speech or the name of a piracy tool/source. We've automatically changed your name."
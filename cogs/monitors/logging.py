@@ -1,19 +1,38 @@
+import os
 import traceback
-from datetime import datetime
-from io import BytesIO
+from datetime import datetime, timedelta, timezone
 
 import discord
 from discord.ext import commands
 from collections import defaultdict
 import cogs.utils.context as context
+import cogs.utils.permission_checks as permissions
+from cogs.utils.log_sink import LogSink
+from cogs.utils.message_pipeline import MessageContext, Stage
+from cogs.utils.message_store import MessageStore, StoredMessage
+from cogs.utils.transcripts import TranscriptArchive
 from fold_to_ascii import fold
-from typing import List
 
 class Logging(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.webhook_dict = defaultdict(lambda: False)
         self.emoji_webhook = defaultdict(lambda: False)
+        # logs are batched and sent through a webhook, see `cogs.utils.log_sink`
+        self.sink = LogSink(bot)
+        self.sink.start()
+        # recent messages, for logging edits and deletes of messages that aren't cached
+        self.messages = MessageStore(os.environ.get("BOTTY_MESSAGE_STORE", "messages.db"))
+        self.messages.start(bot.loop)
+        self.bot.pipeline.register("message_store", self.message_store_stage, Stage.MONITORS)
+        # bulk delete transcripts, kept on disk after they're uploaded
+        self.transcripts = TranscriptArchive(os.environ.get("BOTTY_TRANSCRIPTS", "transcripts"))
+
+    def cog_unload(self):
+        self.bot.pipeline.unregister("message_store")
+        self.bot.loop.create_task(self.sink.stop())
+        self.bot.loop.create_task(self.messages.stop())
+        self.bot.loop.create_task(self.transcripts.close())
 
     # @commands.Cog.listener()
     # async def on_reaction_add(self, reaction: discord.Reaction, member: discord.Member):
@@ -78,8 +97,6 @@ class Logging(commands.Cog):
         if member.guild.id != self.bot.settings.guild_id:
             return
 
-        channel = member.guild.get_channel(self.bot.settings.guild().channel_private)
-
         embed = discord.Embed(title="Member joined")
         embed.color = discord.Color.green()
         embed.set_thumbnail(url=member.avatar_url)
@@ -93,7 +110,7 @@ class Logging(commands.Cog):
         embed.timestamp = datetime.now()
         embed.set_footer(text=member.id)
 
-        await channel.send(embed=embed)
+        self.sink.send(embed)
 
         u = await self.bot.settings.user(id=member.id)
         if u.is_muted:
@@ -114,8 +131,6 @@ class Logging(commands.Cog):
         if member.guild.id != self.bot.settings.guild_id:
             return
 
-        channel = member.guild.get_channel(self.bot.settings.guild().channel_private)
-
         embed = discord.Embed(title="Member left")
         embed.color = discord.Color.purple()
         embed.set_thumbnail(url=member.avatar_url)
@@ -123,34 +138,61 @@ class Logging(commands.Cog):
             name="User", value=f'{member} ({member.mention})', inline=True)
         embed.timestamp = datetime.now()
         embed.set_footer(text=member.id)
-        await channel.send(embed=embed)
+        self.sink.send(embed)
+
+    async def message_store_stage(self, ctx: MessageContext):
+        # runs after the filter, so messages it deleted are never stored
+        message = ctx.message
+        if not message.content and not message.attachments:
+            return
+
+        # kept so we can log it if it's edited or deleted after it left discord.py's cache
+        self.messages.record(message)
 
     @commands.Cog.listener()
-    async def on_message_edit(self, before: discord.Message, after: discord.Message) -> None:
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent) -> None:
         """Log message edits with before and after content
 
         Parameters
         ----------
-        before : discord.Message
-            Before edit message data
-        after : discord.Message
-            Aftere edit message data
+        payload : discord.RawMessageUpdateEvent
+            The edit, with the message from the cache if it was still in there
         """
 
-        if not before.guild:
+        guild_id = payload.data.get("guild_id")
+        if guild_id is None or int(guild_id) != self.bot.settings.guild_id:
             return
-        if before.guild.id != self.bot.settings.guild_id:
+        # edits that don't change the content, e.g. embeds being added
+        if "content" not in payload.data:
             return
-        if not before.content or not after.content or before.content == after.content:
+
+        before = payload.cached_message
+        if before is not None:
+            if before.author.bot:
+                return
+            before = StoredMessage.from_message(before)
+        else:
+            before = await self.messages.get(payload.message_id)
+            if before is None:
+                return
+
+        after_content = payload.data["content"]
+        if not before.content or not after_content or before.content == after_content:
             return
 
-        channel = before.guild.get_channel(self.bot.settings.guild().channel_private)
+        after = StoredMessage(before.id, before.channel_id, before.author_id, after_content, before.attachments)
+        self.messages.update(after)
+
+        guild = self.bot.get_guild(self.bot.settings.guild_id)
+        author = guild.get_member(before.author_id) or self.bot.get_user(before.author_id)
+        channel = guild.get_channel(before.channel_id)
 
         embed = discord.Embed(title="Message Updated")
         embed.color = discord.Color.orange()
-        embed.set_thumbnail(url=before.author.avatar_url)
+        if author is not None:
+            embed.set_thumbnail(url=author.avatar_url)
         embed.add_field(
-            name="User", value=f'{before.author} ({before.author.mention})', inline=False)
+            name="User", value=f'{author} ({author.mention})' if author is not None else f'<@{before.author_id}>', inline=False)
         before_content = before.content
         if len(before.content) > 400:
             before_content = before_content[0:400] + "..."
@@ -160,10 +202,10 @@ class Logging(commands.Cog):
         embed.add_field(name="Old message", value=before_content, inline=False)
         embed.add_field(name="New message", value=after_content, inline=False)
         embed.add_field(
-            name="Channel", value=before.channel.mention + f"\n\n[Link to message]({before.jump_url})", inline=False)
+            name="Channel", value=(channel.mention if channel is not None else f'<#{before.channel_id}>') + f"\n\n[Link to message]({before.jump_url(guild.id)})", inline=False)
         embed.timestamp = datetime.now()
-        embed.set_footer(text=before.author.id)
-        await channel.send(embed=embed)
+        embed.set_footer(text=before.author_id)
+        self.sink.send(embed)
 
     @commands.Cog.listener()
     async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent) -> None:
@@ -171,37 +213,46 @@ class Logging(commands.Cog):
 
         Parameters
         ----------
-        message : discord.Message
-            Message that was deleted
+        payload : discord.RawMessageDeleteEvent
+            The delete, with the message from the cache if it was still in there
         """
 
+        if payload.guild_id != self.bot.settings.guild_id:
+            return
+
         message = payload.cached_message
+        if message is not None:
+            if message.author.bot:
+                return
+            message = StoredMessage.from_message(message)
+        else:
+            message = await self.messages.get(payload.message_id)
+            if message is None:
+                return
 
-        if not message or not message.guild:
-            return
-        if message.guild.id != self.bot.settings.guild_id:
-            return
-        if message.author.bot:
-            return
+        self.messages.forget(payload.message_id)
         if message.content == "" or not message.content:
             return
 
-        channel = message.guild.get_channel(self.bot.settings.guild().channel_private)
+        guild = self.bot.get_guild(payload.guild_id)
+        author = guild.get_member(message.author_id) or self.bot.get_user(message.author_id)
+        channel = guild.get_channel(message.channel_id)
 
         embed = discord.Embed(title="Message Deleted")
         embed.color = discord.Color.red()
-        embed.set_thumbnail(url=message.author.avatar_url)
+        if author is not None:
+            embed.set_thumbnail(url=author.avatar_url)
         embed.add_field(
-            name="User", value=f'{message.author} ({message.author.mention})', inline=True)
+            name="User", value=f'{author} ({author.mention})' if author is not None else f'<@{message.author_id}>', inline=True)
         embed.add_field(
-            name="Channel", value=message.channel.mention, inline=True)
+            name="Channel", value=channel.mention if channel is not None else f'<#{message.channel_id}>', inline=True)
         content = message.content
         if len(message.content) > 400:
             content = content[0:400] + "..."
-        embed.add_field(name="Message", value=content + f"\n\n[Link to message]({message.jump_url})", inline=False)
-        embed.set_footer(text=message.author.id)
+        embed.add_field(name="Message", value=content + f"\n\n[Link to message]({message.jump_url(guild.id)})", inline=False)
+        embed.set_footer(text=message.author_id)
         embed.timestamp = datetime.now()
-        await channel.send(embed=embed)
+        self.sink.send(embed)
 
     @commands.Cog.listener()
     async def on_command_error(self, ctx: context.Context, error):
@@ -209,53 +260,66 @@ class Logging(commands.Cog):
             return
 
     @commands.Cog.listener()
-    async def on_bulk_message_delete(self, messages: List[discord.Message]):
-        """Log bulk message deletes. Messages are outputted to file and sent to #server-logs
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent):
+        """Log bulk message deletes. Messages are written to a compressed transcript, which is
+        archived and sent to #server-logs
 
         Parameters
         ----------
-        messages : [discord.Message]
-            List of messages that were deleted
+        payload : discord.RawBulkMessageDeleteEvent
+            The deleted message IDs, with the messages that were still cached
         """
 
-        if not messages[0].guild:
+        if payload.guild_id != self.bot.settings.guild_id:
             return
-        if messages[0].guild.id != self.bot.settings.guild_id:
+
+        guild = self.bot.get_guild(payload.guild_id)
+        messages = {message.id: StoredMessage.from_message(message) for message in payload.cached_messages}
+        authors = {message.author.id: message.author for message in payload.cached_messages}
+        messages.update(await self.messages.get_many(
+            [message_id for message_id in payload.message_ids if message_id not in messages]))
+        for message_id in payload.message_ids:
+            self.messages.forget(message_id)
+        if not messages:
             return
 
-        members = set()
-        channel = messages[0].guild.get_channel(self.bot.settings.guild().channel_private)
-        output = BytesIO()
-        for message in messages:
-            members.add(message.author)
-
-            string = f'{message.author} ({message.author.id}) [{message.created_at.strftime("%B %d, %Y, %I:%M %p")}]) UTC\n'
-            string += message.content
-            for attachment in message.attachments:
-                string += f'\n{attachment.url}'
-
-            string += "\n\n"
-            output.write(string.encode('UTF-8'))
-        output.seek(0)
-
-        member_string = ""
-        for i, member in enumerate(members):
-            if i == len(members) - 1 and i == 0:
-                member_string += f"{member.mention}"
-            elif i == len(members) - 1 and i != 0:
-                member_string += f"and {member.mention}"
-            else:
-                member_string += f"{member.mention}, "
+        lines = []
+        for message in sorted(messages.values(), key=lambda message: message.id):
+            if message.author_id not in authors:
+                authors[message.author_id] = guild.get_member(message.author_id) or self.bot.get_user(message.author_id)
+            author = authors[message.author_id]
+            name = str(author) if author is not None else "Unknown user"
+            lines.append((message.id, f'{name} ({message.author_id}) [{message.created_at.strftime("%B %d, %Y, %I:%M %p")}]) UTC',
+                          message.content, message.attachments))
+
+        transcript = await self.transcripts.write(payload.channel_id, lines, guild.filesize_limit)
+
+        mentions = [f"<@{author_id}>" for author_id in authors]
+        # embed fields can only be 1024 characters long
+        if len(mentions) > 20:
+            mentions = mentions[:20] + [f"{len(mentions) - 20} others"]
+        if len(mentions) > 1:
+            mentions = ", ".join(mentions[:-1]) + f" and {mentions[-1]}"
+        else:
+            mentions = mentions[0]
 
         embed = discord.Embed(title="Bulk Message Deleted")
         embed.color = discord.Color.red()
         embed.add_field(
-            name="Users", value=f'This batch included {len(messages)} messages from {member_string}', inline=True)
+            name="Users", value=f'This batch included {len(lines)} messages from {mentions}', inline=True)
         embed.add_field(
-            name="Channel", value=message.channel.mention, inline=True)
+            name="Channel", value=f'<#{payload.channel_id}>', inline=True)
+        embed.set_footer(text=f"Transcript #{transcript.id}")
         embed.timestamp = datetime.now()
+
+        channel = guild.get_channel(self.bot.settings.guild().channel_private)
         await channel.send(embed=embed)
-        await channel.send(file=discord.File(output, 'message.txt'))
+        for i, part in enumerate(transcript.parts):
+            try:
+                await channel.send(file=discord.File(part, f'messages{i + 1 if len(transcript.parts) > 1 else ""}.txt.gz'))
+            except discord.HTTPException:
+                traceback.print_exc()
+                await channel.send(f"Couldn't upload part {i + 1} of transcript #{transcript.id}, use `!transcript {transcript.id}` to try again")
 
     @commands.Cog.listener()
     async def on_member_update(self, before: discord.Message, after: discord.Message):
@@ -290,9 +354,7 @@ class Logging(commands.Cog):
         embed.timestamp = datetime.now()
         embed.set_footer(text=after.id)
 
-        private = after.guild.get_channel(self.bot.settings.guild().channel_private)
-        if private:
-            await private.send(embed=embed)
+        self.sink.send(embed)
 
     async def member_roles_update(self, before, after, roles, added):
         embed = discord.Embed()
@@ -311,9 +373,78 @@ class Logging(commands.Cog):
         embed.timestamp = datetime.now()
         embed.set_footer(text=after.id)
 
-        private = after.guild.get_channel(self.bot.settings.guild().channel_private)
-        if private:
-            await private.send(embed=embed)
+        self.sink.send(embed)
+
+    @commands.guild_only()
+    @permissions.mod_and_up()
+    @commands.command(name="transcripts")
+    async def transcripts_list(self, ctx: context.Context, channel: discord.TextChannel, days: int = 7):
+        """List the archived bulk delete transcripts of a channel (mod only)
+
+        Example usage
+        --------------
+        !transcripts #general 3
+
+        Parameters
+        ----------
+        channel : discord.TextChannel
+            "Channel the messages were deleted from"
+        days : int, optional
+            "How many days back to look, by default 7"
+        """
+
+        if days < 1:
+            raise commands.BadArgument("Days must be at least 1.")
+
+        transcripts = await self.transcripts.find(channel.id, start=datetime.now(timezone.utc) - timedelta(days=days))
+        if not transcripts:
+            raise commands.BadArgument(f"No transcripts of {channel.mention} from the last {days} days.")
+
+        embed = discord.Embed(title=f"Transcripts of #{channel.name}", color=discord.Color.blurple())
+        embed.description = "\n".join(
+            f"**#{transcript.id}**: {transcript.message_count} messages, deleted {transcript.deleted_at.strftime('%B %d, %Y, %I:%M %p')} UTC"
+            for transcript in transcripts[:20])
+        embed.set_footer(text=f"{len(transcripts)} transcripts | Use !transcript <ID> to download one")
+        await ctx.message.reply(embed=embed)
+
+    @commands.guild_only()
+    @permissions.mod_and_up()
+    @commands.command(name="transcript")
+    async def transcript_get(self, ctx: context.Context, id: int):
+        """Upload an archived bulk delete transcript (mod only)
+
+        Example usage
+        --------------
+        !transcript 12
+
+        Parameters
+        ----------
+        id : int
+            "ID of the transcript, shown in the bulk delete log"
+        """
+
+        transcript = await self.transcripts.get(id)
+        if transcript is None:
+            raise commands.BadArgument(f"Transcript #{id} doesn't exist, or was deleted.")
+
+        for i, part in enumerate(transcript.parts):
+            await ctx.send(file=discord.File(part, f'messages{i + 1 if len(transcript.parts) > 1 else ""}.txt.gz'))
+
+    @transcript_get.error
+    @transcripts_list.error
+    async def info_error(self,  ctx: context.Context, error):
+        await ctx.message.delete(delay=5)
+        if (isinstance(error, commands.MissingRequiredArgument)
+            or isinstance(error, permissions.PermissionsFailure)
+            or isinstance(error, commands.BadArgument)
+            or isinstance(error, commands.BadUnionArgument)
+            or isinstance(error, commands.BotMissingPermissions)
+            or isinstance(error, commands.MissingPermissions)
+                or isinstance(error, commands.NoPrivateMessage)):
+            await ctx.send_error(error)
+        else:
+            await ctx.send_error(error)
+            traceback.print_exc()
 
 
 def setup(bot):
@@ -10,7 +10,6 @@ from discord.ext import commands
 class ReactionRoles(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.cached_messages = {}
 
     @commands.command(name='setreactions', hidden=True)
     @commands.guild_only()
@@ -284,23 +283,22 @@ class ReactionRoles(commands.Cog):
 
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload):
-        if payload.member.bot:
+        if payload.guild_id != self.bot.settings.guild_id:
             return
-        if not payload.guild_id:
+        if payload.member is None or payload.member.bot:
             return
         if payload.channel_id != self.bot.settings.guild().channel_reaction_roles:
             return
         
-        mapping = await self.bot.settings.get_rero_mapping(str(payload.message_id))
+        mapping = self.bot.settings.reaction_role_index().get(payload.message_id)
         if mapping is None:
             return
 
         channel = payload.member.guild.get_channel(payload.channel_id)
-        if payload.message_id not in self.cached_messages:
-            message = await channel.fetch_message(payload.message_id)
-            self.cached_messages[payload.message_id] = message
-        else:
-            message = self.cached_messages[payload.message_id]
+        if channel is None:
+            return
+        # removing reactions doesn't need the message's contents, so it's never fetched
+        message = channel.get_partial_message(payload.message_id)
 
         if str(payload.emoji) not in mapping:
             await message.remove_reaction(payload.emoji, payload.member)
@@ -308,7 +306,7 @@ class ReactionRoles(commands.Cog):
 
         role = payload.member.guild.get_role(mapping[str(payload.emoji)])
         if role is None:
-            await message.remove_reaction(payload.emoji)
+            await message.remove_reaction(payload.emoji, payload.member)
             return
 
         try:
@@ -1,15 +1,165 @@
 import datetime
+import traceback
+from collections import OrderedDict
+
 import pytimeparse
 import cogs.utils.context as context
 
 import discord
 import humanize
+from data.pendingreport import PendingReport
+
+"""
+Reports are posted in the reports channel, and mods deal with them by reacting. Instead of
+a coroutine waiting for reactions on each report, open reports are kept in a table keyed by
+the report message's ID, and one listener looks up the report a reaction is for. The table
+is persisted, so reports can still be dealt with after a restart, and reports are dropped
+from it once they're resolved or their message is deleted.
+"""
+
+# number of open reports kept, past this the oldest ones stop responding to reactions
+MAX_OPEN_REPORTS = 1000
+
+# the reactions mods can use on each kind of report
+REPORT_REACTIONS = {
+    "filter": ['✅', '🆔', '🧹'],
+    "spam": ['✅', '💀', '⚠️'],
+    "raid_phrase": ['✅', '💀'],
+}
+
 
 class Report:
     def __init__(self, bot):
         self.bot = bot
-        self.pending_tasks = {}
-    
+        # report message ID -> PendingReport, oldest first
+        self.open_reports = OrderedDict()
+        # report messages sent since startup, so they don't have to be fetched to handle a reaction
+        self.report_messages = {}
+        # reports that a reaction is being handled for
+        self.busy = set()
+        self._loading = None
+        self.handlers = {
+            "filter": self.handle_filter_report,
+            "spam": self.handle_spam_report,
+            "raid_phrase": self.handle_raid_phrase_report,
+        }
+
+        bot.add_listener(self.on_raw_reaction_add)
+        bot.add_listener(self.on_raw_message_delete)
+        bot.add_listener(self.on_raw_bulk_message_delete)
+
+    async def load(self):
+        """Load the reports that were open when the bot stopped, the first time this is
+        called. Concurrent callers wait on the same load, and if it fails the next call
+        tries again.
+        """
+
+        if self._loading is None:
+            async def load():
+                reports = await self.bot.settings.db.run("load_reports", lambda: list(PendingReport.objects.order_by('date')))
+                # reports opened since we started are newer than the ones we loaded
+                opened = list(self.open_reports.items())
+                self.open_reports = OrderedDict((report._id, report) for report in reports)
+                self.open_reports.update(opened)
+                await self.trim()
+
+            self._loading = self.bot.loop.create_task(load())
+
+        loading = self._loading
+        try:
+            await loading
+        except Exception:
+            if self._loading is loading:
+                self._loading = None
+            raise
+
+    async def open(self, report_msg, kind, user, domain=None):
+        report = PendingReport(_id=report_msg.id, kind=kind, channel_id=report_msg.channel.id, user_id=user.id, domain=domain)
+        self.open_reports[report._id] = report
+        self.report_messages[report._id] = report_msg
+        await self.bot.settings.save(report)
+        await self.trim()
+
+        for reaction in REPORT_REACTIONS[kind]:
+            await report_msg.add_reaction(reaction)
+
+    async def close(self, *ids):
+        ids = [_id for _id in ids if self.open_reports.pop(_id, None) is not None]
+        for _id in ids:
+            self.report_messages.pop(_id, None)
+        if ids:
+            await self.bot.settings.db.run("close_reports", lambda: PendingReport.objects(_id__in=ids).delete())
+
+    async def trim(self):
+        if len(self.open_reports) > MAX_OPEN_REPORTS:
+            await self.close(*list(self.open_reports)[:len(self.open_reports) - MAX_OPEN_REPORTS])
+
+    async def on_raw_message_delete(self, payload):
+        if payload.message_id in self.open_reports:
+            await self.close(payload.message_id)
+
+    async def on_raw_bulk_message_delete(self, payload):
+        await self.close(*(payload.message_ids & self.open_reports.keys()))
+
+    async def on_raw_reaction_add(self, payload):
+        if payload.guild_id != self.bot.settings.guild_id or payload.member is None or payload.member.bot:
+            return
+
+        await self.load()
+        report = self.open_reports.get(payload.message_id)
+        if report is None:
+            return
+
+        guild = payload.member.guild
+        channel = guild.get_channel(report.channel_id)
+        if channel is None:
+            await self.close(report._id)
+            return
+
+        reaction = str(payload.emoji)
+        if (reaction not in REPORT_REACTIONS[report.kind]
+                or report._id in self.busy
+                or not self.bot.settings.permissions.hasAtLeast(guild, payload.member, 5)):
+            await channel.get_partial_message(report._id).remove_reaction(payload.emoji, payload.member)
+            return
+
+        report_msg = self.report_messages.get(report._id)
+        if report_msg is None:
+            try:
+                report_msg = await channel.fetch_message(report._id)
+            except discord.NotFound:
+                await self.close(report._id)
+                return
+            self.report_messages[report._id] = report_msg
+
+        user = guild.get_member(report.user_id)
+        if user is None:
+            try:
+                user = await self.bot.fetch_user(report.user_id)
+            except Exception:
+                user = discord.Object(id=report.user_id)
+
+        ctx = await self.bot.get_context(report_msg, cls=context.Context)
+        ctx.author = ctx.message.author = payload.member
+
+        self.busy.add(report._id)
+        try:
+            resolved = await self.handlers[report.kind](ctx, report, user, reaction)
+        except Exception:
+            traceback.print_exc()
+            resolved = False
+        finally:
+            self.busy.discard(report._id)
+
+        if resolved:
+            await self.close(report._id)
+        else:
+            # so the mod can use it again
+            try:
+                await report_msg.remove_reaction(payload.emoji, payload.member)
+            except Exception:
+                pass
+
     async def report(self, msg, user, word, invite=None):
         channel = msg.guild.get_channel(self.bot.settings.guild().channel_reports)
         ping_string = await self.prepare_ping_string(msg)
@@ -19,32 +169,21 @@ class Report:
             report_msg = await channel.send(f"{ping_string}\nMessage contained invite: {invite}", embed=embed)
         else:
             report_msg = await channel.send(ping_string, embed=embed)
-        report_reactions = ['✅', '🆔', '🧹']
-
-        ctx = await self.bot.get_context(report_msg, cls=context.Context)
-        prompt_data = context.PromptDataReaction(report_msg, report_reactions)
-        
-        while True:
-            self.pending_tasks[report_msg.id] = "NOT TERMINATED"
-            reaction, reactor = await ctx.prompt_reaction(prompt_data)
-            if reaction == "TERMINATE":
-                return
-
-            if not self.bot.settings.permissions.hasAtLeast(user.guild, user, 5) or reaction not in report_reactions:
-                await report_msg.remove_reaction(reaction, reactor)
-        
-            if reaction == '✅':
-                try:
-                    await report_msg.delete()
-                except Exception:
-                    pass
-                return
-            elif reaction == '🆔':
-                await channel.send(user.id)
-            elif reaction == '🧹':
-                await channel.purge(limit=100)
-                return
+        await self.open(report_msg, "filter", user)
 
+    async def handle_filter_report(self, ctx, report, user, reaction):
+        if reaction == '✅':
+            try:
+                await ctx.message.delete()
+            except Exception:
+                pass
+            return True
+        elif reaction == '🆔':
+            await ctx.channel.send(user.id)
+            return False
+        elif reaction == '🧹':
+            await ctx.channel.purge(limit=100)
+            return True
 
     async def report_spam(self, msg, user, title):
         channel = msg.guild.get_channel(self.bot.settings.guild().channel_reports)
@@ -54,67 +193,53 @@ class Report:
         embed.set_footer(text="✅ to pardon, 💀 to ban, ⚠️ to temp mute.")
         
         report_msg = await channel.send(ping_string, embed=embed)
-        report_reactions = ['✅', '💀', '⚠️']
+        await self.open(report_msg, "spam", user)
 
-        ctx = await self.bot.get_context(report_msg, cls=context.Context)
-        prompt_data = context.PromptDataReaction(report_msg, report_reactions)
+    async def handle_spam_report(self, ctx, report, user, reaction):
+        if reaction == '✅':
+            unmute = self.bot.get_command("unmute")
+            if unmute is not None:
+                try:
+                    await unmute(ctx=ctx, user=user, reason="Reviewed by a moderator.")
+                except Exception:
+                    pass
+                await ctx.message.delete()
+            else:
+                await ctx.send_warning("I wasn't able to unmute them.")
+            return True
         
-        while True:
-            self.pending_tasks[report_msg.id] = "NOT TERMINATED"
-            reaction, reactor = await ctx.prompt_reaction(prompt_data)
-            if reaction == "TERMINATE":
-                return            
+        elif reaction == '💀':
+            ban = self.bot.get_command("ban")
+            if ban is not None:
+                try:
+                    await ban(ctx=ctx, user=user, reason="Spam detected")
+                except Exception:
+                    pass
+                await ctx.message.delete()
+            else:
+                await ctx.send_warning("I wasn't able to ban them.")
+            return True
+
+        elif reaction == '⚠️':            
+            now = datetime.datetime.now()
+            delta = await self.prompt_time(ctx)
+            if delta is None:
+                return False
             
-            if not self.bot.settings.permissions.hasAtLeast(user.guild, user, 5) or reaction not in report_reactions:
-                await report_msg.remove_reaction(reaction, reactor)
+            try:
+                time = now + datetime.timedelta(seconds=delta)
+                ctx.tasks.schedule_unmute(user.id, time)
                 
-            if reaction == '✅':
-                ctx.author = ctx.message.author = reactor
-                unmute = self.bot.get_command("unmute")
-                if unmute is not None:
-                    try:
-                        await unmute(ctx=ctx, user=user, reason="Reviewed by a moderator.")
-                    except Exception:
-                        pass
-                    await report_msg.delete()
-                else:
-                    await ctx.send_warning("I wasn't able to unmute them.")
-                return
-            
-            elif reaction == '💀':
-                ctx.author = ctx.message.author = reactor
-                ban = self.bot.get_command("ban")
-                if ban is not None:
-                    try:
-                        await ban(ctx=ctx, user=user, reason="Spam detected")
-                    except Exception:
-                        pass
-                    await report_msg.delete()
-                else:
-                    await ctx.send_warning("I wasn't able to ban them.")
-                return
-            elif reaction == '⚠️':            
-                ctx.author = ctx.message.author = reactor
-                now = datetime.datetime.now()
-                delta = await self.prompt_time(ctx)
-                if delta is None:
-                    continue
+                await ctx.send_success(title="Done!", description=f"{user.mention} was muted for {humanize.naturaldelta(time - now)}.", delete_after=5)
+                await ctx.message.delete()
                 
                 try:
-                    time = now + datetime.timedelta(seconds=delta)
-                    ctx.tasks.schedule_unmute(user.id, time)
-                    
-                    await ctx.send_success(title="Done!", description=f"{user.mention} was muted for {humanize.naturaldelta(time - now)}.", delete_after=5)
-                    await report_msg.delete()
-                    
-                    try:
-                        await user.send(embed=discord.Embed(title="Ping spam unmute", description=f"A moderator has reviewed your ping spam report. You will be unmuted in {humanize.naturaldelta(time - now)}.", color=discord.Color.orange()))
-                    except Exception:
-                        pass
-                    
-                    return
+                    await user.send(embed=discord.Embed(title="Ping spam unmute", description=f"A moderator has reviewed your ping spam report. You will be unmuted in {humanize.naturaldelta(time - now)}.", color=discord.Color.orange()))
                 except Exception:
-                    return
+                    pass
+            except Exception:
+                pass
+            return True
 
     async def report_possible_raid_phrase(self, msg, user, domain):
         channel = msg.guild.get_channel(self.bot.settings.guild().channel_reports)
@@ -125,50 +250,38 @@ class Report:
         embed.set_footer(text="✅ to pardon, 💀 to ban and add new raid phrase")
         
         report_msg = await channel.send(ping_string, embed=embed)
-        report_reactions = ['✅', '💀']
+        await self.open(report_msg, "raid_phrase", user, domain=domain)
 
-        ctx = await self.bot.get_context(report_msg, cls=context.Context)
-        prompt_data = context.PromptDataReaction(report_msg, report_reactions)
-        
-        while True:
-            self.pending_tasks[report_msg.id] = "NOT TERMINATED"
-            reaction, reactor = await ctx.prompt_reaction(prompt_data)
-            if reaction == "TERMINATE":
-                return            
-            
-            if not self.bot.settings.permissions.hasAtLeast(user.guild, user, 5) or reaction not in report_reactions:
-                await report_msg.remove_reaction(reaction, reactor)
-                
-            if reaction == '✅':
-                ctx.author = ctx.message.author = reactor
-                unmute = self.bot.get_command("unmute")
-                if unmute is not None:
-                    try:
-                        await unmute(ctx=ctx, user=user, reason="Reviewed by a moderator.")
-                    except Exception:
-                        pass
-                    await report_msg.delete()
-                else:
-                    await ctx.send_warning("I wasn't able to unmute them.")
-                return
-            elif reaction == '💀':
-                ctx.author = ctx.message.author = reactor
-                ban = self.bot.get_command("ban")
-                if ban is not None:
-                    try:
-                        await ban(ctx=ctx, user=user, reason="Raid phrase detected")
-                    except Exception:
-                        pass
-                    await report_msg.delete()
-                else:
-                    await ctx.send_warning("I wasn't able to ban them.")
-
-                done = await self.bot.settings.add_raid_phrase(domain)
-                if done:
-                    await channel.send(f"{domain} was added to the raid phrase list.", delete_after=5)
-                else:
-                    await channel.send(f"{domain} was already in the raid phrase list.", delete_after=5)
-                return
+    async def handle_raid_phrase_report(self, ctx, report, user, reaction):
+        if reaction == '✅':
+            unmute = self.bot.get_command("unmute")
+            if unmute is not None:
+                try:
+                    await unmute(ctx=ctx, user=user, reason="Reviewed by a moderator.")
+                except Exception:
+                    pass
+                await ctx.message.delete()
+            else:
+                await ctx.send_warning("I wasn't able to unmute them.")
+            return True
+
+        elif reaction == '💀':
+            ban = self.bot.get_command("ban")
+            if ban is not None:
+                try:
+                    await ban(ctx=ctx, user=user, reason="Raid phrase detected")
+                except Exception:
+                    pass
+                await ctx.message.delete()
+            else:
+                await ctx.send_warning("I wasn't able to ban them.")
+
+            done = await self.bot.settings.add_raid_phrase(report.domain)
+            if done:
+                await ctx.channel.send(f"{report.domain} was added to the raid phrase list.", delete_after=5)
+            else:
+                await ctx.channel.send(f"{report.domain} was already in the raid phrase list.", delete_after=5)
+            return True
 
     async def prompt_time(self, ctx):
         prompt_data = context.PromptData(value_name="duration", 
@@ -1,15 +1,57 @@
-import math
 import traceback
 from random import randint
 
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 import cogs.utils.context as context
+from cogs.utils.levels import level_for_xp
+from cogs.utils.message_pipeline import MessageContext, Stage
 
 
 class Xp(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        # XP and level increments earned since the last flush, by user ID
+        self.pending_xp = {}
+        # increments that are being written out right now; Settings adds them to the cached
+        # User documents once the write succeeds
+        self.flushing_xp = {}
+        self.flush_xp.start()
+        self.bot.pipeline.register("xp", self.xp_stage, Stage.MONITORS)
+
+    def cog_unload(self):
+        self.bot.pipeline.unregister("xp")
+        # cancelling the loop runs flush_xp's after_loop, which writes out what's left
+        self.flush_xp.cancel()
+
+    @tasks.loop(seconds=5)
+    async def flush_xp(self):
+        """Background task that writes the buffered XP increments to the database
+        in a single bulk write."""
+
+        await self.flush_pending_xp()
+
+    @flush_xp.after_loop
+    async def flush_xp_on_unload(self):
+        await self.flush_pending_xp()
+
+    async def flush_pending_xp(self):
+        pending, self.pending_xp = self.pending_xp, {}
+        if not pending:
+            return
+
+        self.flushing_xp = pending
+        try:
+            await self.bot.settings.bulk_inc_xp(pending)
+        except Exception:
+            # put the increments back so they're retried on the next flush
+            for _id, (xp, levels) in pending.items():
+                current = self.pending_xp.setdefault(_id, [0, 0])
+                current[0] += xp
+                current[1] += levels
+            traceback.print_exc()
+        finally:
+            self.flushing_xp = {}
 
     @commands.Cog.listener()
     async def on_member_join(self, member: discord.Member) -> None:
@@ -32,28 +74,31 @@ class Xp(commands.Cog):
         roles_to_add = await self.assess_new_roles(level, db)
         await self.add_new_roles(member, roles_to_add)
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        if not message.guild:
-            return
-        if message.guild.id != self.bot.settings.guild_id:
-            return
-        if message.author.bot:
-            return
-        if message.channel.id == self.bot.settings.guild().channel_botspam:
+    async def xp_stage(self, ctx: MessageContext):
+        message = ctx.message
+        if message.channel.id == ctx.db.channel_botspam:
             return
 
+        # cached, so this normally doesn't touch the database
         user = await self.bot.settings.user(id=message.author.id)
-        db = self.bot.settings.guild()
+
+        db = ctx.db
         if user.is_xp_frozen or user.is_clem:
             return
 
         xp_to_add = randint(0, 11)
-        new_xp, level_before = await self.bot.settings.inc_xp(message.author.id, xp_to_add)
-        new_level = await self.get_level(new_xp)
-
-        if new_level > level_before:
-            await self.bot.settings.inc_level(message.author.id)
+        pending = self.pending_xp.setdefault(message.author.id, [0, 0])
+        pending[0] += xp_to_add
+
+        # the cached document doesn't include increments that haven't been written yet
+        flushing = self.flushing_xp.get(message.author.id, (0, 0))
+        xp = user.xp + flushing[0] + pending[0]
+        level = user.level + flushing[1] + pending[1]
+        new_level = await self.get_level(xp)
+        if new_level > level:
+            level += 1
+            pending[1] += 1
+        self.bot.settings.xp_leaderboard.update(user._id, xp, level)
 
         roles_to_add = await self.assess_new_roles(new_level, db)
         await self.add_new_roles(message, roles_to_add)
@@ -86,12 +131,7 @@ class Xp(commands.Cog):
                         await obj.add_roles(role)
 
     async def get_level(self, current_xp):
-        level = 0
-        xp = 0
-        while xp <= current_xp:
-            xp = xp + 45 * level * (math.floor(level / 10) + 1)
-            level += 1
-        return level
+        return level_for_xp(current_xp)
 
     async def info_error(self,  ctx: context.Context, error):
         if (isinstance(error, commands.MissingRequiredArgument)
@@ -0,0 +1,63 @@
+"""
+An in-memory index of birthdays by date. It's loaded from the database once a day, and
+kept current by the commands that set and remove birthdays, so finding whose birthday it
+is doesn't query the database.
+"""
+
+
+class BirthdayIndex:
+    def __init__(self):
+        self.loaded = False
+        # (month, day) -> IDs of the users whose birthday it is
+        self._by_date = {}
+        # user ID -> (month, day)
+        self._dates = {}
+
+    def __len__(self) -> int:
+        return len(self._dates)
+
+    def load(self, birthdays) -> None:
+        """Replace the index's contents.
+
+        Parameters
+        ----------
+        birthdays : iterable
+            (_id, [month, day]) of every user who has a birthday set
+        """
+
+        self._by_date = {}
+        self._dates = {}
+        for _id, birthday in birthdays:
+            self.set(_id, birthday)
+        self.loaded = True
+
+    def set(self, _id: int, birthday) -> None:
+        """Set or remove a user's birthday.
+
+        Parameters
+        ----------
+        _id : int
+            The user's ID
+        birthday : list
+            [month, day], or None if they no longer have a birthday
+        """
+
+        old = self._dates.pop(_id, None)
+        if old is not None:
+            users = self._by_date[old]
+            users.discard(_id)
+            if not users:
+                del self._by_date[old]
+
+        if birthday:
+            date = (birthday[0], birthday[1])
+            self._dates[_id] = date
+            self._by_date.setdefault(date, set()).add(_id)
+
+    def on(self, month: int, day: int) -> set:
+        """IDs of the users whose birthday is on the given date"""
+
+        return set(self._by_date.get((month, day), ()))
+
+    def is_birthday(self, _id: int, month: int, day: int) -> bool:
+        return self._dates.get(_id) == (month, day)
@@ -0,0 +1,123 @@
+from collections import Counter
+
+from pymongo import UpdateOne
+
+"""
+Moderation statistics for !raidstats and !casestats. Instead of scanning every case when
+the commands are run, counters are kept in the case_stats collection and incremented as
+cases are added, so reading them is a lookup by ID. `rebuild()` recomputes the counters
+from the cases collection, to backfill them for cases that were added before they existed.
+
+There is one CaseStats document with how many cases each kind of raid caused, and one per
+mod with their total number of cases and how often they gave each reason.
+"""
+
+RAIDS = "raids"
+# reasons the antiraid gives its cases, by the name shown in !raidstats
+RAID_REASONS = {
+    "Join spam": "Join spam detected",
+    "Join spam over time": "Join spam over time detected",
+    "Raid phrase": "Raid phrase detected",
+    "Ping spam": "Ping spam",
+    "Message spam": "Message spam",
+}
+# left out of a mod's top reasons, since these cases are made by the bot on their behalf
+IGNORED_REASONS = {"temporary mute expired"}
+
+
+def mod_key(mod_id: int) -> str:
+    return f"mod:{mod_id}"
+
+
+def normalize_reason(reason: str) -> str:
+    """Fold reasons that only differ in case or punctuation together"""
+
+    return ''.join(c for c in reason.lower() if c.isalnum() or c == " ").strip()
+
+
+def count(cases, counts: dict = None) -> dict:
+    """Count a batch of cases.
+
+    Parameters
+    ----------
+    cases : iterable
+        (mod_id, reason) of each case
+    counts : dict, optional
+        Counts to add to, by default empty
+
+    Returns
+    -------
+    dict
+        CaseStats ID -> [total, Counter of counts]
+    """
+
+    counts = {} if counts is None else counts
+    for mod_id, reason in cases:
+        reason = reason or ""
+        raids = [name for name, phrase in RAID_REASONS.items() if phrase in reason]
+        if raids:
+            stats = counts.setdefault(RAIDS, [0, Counter()])
+            stats[0] += 1
+            stats[1].update(raids)
+
+        stats = counts.setdefault(mod_key(mod_id), [0, Counter()])
+        stats[0] += 1
+        reason = normalize_reason(reason)
+        # empty reasons can't be used as a field name
+        if reason and reason not in IGNORED_REASONS:
+            stats[1][reason] += 1
+    return counts
+
+
+def increments(cases, sign: int = 1) -> list:
+    """The writes that add a batch of cases to the counters, or remove them if `sign` is -1.
+
+    Parameters
+    ----------
+    cases : iterable
+        (mod_id, reason) of each case
+    sign : int, optional
+        1 to count the cases, -1 to uncount them
+
+    Returns
+    -------
+    list
+        UpdateOnes for the case_stats collection
+    """
+
+    requests = []
+    for _id, (total, counter) in count(cases).items():
+        inc = {"total": sign * total}
+        inc.update({f"counts.{key}": sign * value for key, value in counter.items()})
+        requests.append(UpdateOne({"_id": _id}, {"$inc": inc}, upsert=True))
+    return requests
+
+
+def rebuild(cases_collection, stats_collection) -> int:
+    """Recompute every counter from the cases collection. Blocking.
+
+    Parameters
+    ----------
+    cases_collection : pymongo.collection.Collection
+        The cases collection to read
+    stats_collection : pymongo.collection.Collection
+        The case_stats collection to replace the contents of
+
+    Returns
+    -------
+    int
+        Number of cases counted
+    """
+
+    counts = {}
+    total = 0
+    for document in cases_collection.find({}, {"cases.mod_id": 1, "cases.reason": 1}):
+        cases = [(case.get("mod_id"), case.get("reason")) for case in document.get("cases", [])]
+        total += len(cases)
+        count(cases, counts)
+
+    stats_collection.delete_many({})
+    if counts:
+        stats_collection.insert_many(
+            {"_id": _id, "total": n, "counts": dict(counter)} for _id, (n, counter) in counts.items())
+    return total
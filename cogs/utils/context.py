@@ -94,14 +94,8 @@ class Context(commands.Context):
             return res
             
         if info.timeout is None:
-            while True:
-                try:
-                    reaction, reactor = await self.bot.wait_for('reaction_add', timeout=300.0, check=wait_check)
-                    if reaction is not None:
-                        return str(reaction.emoji), reactor    
-                except asyncio.TimeoutError:
-                    if self.bot.report.pending_tasks.get(info.message.id) == "TERMINATE":
-                        return "TERMINATE", None
+            reaction, reactor = await self.bot.wait_for('reaction_add', check=wait_check)
+            return str(reaction.emoji), reactor
         else:
             try:
                 reaction, reactor = await self.bot.wait_for('reaction_add', timeout=info.timeout, check=wait_check)
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+"""
+A bounded thread pool that all blocking database calls go through, so a slow query
+never stalls the event loop. Every call is recorded under a name so we can see which
+queries are slow and how many calls are waiting for a free worker.
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class CallStats:
+    __slots__ = ("calls", "errors", "total_time", "max_time", "total_wait")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.total_wait = 0.0
+
+    @property
+    def avg_time(self) -> float:
+        return self.total_time / self.calls if self.calls else 0.0
+
+    @property
+    def avg_wait(self) -> float:
+        return self.total_wait / self.calls if self.calls else 0.0
+
+
+class DatabaseExecutor:
+    def __init__(self, max_workers: int = 8, slow_call_threshold: float = 1.0):
+        """Initialize the executor
+
+        Parameters
+        ----------
+        max_workers : int
+            Number of threads that can talk to the database at once
+        slow_call_threshold : float
+            Calls that take longer than this many seconds (queueing included) are logged
+        """
+
+        self.max_workers = max_workers
+        self.slow_call_threshold = slow_call_threshold
+        self.stats = {}
+        # calls that were submitted and haven't returned yet, queued or running
+        self.in_flight = 0
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of calls waiting for a free worker thread."""
+
+        return max(0, self.in_flight - self.max_workers)
+
+    async def run(self, name: str, func, *args, **kwargs):
+        """Run a blocking function on the database thread pool and wait for the result.
+
+        Parameters
+        ----------
+        name : str
+            Name to record the call's latency under
+        func : callable
+            The blocking function to run
+
+        Returns
+        -------
+        Any
+            Whatever `func` returned
+        """
+
+        started = None
+
+        def call():
+            nonlocal started
+            started = time.perf_counter()
+            return func(*args, **kwargs)
+
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = CallStats()
+
+        submitted = time.perf_counter()
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, call)
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            finished = time.perf_counter()
+            stats.calls += 1
+            if started is not None:
+                stats.total_time += finished - started
+                stats.max_time = max(stats.max_time, finished - started)
+                stats.total_wait += started - submitted
+
+            if finished - submitted > self.slow_call_threshold:
+                logger.warning(f"Slow database call {name}: {finished - submitted:.2f}s ({self.queue_depth} queued)")
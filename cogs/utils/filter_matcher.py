@@ -0,0 +1,145 @@
+from collections import deque
+
+"""
+An Aho-Corasick automaton over the guild's filter words. It is built once from
+the list of FilterWords and lets the word filter check a message against every
+word with a single pass over each normalized variant of the message, instead of
+one substring search per word.
+"""
+
+
+class FilterMatcher:
+    def __init__(self, words):
+        """Build the automaton for the given filter words.
+
+        Parameters
+        ----------
+        words : list
+            The FilterWord documents to match against
+        """
+
+        self.words = list(words)
+
+        # trie transitions, failure links and output pattern ids for each state
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [set()]
+        self._pattern_ids = {}
+
+        # pattern id -> indices of the words whose lowercased text is that pattern
+        self._by_word = {}
+        # same as above, restricted to words that aren't marked as false positives
+        self._by_word_strict = {}
+        # pattern id -> indices of non false positive words whose text without spaces is that pattern
+        self._by_nospace_strict = {}
+
+        for i, word in enumerate(self.words):
+            text = word.word.lower()
+            word_id = self._add(text)
+            self._by_word.setdefault(word_id, []).append(i)
+            if not word.false_positive:
+                self._by_word_strict.setdefault(word_id, []).append(i)
+                nospace_id = self._add("".join(text.split()))
+                self._by_nospace_strict.setdefault(nospace_id, []).append(i)
+
+        self._build()
+
+    def _add(self, pattern: str) -> int:
+        if pattern in self._pattern_ids:
+            return self._pattern_ids[pattern]
+
+        pattern_id = len(self._pattern_ids)
+        self._pattern_ids[pattern] = pattern_id
+
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(set())
+                self._goto[state][ch] = nxt
+            state = nxt
+        self._out[state].add(pattern_id)
+        return pattern_id
+
+    def _build(self) -> None:
+        # states at depth 1 fail back to the root, which they are initialized to
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] |= self._out[self._fail[nxt]]
+
+        # an empty pattern is contained in every string
+        for state in range(1, len(self._out)):
+            self._out[state] |= self._out[0]
+
+    def _search(self, text: str) -> set:
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set(out[0])
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found |= out[state]
+        return found
+
+    def find(self, folded: str, without_spaces: str, without_spaces_and_punctuation: str, spaceless_words: bool = True) -> list:
+        """Find every filter word contained in a message.
+
+        A word matches if it appears in the folded message. Words that aren't marked
+        as false positives also match if they appear in the message with whitespace
+        and punctuation removed, and, if `spaceless_words` is set, if they appear there
+        with their own whitespace removed. False positive words must appear as a whole word.
+
+        Parameters
+        ----------
+        folded : str
+            The folded, lowercased message
+        without_spaces : str
+            `folded` with all whitespace removed
+        without_spaces_and_punctuation : str
+            `without_spaces` with all punctuation removed
+        spaceless_words : bool, optional
+            Whether to also match words with their whitespace removed, by default True
+
+        Returns
+        -------
+        list
+            The FilterWords that matched, in the order they are stored in the guild
+        """
+
+        if not self.words:
+            return []
+
+        candidates = set()
+        for pattern_id in self._search(folded):
+            candidates.update(self._by_word.get(pattern_id, ()))
+        for pattern_id in self._search(without_spaces):
+            candidates.update(self._by_word_strict.get(pattern_id, ()))
+        for pattern_id in self._search(without_spaces_and_punctuation):
+            candidates.update(self._by_word_strict.get(pattern_id, ()))
+            if spaceless_words:
+                candidates.update(self._by_nospace_strict.get(pattern_id, ()))
+
+        tokens = None
+        hits = []
+        for i in sorted(candidates):
+            word = self.words[i]
+            if word.false_positive:
+                if tokens is None:
+                    tokens = set(folded.split())
+                if word.word.lower() not in tokens:
+                    continue
+            hits.append(word)
+
+        return hits
@@ -0,0 +1,72 @@
+import asyncio
+import time
+
+import discord
+from cogs.utils.lru_cache import LRUCache
+
+"""
+Caches the result of resolving invite links for the invite filter, so a spam wave posting
+the same invite doesn't make an API call per message. Invites that don't exist are cached
+too, and concurrent lookups of the same code share one request.
+"""
+
+
+class InviteCache:
+    def __init__(self, fetch_invite, ttl: float = 600, not_found_ttl: float = 300, max_size: int = 5000):
+        """Initialize the cache
+
+        Parameters
+        ----------
+        fetch_invite : coroutine function
+            Resolves an invite code, raising discord.NotFound if it doesn't exist
+        ttl : float
+            Seconds a resolved invite is cached for
+        not_found_ttl : float
+            Seconds an invite that doesn't exist is cached for
+        max_size : int
+            Number of invite codes to keep
+        """
+
+        self.fetch_invite = fetch_invite
+        self.ttl = ttl
+        self.not_found_ttl = not_found_ttl
+        # code -> (expiry, invite or None if it doesn't exist)
+        self._entries = LRUCache(max_size)
+        self._in_flight = {}
+
+    async def resolve(self, invite: str):
+        """Resolve an invite link or code.
+
+        Parameters
+        ----------
+        invite : str
+            The invite link or code
+
+        Returns
+        -------
+        discord.Invite
+            The invite, or None if it doesn't exist
+        """
+
+        code = discord.utils.resolve_invite(invite)
+        entry = self._entries.get(code)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+
+        future = self._in_flight.get(code)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch(code))
+            self._in_flight[code] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(code, None))
+        # shielded so one message's handler being cancelled doesn't cancel the others' lookup
+        return await asyncio.shield(future)
+
+    async def _fetch(self, code: str):
+        try:
+            invite = await self.fetch_invite(code)
+        except discord.NotFound:
+            self._entries[code] = (time.monotonic() + self.not_found_ttl, None)
+            return None
+
+        self._entries[code] = (time.monotonic() + self.ttl, invite)
+        return invite
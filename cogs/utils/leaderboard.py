@@ -0,0 +1,122 @@
+from bisect import bisect_left, bisect_right, insort
+
+"""
+An in-memory copy of the XP leaderboard. It's loaded from the database once, using the
+(xp, _id) index on the users collection, and then kept current by the XP monitor, so
+rank lookups are a binary search and pages can be read at any depth without querying
+the database.
+"""
+
+
+class LeaderboardEntry:
+    __slots__ = ("_id", "xp", "level")
+
+    def __init__(self, _id: int, xp: int, level: int):
+        self._id = _id
+        self.xp = xp
+        self.level = level
+
+
+class Leaderboard:
+    def __init__(self):
+        self.loaded = False
+        # (-xp, -_id) of every user, so that ascending order is the order of the leaderboard
+        self._keys = []
+        self._users = {}
+
+    def load(self, entries) -> None:
+        """Replace the leaderboard's contents.
+
+        Parameters
+        ----------
+        entries : iterable
+            (_id, xp, level) of every user
+        """
+
+        self._users = {_id: LeaderboardEntry(_id, xp, level) for _id, xp, level in entries}
+        self._keys = sorted((-entry.xp, -entry._id) for entry in self._users.values())
+        self.loaded = True
+
+    def update(self, _id: int, xp: int, level: int) -> None:
+        """Set a user's XP and level, moving them to their new position.
+
+        Parameters
+        ----------
+        _id : int
+            The user's ID
+        xp : int
+            The user's new XP
+        level : int
+            The user's new level
+        """
+
+        if not self.loaded:
+            return
+
+        old = self._users.get(_id)
+        if old is None:
+            insort(self._keys, (-xp, -_id))
+        elif old.xp != xp:
+            del self._keys[bisect_left(self._keys, (-old.xp, -_id))]
+            insort(self._keys, (-xp, -_id))
+        self._users[_id] = LeaderboardEntry(_id, xp, level)
+
+    def track(self, _id: int, xp: int, level: int) -> None:
+        """Add a user to the leaderboard if they aren't on it yet, e.g. because their
+        User document was just created. Users who are already on it are left alone, since
+        their XP in memory can be newer than what's in the database.
+        """
+
+        if _id not in self._users:
+            self.update(_id, xp, level)
+
+    def rank(self, xp: int) -> tuple:
+        """Get the rank of a user with the given XP.
+
+        Parameters
+        ----------
+        xp : int
+            The user's XP
+
+        Returns
+        -------
+        tuple
+            (number of users with at least that much XP, total number of users)
+        """
+
+        return (bisect_right(self._keys, (-xp, float("inf"))), len(self._keys))
+
+    def count(self, is_member) -> int:
+        """Number of users on the leaderboard for which `is_member(_id)` is true"""
+
+        return sum(1 for _, _id in self._keys if is_member(-_id))
+
+    def page(self, is_member, start: int, count: int) -> list:
+        """Get a slice of the leaderboard, skipping users for which `is_member(_id)` is false.
+
+        Parameters
+        ----------
+        is_member : callable
+            Whether a user ID should be shown on the leaderboard
+        start : int
+            Position of the first user to return, counting only users that are shown
+        count : int
+            Maximum number of users to return
+
+        Returns
+        -------
+        list
+            (position, LeaderboardEntry) pairs, highest XP first
+        """
+
+        entries = []
+        position = 0
+        for _, _id in self._keys:
+            if not is_member(-_id):
+                continue
+            if position >= start:
+                entries.append((position, self._users[-_id]))
+                if len(entries) == count:
+                    break
+            position += 1
+        return entries
@@ -0,0 +1,84 @@
+from bisect import bisect_right
+from math import floor
+
+"""
+The XP curve shared by the XP monitor and the profile commands. Going from level `l` to
+`l + 1` costs 45 * l * (floor(l / 10) + 1) XP. The cumulative thresholds are kept in a
+table that is extended on demand, so both directions of the lookup are a list index or
+a binary search instead of walking the curve level by level.
+"""
+
+# _thresholds[n] is the total XP needed to reach level n
+_thresholds = [0]
+
+
+def _extend(level: int) -> None:
+    while len(_thresholds) <= level:
+        prev = len(_thresholds) - 1
+        _thresholds.append(_thresholds[-1] + 45 * prev * (floor(prev / 10) + 1))
+
+
+# covers every level anyone on the server is realistically going to reach
+_extend(1000)
+
+
+def xp_for_next_level(_next: int) -> int:
+    """Magic formula to determine XP thresholds for levels
+
+    Parameters
+    ----------
+    _next : int
+        The level to get the threshold of
+
+    Returns
+    -------
+    int
+        The total XP needed to reach that level
+    """
+
+    if _next <= 0:
+        return 0
+    _extend(_next)
+    return _thresholds[_next]
+
+
+def level_for_xp(xp: int) -> int:
+    """Determine the level a user with a given amount of XP should be at. This is the
+    first level whose threshold is more than `xp`.
+
+    Parameters
+    ----------
+    xp : int
+        The user's XP
+
+    Returns
+    -------
+    int
+        The user's level
+    """
+
+    while _thresholds[-1] <= xp:
+        _extend(2 * len(_thresholds))
+    return bisect_right(_thresholds, xp)
+
+
+if __name__ == "__main__":
+    # microbenchmark: python -m cogs.utils.levels
+    import timeit
+
+    def level_for_xp_loop(current_xp):
+        # the level by level walk this module replaced
+        level = 0
+        xp = 0
+        while xp <= current_xp:
+            xp = xp + 45 * level * (floor(level / 10) + 1)
+            level += 1
+        return level
+
+    for level in (1, 10, 50, 100, 250, 500):
+        xp = xp_for_next_level(level) + 1
+        assert level_for_xp(xp) == level_for_xp_loop(xp)
+        n = 10000
+        loop = timeit.timeit(lambda: level_for_xp_loop(xp), number=n) / n * 1e6
+        table = timeit.timeit(lambda: level_for_xp(xp), number=n) / n * 1e6
+        print(f"level {level:>3}: loop {loop:8.2f}us  table {table:6.2f}us")
@@ -0,0 +1,160 @@
+import asyncio
+import traceback
+from collections import Counter, deque
+from datetime import datetime
+
+import discord
+
+"""
+Sends the server log embeds to the private logs channel in batches. Embeds are queued and
+sent through a webhook, up to 10 per message, once a batch is full or `interval` seconds
+after the first one was queued. Webhooks have their own rate limit, so a flood of logs
+during a raid or purge doesn't slow down the bot's moderation actions. If the queue fills
+up faster than it can be sent, new embeds are dropped and a summary of what was dropped is
+sent once it has drained.
+"""
+
+# most embeds Discord allows in one message
+EMBEDS_PER_MESSAGE = 10
+
+
+class LogSink:
+    def __init__(self, bot, interval: float = 1.0, max_queue: int = 500):
+        """Initialize the sink
+
+        Parameters
+        ----------
+        bot : discord.Client
+            The bot, for its settings and to manage the webhook
+        interval : float
+            Longest time in seconds an embed waits for its batch to fill up
+        max_queue : int
+            Number of embeds that can be waiting, embeds past this are dropped
+        """
+
+        self.bot = bot
+        self.interval = interval
+        self.max_queue = max_queue
+        self.queue = deque()
+        # titles of the embeds that were dropped since the last summary
+        self.dropped = Counter()
+        self.webhook = None
+        # ID of a channel we couldn't make a webhook in
+        self._no_webhook_channel = None
+        self._wakeup = asyncio.Event()
+        self._flusher = None
+
+    def start(self) -> None:
+        if self._flusher is None:
+            self._flusher = self.bot.loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the sink after sending what's left in the queue"""
+
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
+
+    def send(self, embed: discord.Embed) -> None:
+        """Queue an embed to be logged.
+
+        Parameters
+        ----------
+        embed : discord.Embed
+            The log
+        """
+
+        if len(self.queue) >= self.max_queue:
+            self.dropped[embed.title or "Untitled"] += 1
+            return
+
+        self.queue.append(embed)
+        if len(self.queue) >= EMBEDS_PER_MESSAGE:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            if not self.queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+
+            # give the batch a chance to fill up
+            if len(self.queue) < EMBEDS_PER_MESSAGE:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+
+            try:
+                await self.flush()
+            except Exception:
+                traceback.print_exc()
+
+    async def flush(self) -> None:
+        """Send everything in the queue"""
+
+        while self.queue:
+            batch = [self.queue.popleft() for _ in range(min(EMBEDS_PER_MESSAGE, len(self.queue)))]
+            await self._deliver(batch)
+
+        if self.dropped:
+            embed = discord.Embed(title="Logs dropped", color=discord.Color.dark_grey())
+            embed.description = "Too many events to log, these weren't:\n" + "\n".join(
+                f"**{title}**: {count}" for title, count in self.dropped.most_common(20))
+            embed.timestamp = datetime.now()
+            self.dropped.clear()
+            await self._deliver([embed])
+
+    async def _deliver(self, embeds: list) -> None:
+        channel = self._channel()
+        if channel is None:
+            return
+
+        webhook = await self._get_webhook(channel)
+        if webhook is not None:
+            try:
+                await webhook.send(username=self.bot.user.name, avatar_url=self.bot.user.avatar_url, embeds=embeds)
+                return
+            except discord.NotFound:
+                # deleted from the channel, make a new one next time
+                self.webhook = None
+            except Exception:
+                traceback.print_exc()
+
+        for embed in embeds:
+            await channel.send(embed=embed)
+
+    def _channel(self):
+        guild = self.bot.get_guild(self.bot.settings.guild_id)
+        if guild is None:
+            return None
+        return guild.get_channel(self.bot.settings.guild().channel_private)
+
+    async def _get_webhook(self, channel):
+        if self.webhook is not None and self.webhook.channel_id == channel.id:
+            return self.webhook
+
+        self.webhook = None
+        if self._no_webhook_channel == channel.id:
+            return None
+
+        webhook_id = self.bot.settings.guild().logging_webhook
+        if webhook_id is not None:
+            try:
+                webhook = await self.bot.fetch_webhook(webhook_id)
+                if webhook.channel_id == channel.id:
+                    self.webhook = webhook
+                    return webhook
+            except Exception:
+                pass
+
+        try:
+            self.webhook = await channel.create_webhook(name="logging")
+        except Exception:
+            # no permission to manage webhooks, we fall back to sending to the channel
+            self._no_webhook_channel = channel.id
+            return None
+        await self.bot.settings.save_logging_webhook(self.webhook.id)
+        return self.webhook
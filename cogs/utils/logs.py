@@ -1,5 +1,7 @@
 import discord
 
+# longest description Discord allows in an embed
+EMBED_DESCRIPTION_LIMIT = 4096
 
 async def prepare_warn_log(author, user, case):
     embed = discord.Embed(title="Member Warned")
@@ -112,6 +114,58 @@ async def prepare_unmute_log(author, user, case):
     embed.timestamp = case.date
     return embed
 
+async def prepare_raid_ban_logs(author, bans):
+    """Collapse the bans of a raid into as few embeds as possible.
+
+    Parameters
+    ----------
+    author : discord.Member
+        Who performed the bans
+    bans : list
+        (user, case) pairs
+
+    Returns
+    -------
+    list
+        The embeds to send
+    """
+
+    # embed descriptions are capped at 4096 characters, so lines are added to an embed
+    # until the next one wouldn't fit
+    chunks = []
+    chunk, length = [], 0
+    for user, case in bans:
+        line = f"Case #{case._id} | {user} ({user.id}) | {case.reason}"[:EMBED_DESCRIPTION_LIMIT]
+        if chunk and length + 1 + len(line) > EMBED_DESCRIPTION_LIMIT:
+            chunks.append(chunk)
+            chunk, length = [], 0
+        length += len(line) + (1 if chunk else 0)
+        chunk.append((line, case))
+    if chunk:
+        chunks.append(chunk)
+
+    embeds = []
+    for chunk in chunks:
+        embed = discord.Embed(title=f"Members Banned ({len(chunk)})")
+        embed.color = discord.Color.blue()
+        embed.description = "\n".join(line for line, _ in chunk)
+        embed.add_field(name="Mod", value=f'{author} ({author.mention})', inline=True)
+        embed.timestamp = chunk[0][1].date
+        embeds.append(embed)
+    return embeds
+
+
+async def prepare_raid_ban_summary(banned, failures, elapsed):
+    embed = discord.Embed(title="Raid Bans")
+    embed.color = discord.Color.red() if failures else discord.Color.blue()
+    embed.add_field(name="Banned", value=len(banned), inline=True)
+    embed.add_field(name="Failed", value=len(failures), inline=True)
+    embed.add_field(name="Throughput", value=f"{len(banned) / elapsed if elapsed else 0:.1f} bans/s over {elapsed:.1f}s", inline=True)
+    if failures:
+        embed.add_field(name="Failures", value="\n".join(f"{user} ({user.id}): {error}" for user, error in failures[:15])[:1024], inline=False)
+    return embed
+
+
 def logging(logger):
     async def container(func):
         async def decorator(ctx, *args, **kwargs):
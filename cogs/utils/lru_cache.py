@@ -0,0 +1,64 @@
+from collections import OrderedDict
+
+"""
+A small least-recently-used cache with a bounded total size. Each entry's size is
+given by `sizeof`, which defaults to 1 so that the bound is a number of entries.
+"""
+
+
+class LRUCache:
+    def __init__(self, max_size: int, sizeof=None):
+        """Initialize the cache
+
+        Parameters
+        ----------
+        max_size : int
+            Largest total size of the entries kept in the cache
+        sizeof : callable, optional
+            Returns the size of a value, by default every value has size 1
+        """
+
+        self.max_size = max_size
+        self.size = 0
+        self._sizeof = sizeof or (lambda value: 1)
+        self._entries = OrderedDict()
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def keys(self) -> list:
+        return list(self._entries)
+
+    def get(self, key, default=None):
+        if key not in self._entries:
+            return default
+        self._entries.move_to_end(key)
+        return self._entries[key][0]
+
+    def __setitem__(self, key, value) -> None:
+        self.pop(key)
+
+        size = self._sizeof(value)
+        if size > self.max_size:
+            # would push everything else out and still not fit
+            return
+
+        self._entries[key] = (value, size)
+        self.size += size
+        while self.size > self.max_size:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.size -= evicted
+
+    def pop(self, key, default=None):
+        if key not in self._entries:
+            return default
+        value, size = self._entries.pop(key)
+        self.size -= size
+        return value
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.size = 0
@@ -0,0 +1,143 @@
+import asyncio
+import time
+import traceback
+
+from cogs.utils.normalize import normalize
+
+"""
+Messages sent in the main guild go through one pipeline instead of a separate on_message
+listener per cog. Each message gets a MessageContext with the things every stage needs,
+worked out once. Stages are grouped: groups run in order, and the stages inside a group
+run concurrently. If any stage in a group says it dealt with the message (e.g. the filter
+deleted it), the groups after it are skipped. The time each stage takes is recorded so
+we can see where time goes during a raid.
+"""
+
+
+class Stage:
+    # may delete the message, which stops the pipeline
+    FILTER = 0
+    # independent of each other, e.g. XP and antiraid
+    MONITORS = 1
+
+
+class MessageContext:
+    __slots__ = ("message", "member", "db", "level", "_text")
+
+    def __init__(self, bot, message):
+        """Work out what the stages need to know about a message
+
+        Parameters
+        ----------
+        bot : discord.Client
+            The bot, for its settings
+        message : discord.Message
+            A message sent in the main guild
+        """
+
+        self.message = message
+        self.member = message.guild.get_member(message.author.id) or message.author
+        # snapshot of the Guild document, so every stage sees the same settings
+        self.db = bot.settings.guild()
+        self.level = bot.settings.permissions.level_of(message.guild, self.member)
+        self._text = None
+
+    @property
+    def text(self):
+        """The normalized message content, see `cogs.utils.normalize`"""
+
+        if self._text is None:
+            self._text = normalize(self.message.content)
+        return self._text
+
+
+class StageStats:
+    __slots__ = ("calls", "errors", "stops", "total_time", "max_time")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.stops = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    @property
+    def avg_time(self) -> float:
+        return self.total_time / self.calls if self.calls else 0.0
+
+    def record(self, elapsed: float) -> None:
+        self.calls += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+
+
+class MessagePipeline:
+    def __init__(self):
+        # stage group -> {name: coroutine function}
+        self.groups = {}
+        self.stats = {}
+        self.total = StageStats()
+
+    def register(self, name: str, func, group: int) -> None:
+        """Add a stage to the pipeline.
+
+        Parameters
+        ----------
+        name : str
+            Name of the stage, which its latency is recorded under
+        func : coroutine function
+            Called with a MessageContext. Returns True if it dealt with the message and
+            later stages should be skipped.
+        group : int
+            One of the values in `Stage`
+        """
+
+        self.groups.setdefault(group, {})[name] = func
+        self.stats.setdefault(name, StageStats())
+
+    def unregister(self, name: str) -> None:
+        for stages in self.groups.values():
+            stages.pop(name, None)
+
+    async def _run_stage(self, name: str, func, ctx: MessageContext) -> bool:
+        stats = self.stats[name]
+        started = time.perf_counter()
+        try:
+            stop = bool(await func(ctx))
+        except Exception:
+            stats.errors += 1
+            traceback.print_exc()
+            stop = False
+        stats.record(time.perf_counter() - started)
+        if stop:
+            stats.stops += 1
+        return stop
+
+    async def run(self, ctx: MessageContext) -> bool:
+        """Run a message through the pipeline.
+
+        Parameters
+        ----------
+        ctx : MessageContext
+            The message to process
+
+        Returns
+        -------
+        bool
+            True if a stage dealt with the message and it shouldn't be processed further
+        """
+
+        started = time.perf_counter()
+        stop = False
+        for group in sorted(self.groups):
+            stages = list(self.groups[group].items())
+            if len(stages) == 1:
+                results = [await self._run_stage(*stages[0], ctx)]
+            else:
+                results = await asyncio.gather(*(self._run_stage(name, func, ctx) for name, func in stages))
+            if any(results):
+                stop = True
+                break
+
+        self.total.record(time.perf_counter() - started)
+        return stop
@@ -0,0 +1,222 @@
+import asyncio
+import json
+import sqlite3
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import discord
+
+"""
+A compact copy of the messages sent in the main guild, so deleted and edited messages can
+be logged after discord.py has dropped them from its cache. Only what the logs show is kept
+(IDs, content and attachment URLs) in an SQLite database. Messages are buffered in memory
+and written in batches, and messages older than the retention window are deleted. Message
+IDs are snowflakes, which start with their creation time, so the primary key doubles as
+the index for the retention window.
+"""
+
+
+class StoredMessage:
+    __slots__ = ("id", "channel_id", "author_id", "content", "attachments")
+
+    def __init__(self, id: int, channel_id: int, author_id: int, content: str, attachments: list):
+        self.id = id
+        self.channel_id = channel_id
+        self.author_id = author_id
+        self.content = content
+        self.attachments = attachments
+
+    @classmethod
+    def from_message(cls, message: discord.Message):
+        return cls(message.id, message.channel.id, message.author.id, message.content,
+                   [attachment.url for attachment in message.attachments])
+
+    @property
+    def created_at(self) -> datetime:
+        return discord.utils.snowflake_time(self.id)
+
+    def jump_url(self, guild_id: int) -> str:
+        return f"https://discord.com/channels/{guild_id}/{self.channel_id}/{self.id}"
+
+
+class MessageStore:
+    def __init__(self, path: str, retention: timedelta = timedelta(days=7), flush_interval: float = 2.0):
+        """Initialize the store
+
+        Parameters
+        ----------
+        path : str
+            The SQLite database file
+        retention : datetime.timedelta
+            How long messages are kept for
+        flush_interval : float
+            Seconds between writes of the buffered messages
+        """
+
+        self.path = path
+        self.retention = retention
+        self.flush_interval = flush_interval
+        # message ID -> StoredMessage, or None if it was deleted, waiting to be written
+        self.pending = {}
+        # what's being written right now, still read from memory until it's done
+        self._writing = {}
+        # one thread, so the connection is only ever used from it
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="message-store")
+        self._connection = None
+        self._last_prune = 0
+        self._flusher = None
+
+    def start(self, loop) -> None:
+        if self._flusher is None:
+            self._flusher = loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
+        await self._call(self._close)
+
+    async def _call(self, func, *args):
+        return await asyncio.get_event_loop().run_in_executor(self._executor, func, *args)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "id INTEGER PRIMARY KEY, channel_id INTEGER NOT NULL, author_id INTEGER NOT NULL, "
+                "content TEXT NOT NULL, attachments TEXT NOT NULL)")
+        return self._connection
+
+    def _close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def record(self, message: discord.Message) -> None:
+        """Remember a message that was sent or edited.
+
+        Parameters
+        ----------
+        message : discord.Message
+            The message
+        """
+
+        self.pending[message.id] = StoredMessage.from_message(message)
+
+    def update(self, stored: StoredMessage) -> None:
+        """Replace a stored message, e.g. with its content after an edit"""
+
+        self.pending[stored.id] = stored
+
+    def forget(self, message_id: int) -> None:
+        """Remove a message that was deleted and logged"""
+
+        self.pending[message_id] = None
+
+    async def get(self, message_id: int) -> StoredMessage:
+        """Look up a message.
+
+        Parameters
+        ----------
+        message_id : int
+            The message's ID
+
+        Returns
+        -------
+        StoredMessage
+            The message, or None if it isn't stored
+        """
+
+        return (await self.get_many([message_id])).get(message_id)
+
+    async def get_many(self, message_ids) -> dict:
+        """Look up many messages at once.
+
+        Parameters
+        ----------
+        message_ids : iterable
+            The messages' IDs
+
+        Returns
+        -------
+        dict
+            Message ID -> StoredMessage, for the messages that are stored
+        """
+
+        found = {}
+        missing = []
+        for message_id in message_ids:
+            for buffer in (self.pending, self._writing):
+                if message_id in buffer:
+                    if buffer[message_id] is not None:
+                        found[message_id] = buffer[message_id]
+                    break
+            else:
+                missing.append(message_id)
+
+        if missing:
+            found.update(await self._call(self._select, missing))
+        return found
+
+    def _select(self, message_ids: list) -> dict:
+        found = {}
+        connection = self._connect()
+        # sqlite limits the number of parameters in a query
+        for i in range(0, len(message_ids), 500):
+            chunk = message_ids[i:i + 500]
+            rows = connection.execute(
+                f"SELECT id, channel_id, author_id, content, attachments FROM messages WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+            for id, channel_id, author_id, content, attachments in rows:
+                found[id] = StoredMessage(id, channel_id, author_id, content, json.loads(attachments))
+        return found
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                traceback.print_exc()
+
+    async def flush(self) -> None:
+        """Write the buffered messages, and delete the ones that are past the retention window
+        every so often."""
+
+        pending, self.pending = self.pending, {}
+        prune_before = None
+        if time.monotonic() - self._last_prune > 3600:
+            self._last_prune = time.monotonic()
+            prune_before = discord.utils.time_snowflake(datetime.now(timezone.utc) - self.retention)
+
+        if pending or prune_before is not None:
+            self._writing = pending
+            try:
+                await self._call(self._write, pending, prune_before)
+            except Exception:
+                # put the batch back to be written with the next one, unless the messages
+                # have changed since, and try pruning again next time
+                for message_id, message in pending.items():
+                    self.pending.setdefault(message_id, message)
+                if prune_before is not None:
+                    self._last_prune = 0
+                raise
+            finally:
+                self._writing = {}
+
+    def _write(self, pending: dict, prune_before: int) -> None:
+        connection = self._connect()
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?)",
+                [(m.id, m.channel_id, m.author_id, m.content, json.dumps(m.attachments)) for m in pending.values() if m is not None])
+            connection.executemany(
+                "DELETE FROM messages WHERE id = ?",
+                [(message_id,) for message_id, m in pending.items() if m is None])
+            if prune_before is not None:
+                connection.execute("DELETE FROM messages WHERE id < ?", (prune_before,))
@@ -0,0 +1,46 @@
+import string
+from collections import namedtuple
+from functools import lru_cache
+
+from fold_to_ascii import fold
+
+"""
+Text normalization shared by the word filter, the nickname filter and the raid phrase
+detector. Text is folded to lowercase ASCII (with Cyrillic look-alikes mapped to the Latin
+letters they imitate), and the variants the filters match against are derived from that.
+The translation tables are built once, and results are memoized so that repeated
+identical messages, which is what raid spam usually looks like, skip the work entirely.
+"""
+
+# Cyrillic letters people use to dodge the filter, and the Latin letters they look like
+_HOMOGLYPHS = str.maketrans(u"абвгдеёжзийклмнопрстуфхцчшщъыьэюяАБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ",
+                            u"abBrdeex3nnKnmHonpcTyoxu4wwbbbeoRABBrDEEX3NNKNMHONPCTyOXU4WWbbbEOR")
+_PUNCTUATION = str.maketrans('', '', string.punctuation)
+
+NormalizedText = namedtuple("NormalizedText", ["folded", "without_spaces", "without_spaces_and_punctuation"])
+
+
+@lru_cache(maxsize=1024)
+def normalize(text: str) -> NormalizedText:
+    """Normalize text for filtering.
+
+    Parameters
+    ----------
+    text : str
+        The text to normalize, e.g. a message's content or a nickname
+
+    Returns
+    -------
+    NormalizedText
+        The folded, lowercased text, that text with all whitespace removed, and that
+        text with all whitespace and punctuation removed
+    """
+
+    if text.isascii():
+        # folding and the homoglyph table only touch non ASCII characters
+        folded = text.lower()
+    else:
+        folded = fold(text.translate(_HOMOGLYPHS).lower()).lower()
+
+    without_spaces = "".join(folded.split())
+    return NormalizedText(folded, without_spaces, without_spaces.translate(_PUNCTUATION))
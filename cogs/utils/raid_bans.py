@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+
+import cogs.utils.logs as logs
+import discord
+from data.case import Case
+
+"""
+Bans raiders in batches. Targets are queued and deduplicated, and whatever has queued up
+by the time the worker runs is banned together: case IDs are reserved in one call, the
+DMs and bans run concurrently, capped so we don't spend the whole raid waiting on
+Discord's rate limits, and the cases of the bans that went through are written with one
+bulk write. The public log gets as many bans per embed as fit instead of one message
+per ban.
+"""
+
+logger = logging.getLogger(__name__)
+
+# number of bans (and ban DMs) in flight at once
+BAN_CONCURRENCY = 5
+# seconds we remember that we banned someone by default, so we don't try to ban them again
+BANNED_TTL = 120
+
+
+class BanRequest:
+    __slots__ = ("user", "reason", "dm_user")
+
+    def __init__(self, user, reason: str, dm_user: bool):
+        self.user = user
+        self.reason = reason
+        self.dm_user = dm_user
+
+
+class RaidBanQueue:
+    def __init__(self, bot, concurrency: int = BAN_CONCURRENCY, remember_for: float = BANNED_TTL):
+        """Initialize the queue
+
+        Parameters
+        ----------
+        bot : discord.Client
+            The bot, to ban users and log with
+        concurrency : int
+            How many bans can be in flight at once
+        remember_for : float
+            Seconds a ban is remembered for, submitting the user again in that time does nothing
+        """
+
+        self.bot = bot
+        self.concurrency = concurrency
+        self.remember_for = remember_for
+        self.pending = {}
+        # IDs of the users whose bans are being carried out
+        self.in_progress = set()
+        # user ID -> when we banned them, oldest first. only bans that went through are
+        # remembered, so a failed ban can be retried the next time the user is submitted
+        self.banned = {}
+        self._worker = None
+
+    def _expire_banned(self) -> None:
+        cutoff = time.monotonic() - self.remember_for
+        while self.banned:
+            user_id, banned_at = next(iter(self.banned.items()))
+            if banned_at > cutoff:
+                break
+            del self.banned[user_id]
+
+    def submit(self, user: discord.Member, reason: str = "Raid phrase detected", dm_user: bool = False) -> bool:
+        """Queue a user to be banned.
+
+        Parameters
+        ----------
+        user : discord.Member
+            The user to ban
+        reason : str, optional
+            Reason for the ban, by default "Raid phrase detected"
+        dm_user : bool, optional
+            Whether to DM the user the ban log before banning them, by default False
+
+        Returns
+        -------
+        bool
+            False if the user was already queued or banned
+        """
+
+        self._expire_banned()
+        if user.id in self.pending or user.id in self.in_progress or user.id in self.banned:
+            return False
+
+        self.pending[user.id] = BanRequest(user, reason, dm_user)
+        if self._worker is None or self._worker.done():
+            self._worker = self.bot.loop.create_task(self._drain())
+        return True
+
+    async def _drain(self):
+        while self.pending:
+            batch, self.pending = list(self.pending.values()), {}
+            self.in_progress.update(request.user.id for request in batch)
+            try:
+                await self.ban_batch(batch)
+            except Exception:
+                logger.exception("Failed to ban a batch of raiders")
+            finally:
+                self.in_progress.difference_update(request.user.id for request in batch)
+
+    async def ban_batch(self, batch: list):
+        """Ban a batch of users.
+
+        Parameters
+        ----------
+        batch : list
+            The BanRequests to carry out
+        """
+
+        started = time.perf_counter()
+        settings = self.bot.settings
+        case_ids = await settings.reserve_case_ids(len(batch))
+        now = datetime.now()
+        cases = [
+            Case(
+                _id=case_id,
+                _type="BAN",
+                date=now,
+                mod_id=self.bot.user.id,
+                mod_tag=str(self.bot.user),
+                punishment="PERMANENT",
+                reason=request.reason
+            )
+            for request, case_id in zip(batch, case_ids)
+        ]
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        banned = []
+        failures = []
+
+        async def ban(request, case):
+            user = request.user
+            async with semaphore:
+                if request.dm_user:
+                    log = await logs.prepare_ban_log(self.bot.user, user, case)
+                    try:
+                        await user.send(f"You were banned from {user.guild.name}.\n\nThis action was performed automatically. If you think this was a mistake, please send a message here: https://www.reddit.com/message/compose?to=%2Fr%2FJailbreak", embed=log)
+                    except Exception:
+                        pass
+
+                try:
+                    await user.guild.ban(discord.Object(id=user.id), reason="Raid")
+                    self.banned[user.id] = time.monotonic()
+                    banned.append((user, case))
+                except Exception as e:
+                    failures.append((user, e))
+
+        await asyncio.gather(*(ban(request, case) for request, case in zip(batch, cases)))
+        # only bans that went through get a case, the IDs reserved for the others go unused
+        if banned:
+            await settings.add_cases({user.id: case for user, case in banned})
+        elapsed = time.perf_counter() - started
+
+        guild = batch[0].user.guild
+        db = settings.guild()
+        public_logs = guild.get_channel(db.channel_public)
+        if public_logs and banned:
+            # the private summary is sent even if the public logs can't be
+            try:
+                if len(banned) == 1:
+                    user, case = banned[0]
+                    log = await logs.prepare_ban_log(self.bot.user, user, case)
+                    log.remove_author()
+                    log.set_thumbnail(url=user.avatar_url)
+                    await public_logs.send(embed=log)
+                else:
+                    for log in await logs.prepare_raid_ban_logs(self.bot.user, banned):
+                        await public_logs.send(embed=log)
+            except Exception:
+                logger.exception("Failed to send the public raid ban logs")
+
+        logger.info(f"Raid bans: {len(banned)} banned, {len(failures)} failed in {elapsed:.2f}s")
+        private_logs = guild.get_channel(db.channel_private)
+        if private_logs and (len(batch) > 1 or failures):
+            await private_logs.send(embed=await logs.prepare_raid_ban_summary(banned, failures, elapsed))
+
+        return banned, failures
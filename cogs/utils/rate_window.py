@@ -0,0 +1,103 @@
+import time
+from collections import Counter, deque
+
+"""
+Sliding-window event counters for the antiraid detectors. Events are kept per key (a
+guild, a member, an account creation date...) in a deque of timestamps, so recording an
+event and counting the events in the window are amortized O(1). There is no cap on the
+number of keys or events; memory is bounded by dropping events once they fall out of the
+window, and keys are dropped once they have no events left.
+"""
+
+
+class SlidingWindow:
+    def __init__(self, rate: int, per: float):
+        """Initialize the window
+
+        Parameters
+        ----------
+        rate : int
+            Number of events allowed per window, the window is exceeded once there are more
+        per : float
+            Length of the window in seconds
+        """
+
+        self.rate = rate
+        self.per = per
+        # key -> deque of (timestamp, item)
+        self._events = {}
+        # key -> how many times each item occurs in the window
+        self._items = {}
+        self._last_sweep = time.monotonic()
+
+    def _evict(self, key, now: float) -> None:
+        events = self._events.get(key)
+        if events is None:
+            return
+
+        items = self._items[key]
+        cutoff = now - self.per
+        while events and events[0][0] <= cutoff:
+            _, item = events.popleft()
+            if item is not None:
+                items[item] -= 1
+                if not items[item]:
+                    del items[item]
+
+        if not events:
+            del self._events[key]
+            del self._items[key]
+
+    def _sweep(self, now: float) -> None:
+        # drop keys that haven't seen an event for a whole window
+        if now - self._last_sweep < self.per:
+            return
+        self._last_sweep = now
+        for key in list(self._events):
+            self._evict(key, now)
+
+    def hit(self, key, item=None, now: float = None) -> bool:
+        """Record an event.
+
+        Parameters
+        ----------
+        key
+            What the event is counted under
+        item : optional
+            Something to remember with the event, e.g. the member who caused it
+        now : float, optional
+            When the event happened, by default time.monotonic()
+
+        Returns
+        -------
+        bool
+            True if the window for this key now has more than `rate` events
+        """
+
+        now = time.monotonic() if now is None else now
+        self._sweep(now)
+        self._evict(key, now)
+
+        self._events.setdefault(key, deque()).append((now, item))
+        items = self._items.setdefault(key, Counter())
+        if item is not None:
+            items[item] += 1
+        return len(self._events[key]) > self.rate
+
+    def count(self, key, now: float = None) -> int:
+        """Number of events in the window for a key"""
+
+        self._evict(key, time.monotonic() if now is None else now)
+        return len(self._events.get(key, ()))
+
+    def contains(self, key, item, now: float = None) -> bool:
+        """Whether an event in the window for a key was recorded with `item`"""
+
+        self._evict(key, time.monotonic() if now is None else now)
+        return item in self._items.get(key, ())
+
+    def items(self, key, now: float = None) -> list:
+        """The distinct items recorded with the events in the window for a key, oldest first"""
+
+        self._evict(key, time.monotonic() if now is None else now)
+        return list(self._items.get(key, ()))
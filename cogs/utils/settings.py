@@ -1,18 +1,37 @@
+import asyncio
 import os
-from collections import Counter
+import time
+from collections import deque
 from typing import final
 
+import cogs.utils.case_stats as case_stats
 import discord
 import mongoengine
+from cogs.utils.birthdays import BirthdayIndex
+from cogs.utils.db_executor import DatabaseExecutor
+from cogs.utils.filter_matcher import FilterMatcher
+from cogs.utils.leaderboard import Leaderboard
+from cogs.utils.lru_cache import LRUCache
 from cogs.utils.tasks import Tasks
 from data.case import Case
 from data.cases import Cases
+from data.casestats import CaseStats
 from data.filterword import FilterWord
 from data.giveaway import Giveaway
 from data.guild import Guild
 from data.tag import Tag
 from data.user import User
 from discord.ext import commands
+from pymongo import ReturnDocument, UpdateOne
+
+# seconds a cached Guild document is trusted before it's fetched from the database again
+GUILD_CACHE_TTL = 30
+# number of threads that run database calls
+DB_WORKERS = 8
+# bytes of tag images kept in memory
+TAG_IMAGE_CACHE_SIZE = 32 * 1024 * 1024
+# number of User documents kept in memory
+USER_CACHE_SIZE = 10000
 
 
 class Settings(commands.Cog):
@@ -20,6 +39,9 @@ class Settings(commands.Cog):
     and the database. Information about the guild, users, cases, etc. can all be looked up from here,
     and additionally permissions can be calculated for a given user.
 
+    All blocking database calls are run on `self.db`, a bounded thread pool, so that slow
+    queries don't stall the event loop.
+
     Parameters
     ----------
     commands : commands.Cog
@@ -37,18 +59,66 @@ class Settings(commands.Cog):
         """
 
         mongoengine.register_connection(alias="default", name="botty")
-        self.tasks = None
         self.bot = bot
         self.guild_id = int(os.environ.get("BOTTY_MAINGUILD"))
+        # case IDs that were reserved but haven't been used yet, see `next_case_id()`
+        self._case_ids = deque()
+        # recently used User documents by ID, see `user()`
+        self._users = LRUCache(USER_CACHE_SIZE)
+        self._users_loading = {}
+        # what a new User document is created with
+        self._user_defaults = {field: value for field, value in User().to_mongo().items() if field != "_id"}
+        self.db = DatabaseExecutor(max_workers=DB_WORKERS)
+        # jobs can be scheduled right away, they start running in `load_tasks()`
+        self.tasks = Tasks(self.bot, self.db)
+        # snapshot of the main guild's document, see `guild()`
+        self._guild_cache = None
+        self._guild_cache_time = 0
+        self._guild_refreshing = False
+        # compiled matcher for the word filter, rebuilt lazily when the filter list changes
+        self._filter_matcher = None
+        self._filter_matcher_words = None
+        self._filter_matcher_key = None
+        # XP leaderboard, loaded from the database the first time it's needed
+        self.xp_leaderboard = Leaderboard()
+        self._leaderboard_loading = None
+        # users by birthday, see `load_birthdays()`
+        self.birthdays = BirthdayIndex()
+        # tags by name, and the images of recently used tags by GridFS id
+        self._tag_index = None
+        self._tag_index_tags = None
+        self._tag_images = LRUCache(TAG_IMAGE_CACHE_SIZE, sizeof=lambda image: len(image[0]))
+        self._tag_image_ids = {}
+        # reaction roles by message, see `reaction_role_index()`
+        self._rero_index = None
+        self._rero_index_mapping = None
         self.permissions = Permissions(self.bot, self)
 
         print("Loaded database")
 
     async def load_tasks(self):
-        self.tasks = Tasks(self.bot)
+        await self.tasks.start()
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        if after.guild.id == self.guild_id and before.roles != after.roles:
+            self.permissions.invalidate(after.id)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member):
+        if member.guild.id == self.guild_id:
+            self.permissions.invalidate(member.id)
+
+    @commands.Cog.listener()
+    async def on_guild_update(self, before: discord.Guild, after: discord.Guild):
+        if after.id == self.guild_id and before.owner_id != after.owner_id:
+            self.permissions.invalidate()
 
     def guild(self) -> Guild:
-        """Returns the state of the main guild from the database.
+        """Returns the state of the main guild from the database. The document is cached, and
+        replaced after one of the mutators in this class writes to it. Once it is older than
+        `GUILD_CACHE_TTL` seconds a refresh is started in the background, so that changes made
+        by another bot process or directly in the database are picked up.
 
         Returns
         -------
@@ -56,7 +126,80 @@ class Settings(commands.Cog):
             The Guild document object that holds information about the main guild.
         """
 
-        return Guild.objects(_id=self.guild_id).first()
+        if self._guild_cache is None:
+            # nothing cached yet, which only happens on startup
+            self._reload_guild()
+        elif time.monotonic() - self._guild_cache_time > GUILD_CACHE_TTL and not self._guild_refreshing:
+            self._guild_refreshing = True
+            self.bot.loop.create_task(self._refresh_guild())
+        return self._guild_cache
+
+    def _reload_guild(self) -> None:
+        # blocking, so outside of startup this must only be called on the database executor
+        self._guild_cache = Guild.objects(_id=self.guild_id).first()
+        self._guild_cache_time = time.monotonic()
+
+    async def _refresh_guild(self) -> None:
+        try:
+            await self.db.run("guild", self._reload_guild)
+        finally:
+            self._guild_refreshing = False
+
+    async def _update_guild(self, name: str, query: dict = None, **update):
+        """Run an update on the main guild's document, then replace the cached document.
+
+        Parameters
+        ----------
+        name : str
+            Name to record the database call under
+        query : dict, optional
+            Extra filters for the update, by default None
+        """
+
+        def update_guild():
+            res = Guild.objects(_id=self.guild_id, **(query or {})).update_one(**update)
+            self._reload_guild()
+            return res
+
+        return await self.db.run(name, update_guild)
+
+    async def _save_guild(self, name: str, g: Guild) -> None:
+        def save():
+            g.save()
+            self._reload_guild()
+
+        await self.db.run(name, save)
+
+    async def save(self, document: mongoengine.Document) -> None:
+        """Save a document that was returned by one of the lookups in this class,
+        without blocking the event loop.
+
+        Parameters
+        ----------
+        document : mongoengine.Document
+            The document to save
+        """
+
+        await self.db.run(f"save_{document._get_collection_name()}", document.save)
+
+    def filter_matcher(self) -> FilterMatcher:
+        """Returns the compiled matcher for the guild's filter words. It is built on first use
+        and rebuilt whenever a fresh Guild document has a different filter list.
+
+        Returns
+        -------
+        FilterMatcher
+            Matcher over the current Guild.filter_words
+        """
+
+        words = self.guild().filter_words
+        if words is not self._filter_matcher_words:
+            key = [(w.word, w.bypass, w.notify, w.false_positive, w.piracy) for w in words]
+            if self._filter_matcher is None or key != self._filter_matcher_key:
+                self._filter_matcher = FilterMatcher(words)
+                self._filter_matcher_key = key
+            self._filter_matcher_words = words
+        return self._filter_matcher
 
     async def get_nsa_channel(self, id) -> dict:
         """Returns the state of the main guild from the database.
@@ -87,7 +230,7 @@ class Settings(commands.Cog):
             "channel_id": channel_id,
             "webhook_id": webhook_id,
         }
-        g.save()
+        await self._save_guild("add_nsa_channel", g)
 
     async def all_rero_mappings(self):
         g = self.guild()
@@ -100,14 +243,14 @@ class Settings(commands.Cog):
         the_key = list(mapping.keys())[0]
         current[str(the_key)] = mapping[the_key]
         g.reaction_role_mapping = current
-        g.save()
+        await self._save_guild("add_rero_mapping", g)
 
     async def append_rero_mapping(self, message_id, mapping):
         g = self.guild()
         current = g.reaction_role_mapping
         current[str(message_id)] = current[str(message_id)] | mapping
         g.reaction_role_mapping = current
-        g.save()
+        await self._save_guild("append_rero_mapping", g)
 
     async def get_rero_mapping(self, id):
         g = self.guild()
@@ -116,48 +259,186 @@ class Settings(commands.Cog):
         else:
             return None
 
+    def reaction_role_index(self) -> dict:
+        """Returns the reaction roles of each message. The index is rebuilt whenever a fresh
+        Guild document has been loaded, which the mutators above do after writing.
+
+        Returns
+        -------
+        dict
+            Maps a message ID (int) to a dict that maps an emoji (str) to the ID of the role it gives
+        """
+
+        mapping = self.guild().reaction_role_mapping
+        if mapping is not self._rero_index_mapping:
+            self._rero_index = {int(message_id): dict(reactions) for message_id, reactions in mapping.items()}
+            self._rero_index_mapping = mapping
+        return self._rero_index
+
     async def delete_rero_mapping(self, id):
         g = self.guild()
         if str(id) in g.reaction_role_mapping.keys():
             g.reaction_role_mapping.pop(str(id))
-            g.save()
+            await self._save_guild("delete_rero_mapping", g)
 
     async def save_emoji_webhook(self, id):
-        g = Guild.objects(_id=self.guild_id).first()
-        g.emoji_logging_webhook = id
-        g.save()
+        await self._update_guild("save_emoji_webhook", set__emoji_logging_webhook=id)
 
-    async def leaderboard(self) -> list:
-        return User.objects[0:130].only('_id', 'xp').order_by('-xp', '-_id').select_related()
+    async def save_logging_webhook(self, id):
+        await self._update_guild("save_logging_webhook", set__logging_webhook=id)
+
+    async def load_leaderboard(self) -> Leaderboard:
+        """Load the XP leaderboard from the database if that hasn't happened yet. Concurrent
+        callers wait on the same load.
+
+        Returns
+        -------
+        Leaderboard
+            The loaded leaderboard
+        """
+
+        if not self.xp_leaderboard.loaded:
+            if self._leaderboard_loading is None:
+                def load():
+                    # walks the (xp, _id) index, so no in-memory sort on the server
+                    users = User._get_collection().find({}, {"_id": 1, "xp": 1, "level": 1}).sort([("xp", -1), ("_id", -1)])
+                    return [(u["_id"], u.get("xp", 0), u.get("level", 0)) for u in users]
+
+                self._leaderboard_loading = self.bot.loop.create_task(self.db.run("load_leaderboard", load))
+            try:
+                self.xp_leaderboard.load(await self._leaderboard_loading)
+            finally:
+                self._leaderboard_loading = None
+        return self.xp_leaderboard
+
+    async def leaderboard(self, guild: discord.Guild, start: int = 0, count: int = 100) -> list:
+        """Get a page of the XP leaderboard, only counting users who are in the guild.
+
+        Parameters
+        ----------
+        guild : discord.Guild
+            The guild whose members to show
+        start : int, optional
+            Position of the first user to return, by default 0
+        count : int, optional
+            Maximum number of users to return, by default 100
+
+        Returns
+        -------
+        list
+            (position, LeaderboardEntry) pairs, highest XP first
+        """
+
+        leaderboard = await self.load_leaderboard()
+        return leaderboard.page(lambda _id: guild.get_member(_id) is not None, start, count)
+
+    async def leaderboard_members(self, guild: discord.Guild) -> int:
+        leaderboard = await self.load_leaderboard()
+        return leaderboard.count(lambda _id: guild.get_member(_id) is not None)
 
     async def leaderboard_rank(self, xp):
-        users = User.objects().only('_id', 'xp')
-        overall = users().count()
-        rank = users(xp__gte=xp).count()
-        return (rank, overall)
+        leaderboard = await self.load_leaderboard()
+        return leaderboard.rank(xp)
 
-    async def inc_caseid(self) -> None:
-        """Increments Guild.case_id, which keeps track of the next available ID to
-        use for a case.
+    async def next_case_id(self, reserve: int = 1) -> int:
+        """Allocate an ID for a new case. Guild.case_id holds the next ID that hasn't been
+        handed out, and IDs are taken from it with an atomic $inc, so concurrent moderation
+        actions (or another instance of the bot) never get the same ID.
+
+        Parameters
+        ----------
+        reserve : int, optional
+            If there are no IDs left over from an earlier reservation, how many to reserve
+            in one round-trip, by default 1. Burst paths like raid bans reserve a block
+            so that each ban doesn't need its own database call.
+
+        Returns
+        -------
+        int
+            The case ID to use
         """
 
-        Guild.objects(_id=self.guild_id).update_one(inc__case_id=1)
+        if not self._case_ids:
+            start = await self.db.run("reserve_case_ids", self._reserve_case_ids, reserve)
+            self._case_ids.extend(range(start, start + reserve))
+        return self._case_ids.popleft()
+
+    async def reserve_case_ids(self, count: int) -> list:
+        """Allocate IDs for `count` new cases at once, using IDs left over from earlier
+        reservations first and reserving the rest in one round-trip.
+
+        Parameters
+        ----------
+        count : int
+            Number of IDs to allocate
+
+        Returns
+        -------
+        list
+            The case IDs to use
+        """
+
+        ids = []
+        while self._case_ids and len(ids) < count:
+            ids.append(self._case_ids.popleft())
+
+        missing = count - len(ids)
+        if missing > 0:
+            start = await self.db.run("reserve_case_ids", self._reserve_case_ids, missing)
+            ids.extend(range(start, start + missing))
+        return ids
+
+    def _reserve_case_ids(self, count: int) -> int:
+        # returns the first ID of the reserved block
+        g = Guild._get_collection().find_one_and_update(
+            {"_id": self.guild_id},
+            {"$inc": {"case_id": count}},
+            projection={"case_id": True},
+            return_document=ReturnDocument.BEFORE)
+        return g["case_id"]
 
     async def inc_xp(self, id, xp):
         """Increments user xp.
         """
 
-        await self.user(id)
-        User.objects(_id=id).update_one(inc__xp=xp)
-        u = User.objects(_id=id).first()
-        return (u.xp, u.level)
+        u = await self.db.run("inc_xp", self._upsert_user, id, {"$inc": {"xp": xp}})
+        self._write_through(u, ["xp"])
+        self.xp_leaderboard.update(id, u["xp"], u["level"])
+        return (u["xp"], u["level"])
 
     async def inc_level(self, id) -> None:
         """Increments user level.
         """
 
-        await self.user(id)
-        User.objects(_id=id).update_one(inc__level=1)
+        u = await self.db.run("inc_level", self._upsert_user, id, {"$inc": {"level": 1}})
+        self._write_through(u, ["level"])
+        self.xp_leaderboard.update(id, u["xp"], u["level"])
+
+    async def bulk_inc_xp(self, increments: dict) -> None:
+        """Increments the xp and level of many users in one round-trip. Used by the XP monitor
+        to write out the increments it buffers in memory.
+
+        Parameters
+        ----------
+        increments : dict
+            Maps a user ID to a pair of (xp, levels) to increment by
+        """
+
+        if not increments:
+            return
+
+        requests = [
+            UpdateOne({"_id": _id}, {"$inc": {"xp": xp, "level": levels}})
+            for _id, (xp, levels) in increments.items()
+        ]
+        await self.db.run("bulk_inc_xp", User._get_collection().bulk_write, requests, ordered=False)
+
+        for _id, (xp, levels) in increments.items():
+            user = self._users.get(_id)
+            if user is not None:
+                # see `_write_through()`
+                user._data["xp"] += xp
+                user._data["level"] += levels
 
     async def add_case(self, _id: int, case: Case) -> None:
         """Cases holds all the cases for a particular user with id `_id` as an
@@ -173,70 +454,198 @@ class Settings(commands.Cog):
             The case we want to add to the user.
         """
 
-        # ensure this user has a cases document before we try to append the new case
-        await self.cases(_id)
-        Cases.objects(_id=_id).update_one(push__cases=case)
+        def add():
+            # ensure this user has a cases document before we try to append the new case
+            self._get_cases(_id)
+            Cases.objects(_id=_id).update_one(push__cases=case)
+            CaseStats._get_collection().bulk_write(case_stats.increments([(case.mod_id, case.reason)]))
+
+        await self.db.run("add_case", add)
+
+    async def add_cases(self, cases: dict) -> None:
+        """Add a case to each of many users with one bulk write, creating the users'
+        Cases documents where needed.
+
+        Parameters
+        ----------
+        cases : dict
+            Maps a user's ID to the Case to add to them
+        """
+
+        if not cases:
+            return
+
+        requests = [
+            UpdateOne({"_id": _id}, {"$push": {"cases": case.to_mongo()}}, upsert=True)
+            for _id, case in cases.items()
+        ]
+
+        def add():
+            Cases._get_collection().bulk_write(requests, ordered=False)
+            CaseStats._get_collection().bulk_write(
+                case_stats.increments((case.mod_id, case.reason) for case in cases.values()), ordered=False)
+
+        await self.db.run("add_cases", add)
+
+    async def update_case_reason(self, case: Case, old_reason: str) -> None:
+        """Move a case whose reason was edited to its new reason in the moderation statistics.
+        The case itself must be saved separately.
+
+        Parameters
+        ----------
+        case : Case
+            The case, with its new reason
+        old_reason : str
+            The reason it had before
+        """
+
+        requests = case_stats.increments([(case.mod_id, old_reason)], sign=-1)
+        requests += case_stats.increments([(case.mod_id, case.reason)])
+        await self.db.run("update_case_reason", CaseStats._get_collection().bulk_write, requests)
 
     async def add_filtered_word(self, fw: FilterWord) -> None:
         existing = self.guild().filter_words.filter(word=fw.word)
         if(len(existing) > 0):
             return False
 
-        Guild.objects(_id=self.guild_id).update_one(push__filter_words=fw)
+        await self._update_guild("add_filtered_word", push__filter_words=fw)
         return True
 
     async def remove_filtered_word(self, word: str):
-        return Guild.objects(_id=self.guild_id).update_one(pull__filter_words__word=FilterWord(word=word).word)
+        return await self._update_guild("remove_filtered_word", pull__filter_words__word=FilterWord(word=word).word)
 
     async def update_filtered_word(self, word: FilterWord):
-        return Guild.objects(_id=self.guild_id, filter_words__word=word.word).update_one(set__filter_words__S=word)
+        return await self._update_guild("update_filtered_word", {"filter_words__word": word.word}, set__filter_words__S=word)
     
+    def tag_index(self) -> dict:
+        """Returns the guild's tags by name. The index is rebuilt whenever a fresh Guild
+        document has been loaded.
+
+        Returns
+        -------
+        dict
+            Maps a tag's name to its Tag
+        """
+
+        tags = self.guild().tags
+        if tags is not self._tag_index_tags:
+            self._tag_index = {tag.name: tag for tag in tags}
+            self._tag_index_tags = tags
+        return self._tag_index
+
     async def add_tag(self, tag: Tag) -> None:
-        Guild.objects(_id=self.guild_id).update_one(push__tags=tag)
+        await self._update_guild("add_tag", push__tags=tag)
 
     async def remove_tag(self, tag: str):
-        return Guild.objects(_id=self.guild_id).update_one(pull__tags__name=Tag(name=tag).name)
+        self.forget_tag_image(tag)
+        return await self._update_guild("remove_tag", pull__tags__name=Tag(name=tag).name)
 
     async def edit_tag(self, tag):
-        return Guild.objects(_id=self.guild_id, tags__name=tag.name).update_one(set__tags__S=tag)
+        self.forget_tag_image(tag.name)
+        return await self._update_guild("edit_tag", {"tags__name": tag.name}, set__tags__S=tag)
 
     async def get_tag(self, name: str):
-        tag = Guild.objects.get(_id=self.guild_id).tags.filter(name=name).first()
+        return self.tag_index().get(name)
+
+    async def use_tag(self, name: str):
+        """Look up a tag and count a use of it.
+
+        Parameters
+        ----------
+        name : str
+            Name of the tag
+
+        Returns
+        -------
+        Tag
+            The tag, or None if there isn't one with that name
+        """
+
+        tag = self.tag_index().get(name)
         if tag is None:
             return
-        tag.use_count += 1
-        await self.edit_tag(tag)
+
+        use_count = await self.db.run("use_tag", self._use_tag, name)
+        if use_count is not None:
+            # the cached tag takes the stored count, which includes concurrent uses. the
+            # guild may have been reloaded during the write, so the current tag is set too
+            tag.use_count = use_count
+            current = self.tag_index().get(name)
+            if current is not None:
+                current.use_count = use_count
         return tag
 
+    def _use_tag(self, name: str) -> int:
+        # returns the tag's use count after the increment, or None if it was deleted
+        g = Guild._get_collection().find_one_and_update(
+            {"_id": self.guild_id, "tags.name": name},
+            {"$inc": {"tags.$.use_count": 1}},
+            projection={"tags.$": True},
+            return_document=ReturnDocument.AFTER)
+        if g is None or not g.get("tags"):
+            return None
+        return g["tags"][0].get("use_count")
+
+    async def tag_image(self, tag: Tag):
+        """Get the image attached to a tag, reading it from GridFS only if it isn't cached.
+
+        Parameters
+        ----------
+        tag : Tag
+            The tag
+
+        Returns
+        -------
+        tuple
+            (image bytes, content type), or None if the tag has no image
+        """
+
+        if not tag.image:
+            return None
+
+        grid_id = tag.image.grid_id
+        image = self._tag_images.get(grid_id)
+        if image is None:
+            def read():
+                image = tag.image.get()
+                if image is None:
+                    return None
+                image.seek(0)
+                return (image.read(), image.content_type)
+
+            image = await self.db.run("tag_image", read)
+            if image is None:
+                return None
+            self._tag_images[grid_id] = image
+            self._tag_image_ids[tag.name] = grid_id
+        return image
+
+    def forget_tag_image(self, name: str) -> None:
+        grid_id = self._tag_image_ids.pop(name, None)
+        if grid_id is not None:
+            self._tag_images.pop(grid_id)
+
     async def add_whitelisted_guild(self, id: int):
-        g = Guild.objects(_id=self.guild_id)
-        g2 = g.first()
-        if id not in g2.filter_excluded_guilds:
-            g.update_one(push__filter_excluded_guilds=id)
+        if id not in self.guild().filter_excluded_guilds:
+            await self._update_guild("add_whitelisted_guild", push__filter_excluded_guilds=id)
             return True
         return False
 
     async def remove_whitelisted_guild(self, id: int):
-        g = Guild.objects(_id=self.guild_id)
-        g2 = g.first()
-        if id in g2.filter_excluded_guilds:
-            g.update_one(pull__filter_excluded_guilds=id)
+        if id in self.guild().filter_excluded_guilds:
+            await self._update_guild("remove_whitelisted_guild", pull__filter_excluded_guilds=id)
             return True
         return False
 
     async def add_ignored_channel(self, id: int):
-        g = Guild.objects(_id=self.guild_id)
-        g2 = g.first()
-        if id not in g2.filter_excluded_channels:
-            g.update_one(push__filter_excluded_channels=id)
+        if id not in self.guild().filter_excluded_channels:
+            await self._update_guild("add_ignored_channel", push__filter_excluded_channels=id)
             return True
         return False
 
     async def remove_ignored_channel(self, id: int):
-        g = Guild.objects(_id=self.guild_id)
-        g2 = g.first()
-        if id in g2.filter_excluded_channels:
-            g.update_one(pull__filter_excluded_channels=id)
+        if id in self.guild().filter_excluded_channels:
+            await self._update_guild("remove_ignored_channel", pull__filter_excluded_channels=id)
             return True
         return False
 
@@ -252,9 +661,8 @@ class Settings(commands.Cog):
             The amount of points to increment the field by, can be negative to remove points
         """
 
-        # first we ensure this user has a User document in the database before continuing
-        await self.user(_id)
-        User.objects(_id=_id).update_one(inc__warn_points=points)
+        u = await self.db.run("inc_points", self._upsert_user, _id, {"$inc": {"warn_points": points}})
+        self._write_through(u, ["warn_points"])
 
     async def set_warn_kicked(self, _id: int) -> None:
         """Set the `was_warn_kicked` field in the User object of the user, whose ID is given by `_id`,
@@ -267,9 +675,8 @@ class Settings(commands.Cog):
             The user's ID who we want to set `was_warn_kicked` for.
         """
 
-        # first we ensure this user has a User document in the database before continuing
-        await self.user(_id)
-        User.objects(_id=_id).update_one(set__was_warn_kicked=True)
+        u = await self.db.run("set_warn_kicked", self._upsert_user, _id, {"$set": {"was_warn_kicked": True}})
+        self._write_through(u, ["was_warn_kicked"])
 
     async def get_case(self, _id: int, case_id: int) -> Case:
         """Get the case with ID `case_id`, which belongs to the punishee given by ID `_id`.
@@ -289,14 +696,17 @@ class Settings(commands.Cog):
         """
 
         # first we ensure this user has a Cases document in the database before continuing
-        await self.cases(_id)
-        case = Cases.objects(_id=_id).first()
-        return case
+        return await self.db.run("get_case", self._get_cases, _id)
 
     async def user(self, id: int) -> User:
         """Look up the User document of a user, whose ID is given by `id`.
         If the user doesn't have a User document in the database, first create that.
 
+        Documents are cached, so a user who was looked up recently costs no database call.
+        Everyone who looks up the same user gets the same document, and the mutators in this
+        class update it along with the database. Changes made to it elsewhere must be saved
+        with `save()`.
+
         Parameters
         ----------
         id : int
@@ -308,36 +718,108 @@ class Settings(commands.Cog):
             The User document we found from the database.
         """
 
-        user = User.objects(_id=id).first()
-        # first we ensure this user has a User document in the database before continuing
-        if not user:
-            user = User()
-            user._id = id
-            user.save()
+        user = self._users.get(id)
+        if user is not None:
+            return user
+
+        # concurrent lookups of the same user share one query, so they get the same document
+        future = self._users_loading.get(id)
+        if future is None:
+            future = asyncio.ensure_future(self._load_user(id))
+            self._users_loading[id] = future
+            future.add_done_callback(lambda _: self._users_loading.pop(id, None))
+        return await asyncio.shield(future)
+
+    async def _load_user(self, id: int) -> User:
+        user = await self.db.run("user", self._get_user, id)
+        self._users[id] = user
+        self.xp_leaderboard.track(user._id, user.xp, user.level)
         return user
+
+    def _get_user(self, id: int) -> User:
+        # blocking implementation of `user()`, for use on the database executor
+        return User._from_son(self._upsert_user(id, {}))
+
+    def _upsert_user(self, id: int, update: dict) -> dict:
+        # blocking, for use on the database executor. Applies a pymongo update to a user's
+        # document, creating it with the default values first if it doesn't exist, and
+        # returns the updated document. An upsert, so concurrent calls can't create duplicates.
+        update = dict(update)
+        touched = {field for fields in update.values() for field in fields}
+        defaults = {field: value for field, value in self._user_defaults.items() if field not in touched}
+        if defaults:
+            update["$setOnInsert"] = defaults
+
+        return User._get_collection().find_one_and_update(
+            {"_id": id}, update, upsert=True, return_document=ReturnDocument.AFTER)
+
+    def _write_through(self, son: dict, fields: list) -> None:
+        # copy fields that were just written to the database into the cached User document.
+        # they're set without being marked as changed, so saving the cached document later
+        # never writes a stale value back over a concurrent increment
+        user = self._users.get(son["_id"])
+        if user is not None:
+            for field in fields:
+                user._data[field] = son.get(field)
     
     async def transfer_profile(self, oldmember, newmember):
-        u = await self.user(oldmember)
-        u._id = newmember
-        u.save()
-        
-        u2 = await self.user(oldmember)
-        u2.xp = 0
-        u2.level = 0
-        u2.save()
-        
-        cases = await self.cases(oldmember)
-        cases._id = newmember
-        cases.save()
-        
-        cases2 = await self.cases(oldmember)
-        cases2.cases = []
-        cases2.save()
-        
-        return u, len(cases.cases)
+        def transfer():
+            u = self._get_user(oldmember)
+            u._id = newmember
+            u.save()
+            
+            u2 = self._get_user(oldmember)
+            u2.xp = 0
+            u2.level = 0
+            u2.save()
+            
+            cases = self._get_cases(oldmember)
+            cases._id = newmember
+            cases.save()
+            
+            cases2 = self._get_cases(oldmember)
+            cases2.cases = []
+            cases2.save()
+            
+            return u, len(cases.cases)
+
+        u, case_count = await self.db.run("transfer_profile", transfer)
+        self._users.pop(oldmember)
+        self._users.pop(newmember)
+        self.xp_leaderboard.update(oldmember, 0, 0)
+        self.xp_leaderboard.update(newmember, u.xp, u.level)
+        return u, case_count
+
+    async def load_birthdays(self) -> BirthdayIndex:
+        """(Re)load the index of users by birthday from the database. Users who are excluded
+        from birthdays are left out.
+
+        Returns
+        -------
+        BirthdayIndex
+            The loaded index
+        """
+
+        def load():
+            # months and days are at least 1, so this matches everyone with a birthday set
+            # and only reads the birthday index
+            users = User._get_collection().find(
+                {"birthday": {"$gte": 1}, "birthday_excluded": {"$ne": True}}, {"_id": 1, "birthday": 1})
+            return [(u["_id"], u["birthday"]) for u in users]
+
+        self.birthdays.load(await self.db.run("load_birthdays", load))
+        return self.birthdays
 
-    async def retrieve_birthdays(self, date):
-        return User.objects(birthday=date)
+    def index_birthday(self, user: User) -> None:
+        """Update the birthday index after a user's birthday or exclusion was changed.
+
+        Parameters
+        ----------
+        user : User
+            The user's document
+        """
+
+        self.birthdays.set(user._id, None if user.birthday_excluded else user.birthday)
 
     async def cases(self, id: int) -> Cases:
         """Return the Document representing the cases of a user, whose ID is given by `id`
@@ -354,6 +836,10 @@ class Settings(commands.Cog):
             [description]
         """
 
+        return await self.db.run("cases", self._get_cases, id)
+
+    def _get_cases(self, id: int) -> Cases:
+        # blocking implementation of `cases()`, for use on the database executor
         cases = Cases.objects(_id=id).first()
         # first we ensure this user has a Cases document in the database before continuing
         if cases is None:
@@ -363,8 +849,8 @@ class Settings(commands.Cog):
         return cases
 
     async def rundown(self, id: int) -> list:
-        """Return the 3 most recent cases of a user, whose ID is given by `id`
-        If the user doesn't have a Cases document in the database, first create that.
+        """Return the 3 most recent cases of a user, whose ID is given by `id`,
+        leaving out unmutes. Only those cases are read from the database.
 
         Parameters
         ----------
@@ -373,23 +859,60 @@ class Settings(commands.Cog):
 
         Returns
         -------
-        Cases
-            [description]
+        list
+            The cases, newest first
         """
 
-        cases = Cases.objects(_id=id).first()
-        # first we ensure this user has a Cases document in the database before continuing
-        if cases is None:
-            cases = Cases()
-            cases._id = id
-            cases.save()
-            return []
+        def fetch():
+            pipeline = [
+                {"$match": {"_id": id}},
+                {"$project": {"cases": {"$filter": {"input": "$cases", "cond": {"$ne": ["$$this._type", "UNMUTE"]}}}}},
+                {"$unwind": "$cases"},
+                {"$sort": {"cases.date": -1}},
+                {"$limit": 3},
+            ]
+            return [Case._from_son(c["cases"]) for c in Cases._get_collection().aggregate(pipeline)]
+
+        return await self.db.run("rundown", fetch)
+
+    async def case_history(self, id: int, start: int = 0, count: int = 9) -> tuple:
+        """Return a page of a user's cases, newest first, leaving out unmutes. Only the
+        cases on the page are read from the database.
+
+        Parameters
+        ----------
+        id : int
+            The user whose cases we want to look up.
+        start : int, optional
+            Position of the first case to return, by default 0
+        count : int, optional
+            Maximum number of cases to return, by default 9
+
+        Returns
+        -------
+        tuple
+            (list of Cases on the page, total number of cases)
+        """
 
-        cases = cases.cases
-        cases = filter(lambda x: x._type != "UNMUTE", cases)
-        cases = sorted(cases, key=lambda i: i['date'])
-        cases.reverse()
-        return cases[0:3]
+        def fetch():
+            pipeline = [
+                {"$match": {"_id": id}},
+                {"$project": {"history": {"$let": {
+                    "vars": {"cases": {"$filter": {"input": "$cases", "cond": {"$ne": ["$$this._type", "UNMUTE"]}}}},
+                    "in": {
+                        "total": {"$size": "$$cases"},
+                        # cases are appended as they are made, so newest first is reversed
+                        "page": {"$slice": [{"$reverseArray": "$$cases"}, start, count]},
+                    }
+                }}}},
+            ]
+            result = next(Cases._get_collection().aggregate(pipeline), None)
+            if result is None:
+                return [], 0
+            history = result["history"]
+            return [Case._from_son(c) for c in history["page"]], history["total"]
+
+        return await self.db.run("case_history", fetch)
     
     async def get_giveaway(self, _id: int) -> Giveaway:
         """
@@ -405,8 +928,7 @@ class Settings(commands.Cog):
         -------
         Giveaway
         """
-        giveaway = Giveaway.objects(_id=_id).first()
-        return giveaway
+        return await self.db.run("get_giveaway", lambda: Giveaway.objects(_id=_id).first())
     
     async def add_giveaway(self, id: int, channel: int, name: str, entries: list, winners: int, ended: bool = False, prev_winners=[]) -> None:
         """
@@ -433,76 +955,86 @@ class Settings(commands.Cog):
         giveaway.winners = winners
         giveaway.is_ended = ended
         giveaway.previous_winners = prev_winners
-        giveaway.save()
+        await self.db.run("add_giveaway", giveaway.save)
 
     async def get_locked_channels(self):
         return self.guild().locked_channels
 
     async def add_locked_channels(self, channel):
-        Guild.objects(_id=self.guild_id).update_one(push__locked_channels=channel)
+        await self._update_guild("add_locked_channels", push__locked_channels=channel)
 
     async def remove_locked_channels(self, channel):
-        Guild.objects(_id=self.guild_id).update_one(pull__locked_channels=channel)
+        await self._update_guild("remove_locked_channels", pull__locked_channels=channel)
 
     async def add_raid_phrase(self, phrase: str) -> bool:
         existing = self.guild().raid_phrases.filter(word=phrase)
         if(len(existing) > 0):
             return False
-        Guild.objects(_id=self.guild_id).update_one(push__raid_phrases=FilterWord(word=phrase, bypass=5, notify=True))
+        await self._update_guild("add_raid_phrase", push__raid_phrases=FilterWord(word=phrase, bypass=5, notify=True))
         return True
     
     async def remove_raid_phrase(self, phrase: str):
-        Guild.objects(_id=self.guild_id).update_one(pull__raid_phrases__word=FilterWord(word=phrase).word)
+        await self._update_guild("remove_raid_phrase", pull__raid_phrases__word=FilterWord(word=phrase).word)
 
     async def inc_trivia_points(self, _id, points):
-        await self.user(_id)
-        User.objects(_id=_id).update_one(inc__trivia_points=points)
-        u = User.objects(_id=_id).first()
-        return u.trivia_points
+        u = await self.db.run("inc_trivia_points", self._upsert_user, _id, {"$inc": {"trivia_points": points}})
+        self._write_through(u, ["trivia_points"])
+        return u["trivia_points"]
 
     async def reset_trivia_points(self):
-        users = User.objects(trivia_points__ne=0, trivia_points__exists=True)
-        count = users.count()
-        if count > 0:
-            for u in users:
-                u.trivia_points = 0
-                u.save()
+        def reset():
+            users = User.objects(trivia_points__ne=0, trivia_points__exists=True)
+            count = users.count()
+            if count > 0:
+                for u in users:
+                    u.trivia_points = 0
+                    u.save()
+            return count
+
+        count = await self.db.run("reset_trivia_points", reset)
+        for _id in self._users.keys():
+            self._write_through({"_id": _id, "trivia_points": 0}, ["trivia_points"])
         return count
 
     async def trivia_leaderboard(self) -> list:
-        return User.objects[0:100].only('_id', 'trivia_points').order_by('-trivia_points', '-_trivia_points').select_related()
+        return await self.db.run("trivia_leaderboard", lambda: list(User.objects[0:100].only('_id', 'trivia_points').order_by('-trivia_points', '-_trivia_points').select_related()))
 
     async def set_spam_mode(self, mode) -> None:
-        Guild.objects(_id=self.guild_id).update_one(set__ban_today_spam_accounts=mode)
-
-    async def fetch_raids(self):
-        values = {}
-        values["Join spam"] = Cases.objects(cases__reason__contains="Join spam detected").count()
-        values["Join spam over time"] = Cases.objects(cases__reason__contains="Join spam over time detected").count()
-        values["Raid phrase"] = Cases.objects(cases__reason__contains="Raid phrase detected").count()
-        values["Ping spam"] = Cases.objects(cases__reason__contains="Ping spam").count()
-        values["Message spam"] = Cases.objects(cases__reason__contains="Message spam").count()
-        
-        return values
-
-    async def fetch_cases_by_mod(self, _id):
-        values = {}
-        cases = Cases.objects(cases__mod_id=str(_id))
-        values["total"] = 0
-        cases = list(cases.all())
-        final_cases = []
-        for case in cases:
-            for c in case.cases:
-                final_cases.append(c)
-                values["total"] += 1
- 
-        def get_case_reason(reason):
-            string = reason.lower()
-            return ''.join(e for e in string if e.isalnum() or e == " ").strip()
-        case_reasons = [get_case_reason(case.reason) for case in final_cases if get_case_reason(case.reason) != "temporary mute expired"]
-        values["counts"] = sorted(Counter(case_reasons).items(), key=lambda item: item[1])
-        values["counts"].reverse()
-        return values
+        await self._update_guild("set_spam_mode", set__ban_today_spam_accounts=mode)
+
+    async def fetch_raids(self) -> dict:
+        """Number of cases caused by each kind of raid, see `cogs.utils.case_stats`
+
+        Returns
+        -------
+        dict
+            Name of the kind of raid -> number of cases
+        """
+
+        stats = await self.db.run("fetch_raids", lambda: CaseStats.objects(_id=case_stats.RAIDS).first())
+        counts = stats.counts if stats is not None else {}
+        return {name: counts.get(name, 0) for name in case_stats.RAID_REASONS}
+
+    async def fetch_cases_by_mod(self, _id) -> dict:
+        """Number of cases a mod has made, and how often they used each reason, see `cogs.utils.case_stats`
+
+        Parameters
+        ----------
+        _id : int
+            The mod's ID
+
+        Returns
+        -------
+        dict
+            "total": number of cases, "counts": (reason, count) sorted from most to least used
+        """
+
+        stats = await self.db.run("fetch_cases_by_mod", lambda: CaseStats.objects(_id=case_stats.mod_key(_id)).first())
+        if stats is None:
+            return {"total": 0, "counts": []}
+
+        counts = [(reason, count) for reason, count in stats.counts.items() if count > 0]
+        return {"total": stats.total, "counts": sorted(counts, key=lambda item: item[1], reverse=True)}
 
 
 class Permissions:
@@ -532,41 +1064,12 @@ class Permissions:
 
         self.bot = bot
         self.settings = settings
-        guild_id = self.settings.guild_id
-        the_guild = settings.guild()
-
-        # This dict maps a permission level to a lambda function which, when given the right paramters,
-        # will return True or False if a user has that permission level.
-        self.permissions = {
-            0: lambda x, y: True,
-
-            1: (lambda guild, m: self.hasAtLeast(guild, m, 2) or (guild.id == guild_id
-                and guild.get_role(the_guild.role_memberplus) in m.roles)),
 
-            2: (lambda guild, m: self.hasAtLeast(guild, m, 3) or (guild.id == guild_id
-                and guild.get_role(the_guild.role_memberpro) in m.roles)),
-
-            3: (lambda guild, m: self.hasAtLeast(guild, m, 4) or (guild.id == guild_id
-                and guild.get_role(the_guild.role_memberedition) in m.roles)),
-
-            4: (lambda guild, m: self.hasAtLeast(guild, m, 5) or (guild.id == guild_id
-                and guild.get_role(the_guild.role_genius) in m.roles)),
-
-            5: (lambda guild, m: self.hasAtLeast(guild, m, 6) or (guild.id == guild_id
-                and guild.get_role(the_guild.role_moderator) in m.roles)),
-
-            6: (lambda guild, m: self.hasAtLeast(guild, m, 7) or (guild.id == guild_id
-                and guild.get_role(the_guild.role_administrator) in m.roles)),
-
-            7: (lambda guild, m: self.hasAtLeast(guild, m, 9) or (guild.id == guild_id
-                and m == guild.owner)),
-
-            9: (lambda guild, m: guild.id == guild_id
-                and m.id == bot.owner_id),
-
-            10: (lambda guild, m: guild.id == guild_id
-                 and m.id == bot.owner_id),
-        }
+        # maps a role ID to the permission level it gives, built from the roles configured in the guild
+        self.role_levels = {}
+        self._role_levels_guild = None
+        # effective permission level of members in the main guild, by member ID
+        self.member_levels = {}
 
         self.permission_names = {
             0: "Everyone and up",
@@ -583,7 +1086,7 @@ class Permissions:
 
     def hasAtLeast(self, guild: discord.Guild, member: discord.Member, level: int) -> bool:
         """Checks whether a user given by `member` has at least the permission level `level`
-        in guild `guild`. Using the `self.permissions` dict-lambda thing.
+        in guild `guild`.
 
         Parameters
         ----------
@@ -600,7 +1103,66 @@ class Permissions:
             True if the user has that level, otherwise False.
         """
 
-        return self.permissions[level](guild, member)
+        return self.level_of(guild, member) >= level
+
+    def level_of(self, guild: discord.Guild, member: discord.Member) -> int:
+        """Computes the highest permission level of a member. The result is memoized
+        until the member's roles change.
+
+        Parameters
+        ----------
+        guild : discord.Guild
+            The guild to check
+        member : discord.Member
+            The member whose permission level we want
+
+        Returns
+        -------
+        int
+            The member's permission level, 0 outside of the main guild
+        """
+
+        if guild.id != self.settings.guild_id:
+            return 0
+
+        self._update_role_levels()
+        level = self.member_levels.get(member.id)
+        if level is None:
+            if member.id == self.bot.owner_id:
+                level = 10
+            elif member.id == guild.owner_id:
+                level = 7
+            else:
+                role_levels = self.role_levels
+                level = max((role_levels.get(role.id, 0) for role in member.roles), default=0)
+            self.member_levels[member.id] = level
+        return level
+
+    def _update_role_levels(self) -> None:
+        the_guild = self.settings.guild()
+        if the_guild is self._role_levels_guild:
+            return
+
+        role_levels = {}
+        # lower levels first, so a role configured for several levels gives the highest one
+        for level, role in enumerate([the_guild.role_memberplus, the_guild.role_memberpro,
+                                      the_guild.role_memberedition, the_guild.role_genius,
+                                      the_guild.role_moderator, the_guild.role_administrator], start=1):
+            if role is not None:
+                role_levels[role] = level
+
+        self._role_levels_guild = the_guild
+        if role_levels != self.role_levels:
+            self.role_levels = role_levels
+            self.member_levels.clear()
+
+    def invalidate(self, member_id: int = None) -> None:
+        """Forget the memoized permission level of a member, or of everyone if no ID is given."""
+
+        if member_id is None:
+            self.member_levels.clear()
+        else:
+            self.member_levels.pop(member_id, None)
 
     def level_info(self, level: int) -> str:
         return self.permission_names[level]
@@ -0,0 +1,198 @@
+import asyncio
+import functools
+import traceback
+
+from cogs.utils.lru_cache import LRUCache
+from data.cachedtrack import CachedTrack
+from pymongo import ReplaceOne
+
+"""
+Turns Spotify tracks and playlists into Lavalink tracks. Spotify's API is blocking, so it's
+called on a worker thread, and playlists are read a page at a time until every track has
+been fetched. Each song is then searched for on YouTube through Lavalink, several at once,
+and handed back in playlist order as soon as it's found so the first song can start while
+the rest are still being searched. What a search found is cached by artist and title, in
+memory and in the track_cache collection, so a song is only ever searched for once.
+"""
+
+# Lavalink searches for Spotify songs running at once
+SEARCH_CONCURRENCY = 5
+# songs kept in memory, on top of the ones in the database
+TRACK_CACHE_SIZE = 2000
+# most items Spotify returns in one page of a playlist
+PLAYLIST_PAGE_SIZE = 100
+
+
+class Song:
+    __slots__ = ("title", "artist")
+
+    def __init__(self, title: str, artist: str):
+        self.title = title
+        self.artist = artist
+
+    @classmethod
+    def from_spotify(cls, track: dict):
+        """The song for a Spotify track object, or None for local files and removed tracks"""
+
+        if not track or not track.get("name") or not track.get("artists"):
+            return None
+        return cls(track["name"], track["artists"][0]["name"])
+
+    @property
+    def key(self) -> str:
+        return f"{self.artist} – {self.title}".lower()
+
+    @property
+    def query(self) -> str:
+        return f"ytsearch:{self.title} - {self.artist}"
+
+
+class SpotifyResolver:
+    def __init__(self, sp, db):
+        """Initialize the resolver
+
+        Parameters
+        ----------
+        sp : spotipy.Spotify
+            Spotify API session
+        db : cogs.utils.db_executor.DatabaseExecutor
+            Executor to read and write the track cache on
+        """
+
+        self.sp = sp
+        self.db = db
+        self._semaphore = asyncio.Semaphore(SEARCH_CONCURRENCY)
+        # Song key -> Lavalink track
+        self._tracks = LRUCache(TRACK_CACHE_SIZE)
+
+    async def _spotify(self, func, *args, **kwargs):
+        return await asyncio.get_event_loop().run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+    async def track(self, url: str) -> Song:
+        """Look up a Spotify track.
+
+        Parameters
+        ----------
+        url : str
+            The track's URL or URI
+
+        Returns
+        -------
+        Song
+            The song, or None if it can't be played
+        """
+
+        return Song.from_spotify(await self._spotify(self.sp.track, url))
+
+    async def playlist(self, url: str):
+        """Look up every song in a Spotify playlist.
+
+        Parameters
+        ----------
+        url : str
+            The playlist's URL or URI
+
+        Returns
+        -------
+        tuple
+            The playlist's name, and its songs in order
+        """
+
+        playlist = await self._spotify(self.sp.playlist, url, fields="name")
+        songs = []
+        offset = 0
+        while True:
+            page = await self._spotify(self.sp.playlist_items, url, fields="items.track.name,items.track.artists,next",
+                                       limit=PLAYLIST_PAGE_SIZE, offset=offset, additional_types=("track",))
+            for item in page["items"]:
+                song = Song.from_spotify(item.get("track"))
+                if song is not None:
+                    songs.append(song)
+
+            if not page.get("next"):
+                break
+            offset += PLAYLIST_PAGE_SIZE
+
+        return playlist["name"], songs
+
+    async def resolve(self, node, songs: list):
+        """Find the Lavalink track for each song.
+
+        Parameters
+        ----------
+        node : lavalink.Node
+            Node to search on
+        songs : list
+            The songs
+
+        Yields
+        ------
+        dict
+            The track for each song, in order, or None if nothing was found for it
+        """
+
+        # Song key -> track, for the songs we already know the track of
+        tracks = {}
+        for song in songs:
+            track = self._tracks.get(song.key)
+            if track is not None:
+                tracks[song.key] = track
+
+        missing = list({song.key for song in songs} - tracks.keys())
+        if missing:
+            try:
+                cached = await self.db.run("load_cached_tracks", lambda: list(
+                    CachedTrack._get_collection().find({"_id": {"$in": missing}}, {"track": 1})))
+            except Exception:
+                traceback.print_exc()
+                cached = []
+            for document in cached:
+                tracks[document["_id"]] = self._tracks[document["_id"]] = document["track"]
+
+        # each song is searched for once, even if it's in the playlist more than once
+        searches = {}
+        for song in songs:
+            if song.key not in tracks and song.key not in searches:
+                searches[song.key] = asyncio.ensure_future(self._search(node, song))
+
+        # tracks that were searched for, to add to the database
+        found = {}
+        try:
+            for song in songs:
+                if song.key in tracks:
+                    yield tracks[song.key]
+                    continue
+
+                track = await searches[song.key]
+                if track is not None:
+                    found[song.key] = track
+                yield track
+        finally:
+            for search in searches.values():
+                search.cancel()
+
+        if found:
+            await self._save(found)
+
+    async def _search(self, node, song: Song):
+        async with self._semaphore:
+            try:
+                results = await node.get_tracks(song.query)
+            except Exception:
+                traceback.print_exc()
+                return None
+
+        # results can be None if Lavalink gave an invalid response
+        if not results or not results["tracks"]:
+            return None
+        track = results["tracks"][0]
+        self._tracks[song.key] = track
+        return track
+
+    async def _save(self, tracks: dict) -> None:
+        requests = [ReplaceOne({"_id": key}, CachedTrack(_id=key, track=track).to_mongo().to_dict(), upsert=True)
+                    for key, track in tracks.items()]
+        try:
+            await self.db.run("save_cached_tracks", CachedTrack._get_collection().bulk_write, requests, ordered=False)
+        except Exception:
+            traceback.print_exc()
@@ -1,51 +1,240 @@
+import asyncio
+import heapq
+import itertools
 import logging
-from datetime import datetime
+import pickle
+import uuid
+from datetime import datetime, timezone
 
 import discord
 import random
-from apscheduler.executors.pool import ThreadPoolExecutor
-from apscheduler.jobstores.mongodb import MongoDBJobStore
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from cogs.utils.logs import prepare_unmute_log
 from data.case import Case
+from data.job import Job
+from pymongo import DeleteOne, ReplaceOne
 
-jobstores = {
-    'default': MongoDBJobStore(database="botty", collection="jobs", host="127.0.0.1"),
-}
+"""
+Schedules things that have to happen at a certain time, like unmutes and reminders. Jobs
+are kept in a heap ordered by when they run, and a single task on the event loop sleeps
+until the first one is due, so there are no threads and nothing polls the database. Each
+job is also kept in the scheduled_jobs collection under a key made of its kind and what
+it's about (e.g. "unmute:<user ID>"), so they survive a restart: they're all loaded with
+one query on startup, and jobs that should have run while the bot was down run right away.
+"""
 
-executors = {
-    'default': ThreadPoolExecutor(20)
-}
+logger = logging.getLogger(__name__)
 
-job_defaults = {
-    # 'coalesce': True
-}
+# number of jobs that run at once, e.g. when catching up after a restart
+JOB_CONCURRENCY = 10
+# the collection APScheduler kept its jobs in, they're moved over on startup
+APSCHEDULER_COLLECTION = "jobs"
 
 BOT_GLOBAL = None
 
 
+class ConflictingJobError(Exception):
+    pass
+
+
+class ScheduledJob:
+    __slots__ = ("key", "kind", "run_at", "kwargs")
+
+    def __init__(self, key: str, kind: str, run_at: datetime, kwargs: dict):
+        self.key = key
+        self.kind = kind
+        # naive UTC
+        self.run_at = run_at
+        self.kwargs = kwargs
+
+    def to_mongo(self) -> dict:
+        return {"_id": self.key, "kind": self.kind, "run_at": self.run_at, "kwargs": self.kwargs}
+
+
+def to_utc(date: datetime) -> datetime:
+    # naive datetimes are in local time. Mongo stores milliseconds, so round to those to
+    # be able to match the stored job by its run time
+    date = date.astimezone(timezone.utc).replace(tzinfo=None)
+    return date.replace(microsecond=date.microsecond // 1000 * 1000)
+
+
 class Tasks():
-    """Job scheduler for unmute, using APScheduler
+    """Job scheduler for unmutes, reminders, giveaways etc.
     """
 
-    def __init__(self, bot: discord.Client):
-        """Initialize scheduler
+    def __init__(self, bot: discord.Client, db):
+        """Initialize scheduler. Jobs can be scheduled right away, but they only run once
+        `start()` is called.
 
         Parameters
         ----------
         bot : discord.Client
             instance of Discord client
+        db : cogs.utils.db_executor.DatabaseExecutor
+            Executor to run database calls on
         """
 
         global BOT_GLOBAL
         BOT_GLOBAL = bot
 
         logging.basicConfig()
-        logging.getLogger('apscheduler').setLevel(logging.DEBUG)
 
-        self.tasks = AsyncIOScheduler(
-            jobstores=jobstores, executors=executors, job_defaults=job_defaults, event_loop=bot.loop)
-        self.tasks.start()
+        self.bot = bot
+        self.db = db
+        # key -> ScheduledJob, for every job that hasn't run yet
+        self.jobs = {}
+        # (run_at, sequence number, ScheduledJob), jobs that were cancelled or rescheduled
+        # are left in here and skipped when they come up
+        self._heap = []
+        self._sequence = itertools.count()
+        self._wakeup = asyncio.Event()
+        # writes to the job table happen in the order they were made
+        self._write_lock = asyncio.Lock()
+        self._semaphore = asyncio.Semaphore(JOB_CONCURRENCY)
+        self._runner = None
+
+    async def start(self) -> None:
+        """Load the jobs from the database and start running them.
+        """
+
+        if self._runner is not None:
+            return
+
+        await self.db.run("migrate_apscheduler_jobs", self._migrate_apscheduler_jobs)
+        documents = await self.db.run("load_jobs", lambda: list(Job._get_collection().find().sort("run_at", 1)))
+        for document in documents:
+            # jobs scheduled since we were created are newer than what's in the database
+            if document["_id"] not in self.jobs:
+                self._push(ScheduledJob(document["_id"], document["kind"], document["run_at"], document.get("kwargs", {})))
+
+        logger.info(f"Loaded {len(documents)} scheduled jobs")
+        self._runner = self.bot.loop.create_task(self._run())
+
+    def _migrate_apscheduler_jobs(self) -> None:
+        # blocking. Converts jobs left over from when we used APScheduler, which needs to be
+        # installed to read them
+        collection = Job._get_db()[APSCHEDULER_COLLECTION]
+        documents = list(collection.find())
+        if not documents:
+            return
+
+        try:
+            states = [pickle.loads(document["job_state"]) for document in documents]
+        except ImportError:
+            logger.warning(f"{len(documents)} APScheduler jobs can't be read without APScheduler installed")
+            return
+
+        jobs = []
+        for state in states:
+            kind = APSCHEDULER_KINDS.get(state["func"].rsplit(":", 1)[-1])
+            if kind is None:
+                logger.warning(f"Dropping APScheduler job {state['id']} of unknown kind {state['func']}")
+                continue
+
+            kwargs = dict(zip(JOB_ARGS[kind], state["args"]))
+            jobs.append(ScheduledJob(JOB_KEYS[kind](**kwargs), kind, to_utc(state["next_run_time"]), kwargs))
+
+        if jobs:
+            Job._get_collection().bulk_write([ReplaceOne({"_id": job.key}, job.to_mongo(), upsert=True) for job in jobs])
+        collection.drop()
+        logger.info(f"Moved {len(jobs)} APScheduler jobs to the job table")
+
+    def _push(self, job: ScheduledJob) -> None:
+        self.jobs[job.key] = job
+        heapq.heappush(self._heap, (job.run_at, next(self._sequence), job))
+        if self._heap[0][2] is job:
+            # runs before whatever the runner is waiting for
+            self._wakeup.set()
+
+    def _write(self, name: str, func, *args, **kwargs) -> None:
+        async def write():
+            async with self._write_lock:
+                try:
+                    await self.db.run(name, func, *args, **kwargs)
+                except Exception:
+                    logger.exception(f"Failed to update the job table ({name})")
+
+        self.bot.loop.create_task(write())
+
+    def schedule(self, kind: str, date: datetime, replace: bool = False, **kwargs) -> str:
+        """Schedule a job.
+
+        Parameters
+        ----------
+        kind : str
+            What to do, one of the keys of `JOB_KINDS`
+        date : datetime.datetime
+            When to do it, naive datetimes are local time
+        replace : bool, optional
+            Whether to replace a job with the same key, by default an error is raised
+        **kwargs
+            Arguments for the job
+
+        Returns
+        -------
+        str
+            The job's key
+
+        Raises
+        ------
+        ConflictingJobError
+            A job with the same key is already scheduled
+        """
+
+        key = JOB_KEYS[kind](**kwargs)
+        if not replace and key in self.jobs:
+            raise ConflictingJobError(f"Job {key} is already scheduled")
+
+        job = ScheduledJob(key, kind, to_utc(date), kwargs)
+        self._push(job)
+        self._write("schedule_job", Job._get_collection().replace_one, {"_id": key}, job.to_mongo(), upsert=True)
+        return key
+
+    def cancel(self, key: str) -> bool:
+        """Cancel a job.
+
+        Parameters
+        ----------
+        key : str
+            The job's key
+
+        Returns
+        -------
+        bool
+            Whether there was a job with that key
+        """
+
+        if self.jobs.pop(key, None) is None:
+            return False
+
+        self._write("cancel_job", Job._get_collection().delete_one, {"_id": key})
+        return True
+
+    async def _run(self):
+        while True:
+            now = datetime.utcnow()
+            while self._heap and self._heap[0][0] <= now:
+                _, _, job = heapq.heappop(self._heap)
+                if self.jobs.get(job.key) is job:
+                    del self.jobs[job.key]
+                    self.bot.loop.create_task(self._execute(job))
+
+            self._wakeup.clear()
+            timeout = (self._heap[0][0] - now).total_seconds() if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _execute(self, job: ScheduledJob):
+        async with self._semaphore:
+            try:
+                await JOB_KINDS[job.kind](**job.kwargs)
+            except Exception:
+                logger.exception(f"Job {job.key} failed")
+
+        # only removed once it ran, so jobs interrupted by a restart run again. A job with
+        # the same key that was scheduled in the meantime has a different run time
+        self._write("finish_job", Job._get_collection().bulk_write, [DeleteOne({"_id": job.key, "run_at": job.run_at})])
 
     def schedule_unmute(self, id: int, date: datetime) -> None:
         """Create a task to unmute user given by ID `id`, at time `date`
@@ -58,11 +247,12 @@ class Tasks():
             When to unmute
         """
 
-        self.tasks.add_job(unmute_callback, 'date', id=str(
-            id), next_run_time=date, args=[id], misfire_grace_time=3600)
+        self.schedule("unmute", date, id=id)
 
     def schedule_remove_bday(self, id: int, date: datetime) -> None:
-        """Create a task to remove birthday role from user given by ID `id`, at time `date`
+        """Create a task to remove birthday role from user given by ID `id`, at time `date`.
+        Replaces the user's task if they already have one, e.g. when they left and rejoined
+        on their birthday.
 
         Parameters
         ----------
@@ -72,8 +262,7 @@ class Tasks():
             When to remove role
         """
 
-        self.tasks.add_job(remove_bday_callback, 'date', id=str(
-            id+1), next_run_time=date, args=[id], misfire_grace_time=3600)
+        self.schedule("remove_bday", date, replace=True, id=id)
 
     def cancel_unmute(self, id: int) -> None:
         """When we manually unmute a user given by ID `id`, stop the task to unmute them.
@@ -84,7 +273,7 @@ class Tasks():
             User whose unmute task we want to cancel
         """
 
-        self.tasks.remove_job(str(id), 'default')
+        self.cancel(JOB_KEYS["unmute"](id=id))
 
     def cancel_unbirthday(self, id: int) -> None:
         """When we manually unset the birthday of a user given by ID `id`, stop the task to remove the role.
@@ -93,7 +282,7 @@ class Tasks():
         id : int
             User whose task we want to cancel
         """
-        self.tasks.remove_job(str(id+1), 'default')
+        self.cancel(JOB_KEYS["remove_bday"](id=id))
         
     def schedule_end_giveaway(self, channel_id: int, message_id: int, date: datetime, winners: int) -> None:
         """
@@ -109,7 +298,18 @@ class Tasks():
             When to end the giveaway
         """
 
-        self.tasks.add_job(end_giveaway_callback, 'date', id=str(message_id+2), next_run_time=date, args=[channel_id, message_id, winners], misfire_grace_time=3600)
+        self.schedule("end_giveaway", date, channel_id=channel_id, message_id=message_id, winners=winners)
+
+    def cancel_end_giveaway(self, message_id: int) -> None:
+        """When a giveaway given by message ID `message_id` is ended early, stop the task to end it.
+
+        Parameters
+        ----------
+        message_id : int
+            Giveaway message ID
+        """
+
+        self.cancel(JOB_KEYS["end_giveaway"](message_id=message_id))
 
     def schedule_reminder(self, id: int, reminder: str, date: datetime) -> None:
         """Create a task to remind someone of id `id` of something `reminder` at time `date`
@@ -124,8 +324,7 @@ class Tasks():
             When to remind
         """
 
-        self.tasks.add_job(reminder_callback, 'date', id=str(
-            id+random.randint(5, 100)), next_run_time=date, args=[id, reminder], misfire_grace_time=3600)
+        self.schedule("reminder", date, id=id, reminder=reminder)
 
     def schedule_remove_raid_phrase(self, phrase: str, date: datetime) -> None:
         """Create a task to remove a raid phrase
@@ -138,21 +337,7 @@ class Tasks():
             When to remove the phrase
         """
 
-        self.tasks.add_job(remove_raid_phrase, 'date', id=str(random.getrandbits(64)), next_run_time=date, args=[phrase], misfire_grace_time=3600)
-
-
-
-def unmute_callback(id: int) -> None:
-    """Callback function for actually unmuting. Creates asyncio task
-    to do the actual unmute.
-
-    Parameters
-    ----------
-    id : int
-        User who we want to unmute
-    """
-
-    BOT_GLOBAL.loop.create_task(remove_mute(id))
+        self.schedule("remove_raid_phrase", date, replace=True, phrase=phrase)
 
 
 async def remove_mute(id: int) -> None:
@@ -173,18 +358,17 @@ async def remove_mute(id: int) -> None:
             if user is not None:
                 await user.remove_roles(mute_role)
                 case = Case(
-                    _id=BOT_GLOBAL.settings.guild().case_id,
+                    _id=await BOT_GLOBAL.settings.next_case_id(),
                     _type="UNMUTE",
                     mod_id=BOT_GLOBAL.user.id,
                     mod_tag=str(BOT_GLOBAL.user),
                     reason="Temporary mute expired.",
                 )
-                await BOT_GLOBAL.settings.inc_caseid()
                 await BOT_GLOBAL.settings.add_case(user.id, case)
 
                 u = await BOT_GLOBAL.settings.user(id=user.id)
                 u.is_muted = False
-                u.save()
+                await BOT_GLOBAL.settings.save(u)
 
                 log = await prepare_unmute_log(BOT_GLOBAL.user, user, case)
 
@@ -204,21 +388,17 @@ async def remove_mute(id: int) -> None:
 
             else:
                 case = Case(
-                    _id=BOT_GLOBAL.settings.guild().case_id,
+                    _id=await BOT_GLOBAL.settings.next_case_id(),
                     _type="UNMUTE",
                     mod_id=BOT_GLOBAL.user.id,
                     mod_tag=str(BOT_GLOBAL.user),
                     reason="Temporary mute expired.",
                 )
-                await BOT_GLOBAL.settings.inc_caseid()
                 await BOT_GLOBAL.settings.add_case(id, case)
 
                 u = await BOT_GLOBAL.settings.user(id=id)
                 u.is_muted = False
-                u.save()
-
-def reminder_callback(id: int, reminder: str):
-    BOT_GLOBAL.loop.create_task(remind(id, reminder))
+                await BOT_GLOBAL.settings.save(u)
 
 async def remind(id, reminder):
     """Remind the user callback
@@ -245,19 +425,6 @@ async def remind(id, reminder):
         channel = guild.get_channel(BOT_GLOBAL.settings.guild().channel_botspam)
         await channel.send(member.mention, embed=embed)
 
-def remove_bday_callback(id: int) -> None:
-    """Callback function for actually unmuting. Creates asyncio task
-    to do the actual unmute.
-
-    Parameters
-    ----------
-    id : int
-        User who we want to unmute
-    """
-
-    BOT_GLOBAL.loop.create_task(remove_bday(id))
-
-
 async def remove_bday(id: int) -> None:
     """Remove the bday role of the user given by ID `id`
 
@@ -277,21 +444,10 @@ async def remove_bday(id: int) -> None:
         return
 
     user = guild.get_member(id)
-    await user.remove_roles(bday_role)
-
-def end_giveaway_callback(channel_id: int, message_id: int, winners: int) -> None:
-    """
-    Callback function for ending a giveaway
-
-    Parameters
-    ----------
-    channel_id : int
-        ID of the channel that the giveaway is in
-    message_id : int
-        Message ID of the giveaway
-    """
+    if user is None:
+        return
 
-    BOT_GLOBAL.loop.create_task(end_giveaway(channel_id, message_id, winners))
+    await user.remove_roles(bday_role)
 
 async def end_giveaway(channel_id: int, message_id: int, winners: int) -> None:
     """
@@ -350,7 +506,7 @@ async def end_giveaway(channel_id: int, message_id: int, winners: int) -> None:
     g.entries = reacted_ids
     g.is_ended = True
     g.previous_winners = winner_ids
-    g.save()
+    await BOT_GLOBAL.settings.save(g)
 
     await message.edit(embed=embed)
     await message.clear_reactions()
@@ -365,4 +521,41 @@ async def end_giveaway(channel_id: int, message_id: int, winners: int) -> None:
         await channel.send(f"Congratulations {', '.join(mentions)}! You won the giveaway of **{g.name}**! Please DM or contact <@{g.sponsor}> to collect.")
 
 async def remove_raid_phrase(phrase: str):
-    await BOT_GLOBAL.settings.remove_raid_phrase(phrase)
\ No newline at end of file
+    await BOT_GLOBAL.settings.remove_raid_phrase(phrase)
+
+
+# coroutine that carries out each kind of job, called with the job's arguments
+JOB_KINDS = {
+    "unmute": remove_mute,
+    "remove_bday": remove_bday,
+    "end_giveaway": end_giveaway,
+    "reminder": remind,
+    "remove_raid_phrase": remove_raid_phrase,
+}
+
+# makes the key of a job from its arguments, only one job per key can be scheduled
+JOB_KEYS = {
+    "unmute": lambda id: f"unmute:{id}",
+    "remove_bday": lambda id: f"remove_bday:{id}",
+    "end_giveaway": lambda message_id, **_: f"end_giveaway:{message_id}",
+    # people can have as many reminders as they want
+    "reminder": lambda id, **_: f"reminder:{id}:{uuid.uuid4().hex}",
+    "remove_raid_phrase": lambda phrase: f"remove_raid_phrase:{phrase}",
+}
+
+# names of the positional arguments APScheduler jobs were created with
+JOB_ARGS = {
+    "unmute": ["id"],
+    "remove_bday": ["id"],
+    "end_giveaway": ["channel_id", "message_id", "winners"],
+    "reminder": ["id", "reminder"],
+    "remove_raid_phrase": ["phrase"],
+}
+
+APSCHEDULER_KINDS = {
+    "unmute_callback": "unmute",
+    "remove_bday_callback": "remove_bday",
+    "end_giveaway_callback": "end_giveaway",
+    "reminder_callback": "reminder",
+    "remove_raid_phrase": "remove_raid_phrase",
+}
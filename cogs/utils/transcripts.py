@@ -0,0 +1,225 @@
+import asyncio
+import gzip
+import json
+import os
+import sqlite3
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import discord
+
+"""
+Transcripts of bulk message deletes. Messages are written one at a time to gzip files in
+the archive directory, starting a new part whenever one gets close to the upload limit, so
+a large purge is never held in memory and can always be uploaded as one or more
+attachments. The files are kept after they're uploaded, and indexed in an SQLite database
+by channel and by the IDs of the first and last message, which are snowflakes and so give
+the time range the transcript covers. Transcripts older than the retention period are
+deleted, files and all.
+"""
+
+# room left under the upload limit for what the compressor hasn't written out yet
+PART_MARGIN = 256 * 1024
+
+
+class Transcript:
+    __slots__ = ("id", "channel_id", "first_message_id", "last_message_id", "message_count", "deleted_at", "parts")
+
+    def __init__(self, id: int, channel_id: int, first_message_id: int, last_message_id: int, message_count: int,
+                 deleted_at: datetime, parts: list):
+        self.id = id
+        self.channel_id = channel_id
+        self.first_message_id = first_message_id
+        self.last_message_id = last_message_id
+        self.message_count = message_count
+        self.deleted_at = deleted_at
+        self.parts = parts
+
+
+class TranscriptArchive:
+    def __init__(self, path: str, retention: timedelta = timedelta(days=30)):
+        """Initialize the archive
+
+        Parameters
+        ----------
+        path : str
+            Directory the transcripts and their index are kept in
+        retention : datetime.timedelta
+            How long transcripts are kept for
+        """
+
+        self.path = path
+        self.retention = retention
+        self._last_prune = 0
+        # one thread, so the files and the index are only ever used from it
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="transcripts")
+        self._connection = None
+
+    async def _call(self, func, *args):
+        return await asyncio.get_event_loop().run_in_executor(self._executor, func, *args)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(self.path, exist_ok=True)
+            self._connection = sqlite3.connect(os.path.join(self.path, "index.db"), check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS transcripts ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, channel_id INTEGER NOT NULL, "
+                "first_message_id INTEGER NOT NULL, last_message_id INTEGER NOT NULL, "
+                "message_count INTEGER NOT NULL, deleted_at TEXT NOT NULL, parts TEXT NOT NULL)")
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS transcripts_channel ON transcripts (channel_id, last_message_id)")
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS transcripts_deleted_at ON transcripts (deleted_at)")
+        return self._connection
+
+    async def close(self) -> None:
+        await self._call(self._close)
+
+    def _close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    async def write(self, channel_id: int, lines, part_size: int) -> Transcript:
+        """Write and index a transcript.
+
+        Parameters
+        ----------
+        channel_id : int
+            The channel the messages were deleted from
+        lines : list
+            (message ID, header, content, attachment URLs) of each message, oldest first
+        part_size : int
+            Largest size in bytes of one part, i.e. the guild's upload limit
+
+        Returns
+        -------
+        Transcript
+            The transcript, with the paths of its parts
+        """
+
+        return await self._call(self._write, channel_id, lines, part_size)
+
+    def _write(self, channel_id: int, lines, part_size: int) -> Transcript:
+        first_id, last_id = lines[0][0], lines[-1][0]
+        deleted_at = datetime.now(timezone.utc)
+        directory = os.path.join(self.path, deleted_at.strftime("%Y-%m"))
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, f"{channel_id}-{first_id}-{last_id}")
+
+        limit = max(part_size - PART_MARGIN, PART_MARGIN)
+        parts = []
+        raw = out = None
+        try:
+            for _, header, content, attachments in lines:
+                if out is None or raw.tell() >= limit:
+                    if out is not None:
+                        out.close()
+                        raw.close()
+                    parts.append(f"{base}.part{len(parts) + 1}.txt.gz")
+                    raw = open(parts[-1], "wb")
+                    out = gzip.GzipFile(fileobj=raw, mode="wb")
+
+                out.write(header.encode("UTF-8"))
+                out.write(b"\n")
+                out.write(content.encode("UTF-8"))
+                for url in attachments:
+                    out.write(b"\n")
+                    out.write(url.encode("UTF-8"))
+                out.write(b"\n\n")
+        finally:
+            if out is not None:
+                out.close()
+                raw.close()
+
+        connection = self._connect()
+        with connection:
+            cursor = connection.execute(
+                "INSERT INTO transcripts (channel_id, first_message_id, last_message_id, message_count, deleted_at, parts) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (channel_id, first_id, last_id, len(lines), deleted_at.isoformat(), json.dumps(parts)))
+
+        if time.monotonic() - self._last_prune > 3600:
+            self._last_prune = time.monotonic()
+            try:
+                self._prune(deleted_at - self.retention)
+            except Exception:
+                traceback.print_exc()
+
+        return Transcript(cursor.lastrowid, channel_id, first_id, last_id, len(lines), deleted_at, parts)
+
+    def _prune(self, before: datetime) -> None:
+        connection = self._connect()
+        # timestamps are all stored in UTC in the same format, so they sort as text
+        rows = connection.execute(
+            "SELECT id, parts FROM transcripts WHERE deleted_at < ?", (before.isoformat(),)).fetchall()
+        for _, parts in rows:
+            for part in json.loads(parts):
+                try:
+                    os.remove(part)
+                except FileNotFoundError:
+                    pass
+            # the monthly directory, once it's empty
+            try:
+                os.rmdir(os.path.dirname(part))
+            except OSError:
+                pass
+
+        with connection:
+            connection.executemany("DELETE FROM transcripts WHERE id = ?", [(id,) for id, _ in rows])
+
+    async def get(self, id: int) -> Transcript:
+        """Look up a transcript by its ID.
+
+        Parameters
+        ----------
+        id : int
+            The transcript's ID, shown in the bulk delete log
+
+        Returns
+        -------
+        Transcript
+            The transcript, or None if there isn't one with that ID
+        """
+
+        return await self._call(self._get, id)
+
+    def _get(self, id: int) -> Transcript:
+        rows = self._query("WHERE id = ?", (id,))
+        return rows[0] if rows else None
+
+    async def find(self, channel_id: int, start: datetime = None, end: datetime = None) -> list:
+        """Look up the transcripts of a channel that have messages sent in a time range.
+
+        Parameters
+        ----------
+        channel_id : int
+            The channel
+        start : datetime.datetime, optional
+            Earliest time a message was sent, by default no limit
+        end : datetime.datetime, optional
+            Latest time a message was sent, by default no limit
+
+        Returns
+        -------
+        list
+            Transcripts, most recently sent messages first
+        """
+
+        after = discord.utils.time_snowflake(start) if start is not None else 0
+        before = discord.utils.time_snowflake(end, high=True) if end is not None else 2 ** 63 - 1
+        return await self._call(self._find, channel_id, after, before)
+
+    def _find(self, channel_id: int, after: int, before: int) -> list:
+        return self._query("WHERE channel_id = ? AND last_message_id >= ? AND first_message_id <= ? ORDER BY last_message_id DESC",
+                           (channel_id, after, before))
+
+    def _query(self, where: str, parameters: tuple) -> list:
+        rows = self._connect().execute(
+            "SELECT id, channel_id, first_message_id, last_message_id, message_count, deleted_at, parts FROM transcripts " + where,
+            parameters)
+        return [Transcript(id, channel_id, first_id, last_id, count, datetime.fromisoformat(deleted_at), json.loads(parts))
+                for id, channel_id, first_id, last_id, count, deleted_at, parts in rows]
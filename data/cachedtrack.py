@@ -0,0 +1,11 @@
+import mongoengine
+import datetime
+
+class CachedTrack(mongoengine.Document):
+    _id   = mongoengine.StringField(required=True)
+    track = mongoengine.DictField(required=True)
+    date  = mongoengine.DateTimeField(default=datetime.datetime.now, required=True)
+    meta = {
+        'db_alias': 'default',
+        'collection': 'track_cache'
+    }
@@ -0,0 +1,10 @@
+import mongoengine
+
+class CaseStats(mongoengine.Document):
+    _id    = mongoengine.StringField(required=True)
+    total  = mongoengine.IntField(default=0, required=True)
+    counts = mongoengine.DictField(default={})
+    meta = {
+        'db_alias': 'default',
+        'collection': 'case_stats'
+    }
@@ -0,0 +1,14 @@
+import mongoengine
+
+class Job(mongoengine.Document):
+    _id    = mongoengine.StringField(required=True)
+    kind   = mongoengine.StringField(required=True)
+    run_at = mongoengine.DateTimeField(required=True)
+    kwargs = mongoengine.DictField(default={})
+    meta = {
+        'db_alias': 'default',
+        'collection': 'scheduled_jobs',
+        'indexes': [
+            'run_at',
+        ]
+    }
@@ -0,0 +1,14 @@
+import mongoengine
+import datetime
+
+class PendingReport(mongoengine.Document):
+    _id        = mongoengine.IntField(required=True)
+    kind       = mongoengine.StringField(required=True)
+    channel_id = mongoengine.IntField(required=True)
+    user_id    = mongoengine.IntField(required=True)
+    domain     = mongoengine.StringField()
+    date       = mongoengine.DateTimeField(default=datetime.datetime.now, required=True)
+    meta = {
+        'db_alias': 'default',
+        'collection': 'pending_reports'
+    }
@@ -21,5 +21,9 @@ class User(mongoengine.Document):
 
     meta = {
         'db_alias': 'default',
-        'collection': 'users'
+        'collection': 'users',
+        'indexes': [
+            ('-xp', '-_id'),
+            'birthday',
+        ]
     }
\ No newline at end of file
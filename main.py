@@ -2,7 +2,6 @@ import datetime
 import logging
 import re
 import os
-import string
 
 import discord
 import humanize
@@ -10,9 +9,11 @@ import pytimeparse
 from data.case import Case
 import cogs.utils.logs as logger
 import cogs.utils.context as context
+from cogs.utils.invite_cache import InviteCache
+from cogs.utils.message_pipeline import MessageContext, MessagePipeline, Stage
+from cogs.utils.normalize import normalize
 from discord.ext import commands
 from dotenv import find_dotenv, load_dotenv
-from fold_to_ascii import fold
 
 from cogs.monitors.report import Report
 
@@ -71,24 +72,31 @@ class Bot(commands.Bot):
         self.spoiler_filter = r'\|\|(.*?)\|\|'
         self.invite_filter = r'(?:https?://)?discord(?:(?:app)?\.com/invite|\.gg)\/{1,}[a-zA-Z0-9]+/?'
         self.spam_cooldown = commands.CooldownMapping.from_cooldown(2, 10.0, commands.BucketType.user)
+        self.invite_cache = InviteCache(self.fetch_invite)
+        # messages in the main guild go through this before commands are processed
+        self.pipeline = MessagePipeline()
+        self.pipeline.register("filter", self.filter_stage, Stage.FILTER)
     
     async def on_message(self, message):
         if message.author.bot:
             return
         
         if message.guild is not None and message.guild.id == self.settings.guild_id:
-            if not self.settings.permissions.hasAtLeast(message.guild, message.author, 6):
-                role_submod = message.guild.get_role(self.settings.guild().role_sub_mod)
-                if role_submod is not None:
-                    if role_submod not in message.author.roles:
-                        if await self.filter(message):
-                            return
-                else:
-                    if await self.filter(message):
-                        return
+            if await self.pipeline.run(MessageContext(self, message)):
+                return
                                 
         await self.process_commands(message)
 
+    async def filter_stage(self, ctx):
+        if ctx.level >= 6:
+            return False
+
+        role_submod = ctx.message.guild.get_role(ctx.db.role_sub_mod)
+        if role_submod is not None and role_submod in ctx.member.roles:
+            return False
+
+        return await self.filter(ctx.message)
+
     async def process_commands(self, message):
         if message.author.bot:
             return
@@ -113,41 +121,27 @@ class Bot(commands.Bot):
         """
         BAD WORD FILTER
         """
-        symbols = (u"абвгдеёжзийклмнопрстуфхцчшщъыьэюяАБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ",
-                   u"abBrdeex3nnKnmHonpcTyoxu4wwbbbeoRABBrDEEX3NNKNMHONPCTyOXU4WWbbbEOR")
-
-        tr = {ord(a): ord(b) for a, b in zip(*symbols)}
-
-        folded_message = fold(message.content.translate(tr).lower()).lower()
-        folded_without_spaces = "".join(folded_message.split())
-        folded_without_spaces_and_punctuation = folded_without_spaces.translate(str.maketrans('', '', string.punctuation))
+        text = normalize(message.content)
         word_found = False
         
-        if folded_message:
+        if text.folded:
             reported = False
-            for word in guild.filter_words:
-                filter_word_without_spaces = "".join(word.word.lower().split())
+            # every filter word found in any of the variants, in the order they're stored in the guild
+            hits = self.settings.filter_matcher().find(*text)
+            for word in hits:
                 if not self.settings.permissions.hasAtLeast(message.guild, message.author, word.bypass):
-                    if (word.word.lower() in folded_message) or \
-                        (not word.false_positive and word.word.lower() in folded_without_spaces) or \
-                        (not word.false_positive and word.word.lower() in folded_without_spaces_and_punctuation) or \
-                        (not word.false_positive and filter_word_without_spaces in folded_without_spaces_and_punctuation):
-                        # remove all whitespace, punctuation in message and run filter again
-                        if word.false_positive and word.word.lower() not in folded_message.split():
-                            continue
-                        
-                        dev_role = message.guild.get_role(self.settings.guild().role_dev)
-                        if not (word.piracy and message.channel.id == self.settings.guild().channel_development and dev_role in message.author.roles):
-                            # ignore if this is a piracy word and the channel is #development and the user has dev role
-                            word_found = True
-                            await self.delete(message)
-                            if not reported:
-                                await self.do_filter_notify(message.author, message.channel, word.word)
-                                await self.ratelimit(message)
-                                reported = True
-                            if word.notify:
-                                await self.report.report(message, message.author, word.word)
-                                return True
+                    dev_role = message.guild.get_role(self.settings.guild().role_dev)
+                    if not (word.piracy and message.channel.id == self.settings.guild().channel_development and dev_role in message.author.roles):
+                        # ignore if this is a piracy word and the channel is #development and the user has dev role
+                        word_found = True
+                        await self.delete(message)
+                        if not reported:
+                            await self.do_filter_notify(message.author, message.channel, word.word)
+                            await self.ratelimit(message)
+                            reported = True
+                        if word.notify:
+                            await self.report.report(message, message.author, word.word)
+                            return True
         return word_found
     
     async def do_invite_filter(self, message):
@@ -160,25 +154,26 @@ class Bot(commands.Bot):
                 if invites:
                     whitelist = self.settings.guild().filter_excluded_guilds
                     for invite in invites:
-                        try:
-                            invite = await self.fetch_invite(invite)
-
-                            id = None
-                            if isinstance(invite, discord.Invite):
-                                if invite.guild is not None:
-                                    id = invite.guild.id
-                                else:
-                                    id = 123
-                            elif isinstance(invite, discord.PartialInviteGuild) or isinstance(invite, discord.PartialInviteChannel):
-                                id = invite.id
-
-                            if id not in whitelist:
-                                await self.delete(message)
-                                await self.ratelimit(message)
-                                await self.report.report(message, message.author, invite, invite=invite)
-                                return True
-
-                        except discord.errors.NotFound:
+                        # cached, so repeats of the same invite don't hit the API
+                        resolved = await self.invite_cache.resolve(invite)
+                        if resolved is None:
+                            # the invite doesn't exist
+                            await self.delete(message)
+                            await self.ratelimit(message)
+                            await self.report.report(message, message.author, invite, invite=invite)
+                            return True
+
+                        invite = resolved
+                        id = None
+                        if isinstance(invite, discord.Invite):
+                            if invite.guild is not None:
+                                id = invite.guild.id
+                            else:
+                                id = 123
+                        elif isinstance(invite, discord.PartialInviteGuild) or isinstance(invite, discord.PartialInviteChannel):
+                            id = invite.id
+
+                        if id not in whitelist:
                             await self.delete(message)
                             await self.ratelimit(message)
                             await self.report.report(message, message.author, invite, invite=invite)
@@ -245,7 +240,7 @@ class Bot(commands.Bot):
             return
 
         case = Case(
-            _id=self.settings.guild().case_id,
+            _id=await self.settings.next_case_id(),
             _type="MUTE",
             date=now,
             mod_id=ctx.me.id,
@@ -264,11 +259,10 @@ class Bot(commands.Bot):
                 raise commands.BadArgument(
                     "An error occured, this user is probably already muted")
 
-        await self.settings.inc_caseid()
         await self.settings.add_case(user.id, case)
         u = await self.settings.user(id=user.id)
         u.is_muted = True
-        u.save()
+        await self.settings.save(u)
 
         await user.add_roles(mute_role)
 
@@ -294,9 +288,10 @@ class Bot(commands.Bot):
             await self.mute(ctx, message.author)
 
 
+# deleted and edited messages are logged from the Logging cog's message store, so
+# discord.py only needs to cache recent messages
 bot = Bot(command_prefix=get_prefix,
-                   intents=intents, allowed_mentions=mentions, case_insensitive=True)
-bot.max_messages = 10000
+                   intents=intents, allowed_mentions=mentions, case_insensitive=True, max_messages=1000)
 
 # Here we load our extensions(cogs) listed above in [initial_extensions].
 if __name__ == '__main__':